@@ -0,0 +1,273 @@
+"""
+Async Fetch
+asyncio のイベントループ上で動く取得バックエンド
+
+標準ライブラリだけで書いた HTTP/1.1 クライアント（keep-alive・chunked・リダイレクト対応）と、
+curl を asyncio のサブプロセスとして起動する関数を提供します。
+読み込み中のタスクを cancel() すると接続を閉じる（curlは終了させる）ので、
+遅いページの読み込みをすぐに打ち切れます。
+"""
+
+import asyncio
+import ssl
+import time
+import urllib.parse
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from content_coding import ACCEPT_ENCODING, decode_chunks
+from http_pool import MAX_IDLE_PER_HOST, REDIRECT_STATUSES
+from media_type import check_html
+from spool import CURL_TRAILER_BYTES, DEFAULT_MAX_BYTES, READ_SIZE, read_body
+
+# レスポンスヘッダー全体の大きさの上限
+MAX_HEADER_BYTES = 256 * 1024
+
+# 再利用した接続が切られていたときに出る例外（新しい接続で1回だけやり直す）
+RETRYABLE_ERRORS = (ConnectionError, asyncio.IncompleteReadError)
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class AsyncResponse(NamedTuple):
+    status: int
+    headers: Dict[str, str]  # 名前は小文字
+    body: bytes  # 圧縮転送されていた場合は伸長済み
+    url: str  # リダイレクト後のURL
+    timing: Dict[str, float]  # connect / ttfb / download（秒）
+    truncated: bool = False  # 本文が max_bytes を超えたので先頭だけ読んだ
+
+
+class AsyncHttpClient:
+    """(scheme, host, port) ごとに keep-alive 接続を使い回す asyncio 版のクライアント
+
+    http_pool.ConnectionPool と同じく、リダイレクトは curl -L と同じように自動で追跡します。
+    本文は伸長後で max_bytes まで読み、それを超える分は読まずに接続を閉じます。
+    """
+
+    def __init__(self, user_agent: str, timeout: float = 30, max_redirects: int = 10,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.max_bytes = max_bytes
+        self.connections_opened = 0
+        self._idle = {}
+        self._ssl_context = None
+
+    async def _connect(self, key: Tuple[str, str, int], timing: Dict[str, float]) -> Connection:
+        """新しい接続を張り、かかった時間（DNS・TCP・TLS）を記録"""
+        scheme, host, port = key
+        context = None
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            context = self._ssl_context
+        start = time.perf_counter()
+        connection = await asyncio.open_connection(host, port, ssl=context, limit=MAX_HEADER_BYTES)
+        timing['connect'] = timing.get('connect', 0.0) + time.perf_counter() - start
+        self.connections_opened += 1
+        return connection
+
+    def _release(self, key: Tuple[str, str, int], connection: Connection):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < MAX_IDLE_PER_HOST:
+            idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def close(self):
+        """保持している接続をすべて閉じる"""
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, writer in connections:
+                writer.close()
+
+    async def _send(self, url: str, headers: Dict[str, str], timing: Dict[str, float],
+                    html_only: bool = False) -> AsyncResponse:
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise ValueError(f"未対応のスキームです: {scheme}")
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname or '', port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        request_headers = {
+            'Host': parts.netloc,
+            'User-Agent': self.user_agent,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Encoding': ACCEPT_ENCODING,
+        }
+        request_headers.update(headers)
+        request = f"GET {path} HTTP/1.1\r\n"
+        request += ''.join(f"{name}: {value}\r\n" for name, value in request_headers.items())
+        request = (request + "\r\n").encode('latin-1')
+
+        idle = self._idle.get(key)
+        connection = idle.pop() if idle else None
+        reused = connection is not None
+        try:
+            if connection is None:
+                connection = await self._connect(key, timing)
+            try:
+                start = time.perf_counter()
+                status, response_headers, keep_alive = await self._exchange(connection, request)
+            except RETRYABLE_ERRORS:
+                connection[1].close()
+                if not reused:
+                    raise
+                # サーバー側で閉じられていた古い接続だったので新しい接続でやり直す
+                connection = await self._connect(key, timing)
+                start = time.perf_counter()
+                status, response_headers, keep_alive = await self._exchange(connection, request)
+            timing['ttfb'] = timing.get('ttfb', 0.0) + time.perf_counter() - start
+            if html_only:
+                # HTML以外は本文を読まずに NotHtmlError を送出（接続は下で捨てる）
+                check_html(url, status, response_headers)
+
+            start = time.perf_counter()
+            body, keep_alive, truncated = await self._read_body(connection[0], status, response_headers,
+                                                                keep_alive, self.max_bytes)
+            content_encoding = response_headers.get('content-encoding', '')
+            if content_encoding and body:
+                # 少しずつ伸長し、伸長後の大きさも max_bytes で打ち切る
+                slices = (body[i:i + READ_SIZE] for i in range(0, len(body), READ_SIZE))
+                body, cut = read_body(decode_chunks(slices, content_encoding), self.max_bytes)
+                truncated = truncated or cut
+            timing['download'] = timing.get('download', 0.0) + time.perf_counter() - start
+        except BaseException:
+            # 中断（CancelledError）やエラーのときは読みかけの接続を捨てる
+            if connection is not None:
+                connection[1].close()
+            raise
+
+        if keep_alive:
+            self._release(key, connection)
+        else:
+            connection[1].close()
+        return AsyncResponse(status, response_headers, body, url, timing, truncated)
+
+    @staticmethod
+    async def _exchange(connection: Connection, request: bytes) -> Tuple[int, Dict[str, str], bool]:
+        """リクエストを送り、(status, ヘッダー, 接続を使い回せるか) を返す"""
+        reader, writer = connection
+        writer.write(request)
+        await writer.drain()
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        version, _, rest = lines[0].partition(' ')
+        status = int(rest.split(' ', 1)[0])
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        return status, headers, keep_alive
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, status: int, headers: Dict[str, str],
+                         keep_alive: bool, max_bytes: int = 0) -> Tuple[bytes, bool, bool]:
+        """本文を読む（chunked・Content-Length・切断までの3通り）
+
+        (本文, 接続を使い回せるか, max_bytes で打ち切ったか) を返す。打ち切った接続は使い回さない。
+        """
+        if status in (204, 304) or 100 <= status < 200:
+            return b'', keep_alive, False
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            parts = []
+            total = 0
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    break
+                if max_bytes and total + size > max_bytes:
+                    parts.append(await reader.readexactly(max_bytes - total))
+                    return b''.join(parts), False, True
+                parts.append(await reader.readexactly(size))
+                total += size
+                await reader.readexactly(2)
+            # トレーラーを読み飛ばす
+            while (await reader.readline()).strip():
+                pass
+            return b''.join(parts), keep_alive, False
+        if 'content-length' in headers:
+            length = int(headers['content-length'])
+            if max_bytes and length > max_bytes:
+                return await reader.readexactly(max_bytes), False, True
+            return await reader.readexactly(length), keep_alive, False
+        # 切断されるまで読む
+        parts = []
+        total = 0
+        while True:
+            chunk = await reader.read(READ_SIZE)
+            if not chunk:
+                return b''.join(parts), False, False
+            if max_bytes and total + len(chunk) > max_bytes:
+                parts.append(chunk[:max_bytes - total])
+                return b''.join(parts), False, True
+            parts.append(chunk)
+            total += len(chunk)
+
+    async def _fetch(self, url: str, headers: Dict[str, str], html_only: bool) -> AsyncResponse:
+        timing = {}  # リダイレクトをまたいで合計する
+        for _ in range(self.max_redirects + 1):
+            response = await self._send(url, headers, timing, html_only)
+            location = response.headers.get('location')
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response
+            url = urllib.parse.urljoin(url, location)
+        raise RuntimeError("リダイレクトが多すぎます")
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None,
+                    html_only: bool = False) -> AsyncResponse:
+        """リダイレクトを追跡して本文まで読んだレスポンスを返す（全体で timeout 秒まで）
+
+        html_only のときは、HTML以外のレスポンスの本文を読まずに media_type.NotHtmlError を送出する。
+        """
+        try:
+            return await asyncio.wait_for(self._fetch(url, headers or {}, html_only), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{self.timeout:g}秒以内に読み込めませんでした") from None
+
+
+async def run_curl(cmd: List[str], max_bytes: int = DEFAULT_MAX_BYTES,
+                   on_start: Optional[Callable[[], None]] = None) -> Tuple[int, bytes, bytes, bool]:
+    """curlを起動して (終了コード, 標準出力, 標準エラー出力, 打ち切ったか) を返す
+
+    中断されたとき、および標準出力が max_bytes（と curl -w の計測値の分）を超えたときは
+    curlを終了させる。打ち切ったときの終了コードは意味を持たない。
+    on_start は spool.run_capped と同じく最初の出力が届いたときに呼ばれる。
+    """
+    limit = max_bytes + CURL_TRAILER_BYTES if max_bytes else 0
+    proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.PIPE)
+    try:
+        if not limit and not on_start:
+            stdout, stderr = await proc.communicate()
+            return proc.returncode, stdout, stderr, False
+        parts = []
+        size = 0
+        truncated = False
+        while True:
+            chunk = await proc.stdout.read(READ_SIZE)
+            if not chunk:
+                break
+            if on_start:
+                on_start()
+                on_start = None
+            if limit and size + len(chunk) > limit:
+                parts.append(chunk[:limit - size])
+                truncated = True
+                proc.kill()
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        stderr = await proc.stderr.read()
+        return await proc.wait(), b''.join(parts), stderr, truncated
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+        raise
@@ -0,0 +1,195 @@
+"""
+Async REPL
+asyncio のイベントループで動く対話ループ（両方の版で使用）
+
+ページの読み込みはタスクとして実行するので、読み込み中もプロンプトに入力できます。
+別のページへ移動するコマンドを入力するか Ctrl+C を押すと、読み込み中のタスクを中断します
+（読み込み中でなければ Ctrl+C で終了）。標準入力がパイプやファイルのときは、
+読み込みの完了を待ってから次のコマンドを実行します。
+
+ブラウザ側には次のメソッドが必要です:
+- navigation_target(command) -> (url, revalidate) か None（ページを取得しないコマンド）
+- fetch_page_async(url, revalidate) -> 本文か None（ネットワークまたはディスクキャッシュから取得）
+- execute(command) -> 続けるなら True
+- command_task(command) -> コルーチンか None（任意。watch のように読み込みと同じく中断できる、長く続くコマンド）
+"""
+
+import asyncio
+import signal
+import sys
+import threading
+from contextlib import nullcontext
+
+from timing import profiled
+
+
+class AsyncRepl:
+    """1つのブラウザの対話ループ（読み込みは同時に1つまで）"""
+
+    def __init__(self, browser, prompt: str = "\n> "):
+        self.browser = browser
+        self.prompt = prompt
+        self.interactive = sys.stdin.isatty()
+        self.load_task = None  # 読み込み中のタスク
+        self._commands = None
+        self._ready = threading.Event()  # 次のコマンドを読んでよい
+
+    def _read_commands(self, loop: asyncio.AbstractEventLoop):
+        """入力待ちはイベントループを止めないよう別スレッドで行う"""
+        while True:
+            self._ready.wait()
+            self._ready.clear()
+            try:
+                line = input(self.prompt)
+            except EOFError:
+                line = None
+            loop.call_soon_threadsafe(self._commands.put_nowait, line)
+            if line is None:
+                return
+
+    def _profile(self):
+        return profiled() if self.browser.profile else nullcontext()
+
+    @property
+    def loading(self) -> bool:
+        return self.load_task is not None and not self.load_task.done()
+
+    def cancel_load(self) -> bool:
+        """読み込み中のタスクを中断（中断したら True）"""
+        if not self.loading:
+            return False
+        self.load_task.cancel()
+        return True
+
+    def interrupt(self):
+        """Ctrl+C: 読み込み中なら中断、そうでなければ終了"""
+        if self.cancel_load():
+            print("\n⏹  読み込みを中止しました。")
+        else:
+            print("\n\nブラウザを終了します。")
+            self._commands.put_nowait(None)
+
+    def needs_fetch(self, url: str, revalidate: bool) -> bool:
+        """表示する前に非同期で取得する必要があるか（--stream では未取得のページを execute() が逐次表示）"""
+        browser = self.browser
+        return revalidate or (url not in browser.page_cache and not browser.streaming)
+
+    async def load(self, command: str, url: str, revalidate: bool):
+        """ページを取得してから表示する（取得中に cancel() されたら何も表示しない）"""
+        browser = self.browser
+        try:
+            with browser.timings.command(command), self._profile():
+                browser.stop_loading(next_url=url)  # 移動先を先読み中なら、その先読みは中断せずに使う
+                html = None
+                if self.needs_fetch(url, revalidate):
+                    html = await browser.fetch_page_async(url, revalidate)
+                    if html is None:
+                        return
+                    browser.page_cache.put(url, html)
+                if revalidate:
+                    browser.display_page(html)
+                else:
+                    # 取得済みのページはキャッシュから表示される（--stream では未取得のページを逐次表示）
+                    browser.execute(command)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"エラーが発生しました: {e}")
+        finally:
+            if self.interactive and asyncio.current_task() is self.load_task:
+                print(self.prompt.lstrip('\n'), end='', flush=True)
+            if not self.interactive:
+                self._ready.set()
+
+    async def run_task(self, coroutine):
+        """長く続くコマンド（watch など）を実行する（読み込みと同じく、別のページへの移動か Ctrl+C で中断）"""
+        try:
+            await coroutine
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"エラーが発生しました: {e}")
+        finally:
+            if self.interactive and asyncio.current_task() is self.load_task:
+                print(self.prompt.lstrip('\n'), end='', flush=True)
+            if not self.interactive:
+                self._ready.set()
+
+    async def start_task(self, coroutine) -> bool:
+        """読み込み中のタスクを中断し、coroutine を新しい読み込みのタスクとして実行"""
+        self.cancel_load()
+        self.load_task = asyncio.create_task(coroutine)
+        if self.interactive:
+            self._ready.set()
+        else:
+            await asyncio.wait([self.load_task])
+        return True
+
+    async def dispatch(self, command: str) -> bool:
+        """コマンドを1つ実行（終了するときは False を返す）"""
+        browser = self.browser
+        browser.collect_loading()
+        command_task = getattr(browser, 'command_task', None)
+        coroutine = command_task(command) if command_task else None
+        if coroutine is not None:
+            return await self.start_task(self.run_task(coroutine))
+        target = browser.navigation_target(command)
+        if target is None:
+            # ページを取得しないコマンドは読み込み中でもすぐに実行
+            with browser.timings.command(command), self._profile():
+                keep_running = browser.execute(command)
+            if keep_running:
+                self._ready.set()
+            return keep_running
+
+        url, revalidate = target
+        if self.interactive and self.needs_fetch(url, revalidate):
+            print(f"⏳ 読み込み中: {url}（別のURL・リンク番号の入力か Ctrl+C で中止）")
+        return await self.start_task(self.load(command, url, revalidate))
+
+    async def run(self, initial_url: str = ""):
+        loop = asyncio.get_running_loop()
+        self._commands = asyncio.Queue()
+        try:
+            loop.add_signal_handler(signal.SIGINT, self.interrupt)
+        except (NotImplementedError, RuntimeError):
+            pass  # シグナルハンドラを登録できない環境では Ctrl+C で終了
+        threading.Thread(target=self._read_commands, args=(loop,), daemon=True).start()
+
+        try:
+            if initial_url:
+                await self.dispatch(initial_url)
+            else:
+                self._ready.set()
+            while True:
+                command = await self._commands.get()
+                if command is None:
+                    if self.loading:
+                        await asyncio.wait([self.load_task])
+                    break
+                command = command.strip()
+                if not command:
+                    self._ready.set()
+                    continue
+                try:
+                    if not await self.dispatch(command):
+                        break
+                except Exception as e:
+                    print(f"エラーが発生しました: {e}")
+                    self._ready.set()
+        finally:
+            self.cancel_load()
+            try:
+                loop.remove_signal_handler(signal.SIGINT)
+            except (NotImplementedError, RuntimeError):
+                pass
+            if self.browser._async_client is not None:
+                await self.browser.async_client.close()
+
+
+def run_repl(browser, initial_url: str = "", prompt: str = "\n> "):
+    """ブラウザの対話ループを asyncio のイベントループで実行"""
+    try:
+        asyncio.run(AsyncRepl(browser, prompt).run(initial_url))
+    except KeyboardInterrupt:
+        print("\n\nブラウザを終了します。")
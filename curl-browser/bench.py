@@ -0,0 +1,1000 @@
+#!/usr/bin/env python3
+"""
+Browser Benchmark
+ブラウザ内部処理の性能を測定するスクリプト
+
+使用方法:
+python bench.py extract [--sizes 1,5,20] [--repeat 3]
+python bench.py fetch [--count 50]
+python bench.py search [--pages 5000]
+python bench.py parsers [--size 2] [--repeat 3]
+python bench.py charset [--sizes 0.1,1,5] [--repeat 5]
+python bench.py suite [--repeat 20] [--quick] [--output results.json]
+python bench.py compare old.json new.json
+python bench.py startup [--repeat 10] [--max-ms 60]
+python bench.py memory [--size 100]
+python bench.py pathological [--count 40000] [--timeout 3]
+python bench.py archive [--pages 5000]
+python bench.py links [--count 50000]
+"""
+
+import argparse
+import contextlib
+import gzip
+import http.server
+import importlib.util
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+from charset import decode_html
+from html_extract import extract_page
+from http_pool import ConnectionPool
+from link_table import LinkTable, UrlResolver
+from page_cache import ParsedPage, content_digest
+from parse_worker import WALL_GRACE, ParsePool
+from parsers import available_backends, get_backend, parse_soup, parse_until, strained_soup_class
+from search_index import PageIndex
+from spool import DEFAULT_MAX_BYTES, READ_SIZE, read_body
+from tests.test_parsers import LINEAR_RATIO, PATHOLOGICAL_PAGES
+from warc_archive import ArchiveReader, WarcWriter, archive_files
+
+BASE_URL = 'https://bench.example.com/dir/page.html'
+
+
+def generate_page(size_bytes: int) -> str:
+    """指定サイズ程度のHTMLを生成（段落・リンク・script・エンティティを含む）"""
+    parts = ['<html><head><title>Bench &amp; Page</title>',
+             '<meta name="description" content="benchmark page"></head><body>\n']
+    total = sum(len(p) for p in parts)
+    i = 0
+    while total < size_bytes:
+        block = (
+            f'<div class="item"><h2>Section {i}</h2>\n'
+            f'<p>Lorem ipsum dolor sit amet &amp; consectetur &lt;adipiscing&gt; elit, '
+            f'sed do eiusmod tempor &quot;incididunt&quot; ut labore &#39;et&#39; dolore.</p>\n'
+            f'<a href="/article/{i}">Article <b>{i}</b></a> '
+            f'<a href="related/{i}?ref=bench">Related {i}</a>\n'
+            f'<script>var x{i} = "<a href=\\"/ignored\\">no</a>";</script></div>\n'
+        )
+        parts.append(block)
+        total += len(block)
+        i += 1
+    parts.append('</body></html>\n')
+    return ''.join(parts)
+
+
+def legacy_regex_parse(html: str, base_url: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """以前の正規表現パイプライン（比較用に再現したもの）"""
+    text = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
+    text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL | re.IGNORECASE)
+    text = re.sub(r'<[^>]+>', '', text)
+    text = text.replace('&lt;', '<')
+    text = text.replace('&gt;', '>')
+    text = text.replace('&amp;', '&')
+    text = text.replace('&quot;', '"')
+    text = text.replace('&#39;', "'")
+    text = text.replace('&nbsp;', ' ')
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    text = re.sub(r' +', ' ', text)
+
+    links = []
+    pattern = r'<a[^>]*href=["\']([^"\']+)["\'][^>]*>(.*?)</a>'
+    for href, link_text in re.findall(pattern, html, re.IGNORECASE | re.DOTALL):
+        href = urllib.parse.urljoin(base_url, href)
+        link_text = re.sub(r'<[^>]+>', '', link_text).strip()
+        if link_text:
+            links.append((href, link_text))
+    return text.strip(), links
+
+
+def best_of(func, repeat: int) -> float:
+    """repeat回実行して最短時間（秒）を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func) -> Tuple[object, int]:
+    """funcを実行し、戻り値と実行中に確保されたメモリのピーク（バイト）を返す"""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def bench_extract(sizes_mb: List[float], repeat: int):
+    """正規表現パイプラインと1パス抽出器のスループット・ピークメモリを比較"""
+    print(f"{'size':>8}  {'regex':>11}  {'1-pass':>11}  {'regex peak':>10}  {'1-pass peak':>11}  links")
+    for size_mb in sizes_mb:
+        html = generate_page(int(size_mb * 1024 * 1024))
+        mb = len(html) / (1024 * 1024)
+        regex_time = best_of(lambda: legacy_regex_parse(html, BASE_URL), repeat)
+        parser_time = best_of(lambda: extract_page(html, BASE_URL), repeat)
+        (_, regex_links), regex_peak = peak_memory(lambda: legacy_regex_parse(html, BASE_URL))
+        (_, parser_links, _), parser_peak = peak_memory(lambda: extract_page(html, BASE_URL))
+        print(f"{mb:7.1f}M  {mb / regex_time:6.1f}MB/s  {mb / parser_time:6.1f}MB/s  "
+              f"{regex_peak / 2**20:8.1f}MB  {parser_peak / 2**20:9.1f}MB  "
+              f"{len(regex_links)}/{len(parser_links)}")
+
+
+def bench_parsers(size_mb: float, repeat: int):
+    """インストール済みの各パーサーのスループットと、出力が1パス抽出器と一致するかを比較
+
+    小さな文書ごとの一致は tests/test_parsers.py で確かめる。
+    """
+    html = generate_page(int(size_mb * 1024 * 1024))
+    mb = len(html) / (1024 * 1024)
+    expected = extract_page(html, BASE_URL)
+    print(f"{'parser':<12} {'throughput':>11}  {'page':>5}")
+    for backend in available_backends():
+        elapsed = best_of(lambda: backend.parse(html, BASE_URL), repeat)
+        same = backend.parse(html, BASE_URL) == expected
+        print(f"{backend.name:<12} {mb / elapsed:6.1f}MB/s  {'一致' if same else '相違':>5}")
+
+
+# (Pythonのコーデック名, charset のラベル)
+BENCH_CHARSETS = (('utf-8', 'utf-8'), ('shift_jis', 'Shift_JIS'), ('euc_jp', 'EUC-JP'))
+
+
+def detect_whole_body(body: bytes) -> str:
+    """本文全体から文字コードを推測してデコード（requests の response.text と同じ方法）"""
+    import charset_normalizer
+    best = charset_normalizer.from_bytes(body).best()
+    return str(best) if best is not None else body.decode('utf-8', errors='replace')
+
+
+def bench_charset(sizes_mb: List[float], repeat: int):
+    """文字コードの宣言の有無ごとに、先頭だけで判定してデコードする速さと正しさを測定
+
+    charset_normalizer がインストールされていれば、本文全体から推測する方法とも比較する。
+    """
+    whole_body = importlib.util.find_spec('charset_normalizer') is not None
+    print(f"{'charset':<10} {'declared':<8} {'size':>7}  {'sniff+decode':>12}  {'result':<9}"
+          + (f"  {'whole-body':>12}  result" if whole_body else ''))
+    for size_mb in sizes_mb:
+        for codec, label in BENCH_CHARSETS:
+            for declared in ('header', 'meta', 'none'):
+                expected = generate_japanese_page(int(size_mb * 1024 * 1024), label, meta=declared == 'meta')
+                body = expected.encode(codec)
+                content_type = f'text/html; charset={label}' if declared == 'header' else 'text/html'
+                mb = len(body) / (1024 * 1024)
+                elapsed = best_of(lambda: decode_html(body, content_type), repeat)
+                text, encoding = decode_html(body, content_type)
+                line = (f"{label:<10} {declared:<8} {mb:6.2f}M  {mb / elapsed:8.1f}MB/s  "
+                        f"{'OK' if text == expected else '文字化け':<9}")
+                if whole_body:
+                    elapsed = best_of(lambda: detect_whole_body(body), repeat)
+                    same = detect_whole_body(body) == expected
+                    line += f"  {mb / elapsed:8.1f}MB/s  {'OK' if same else '文字化け'}"
+                print(line)
+
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    """メモリ上のページを HTTP/1.1 (keep-alive) で返すハンドラ"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # ヘッダーと本文を別々に送るときの遅延ACK待ちを避ける
+    pages = {}  # path -> (本文, ヘッダー)
+
+    def do_GET(self):
+        page = self.pages.get(self.path.split('?')[0])
+        if page is None:
+            self.send_error(404)
+            return
+        body, headers = page
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """ベンチマーク用のローカルHTTPサーバー（別スレッドで動作）"""
+
+    def __init__(self, pages: Dict[str, Tuple[bytes, Dict[str, str]]]):
+        handler = type('Handler', (FixtureHandler,), {'pages': pages})
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self) -> 'FixtureServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """最近傍法によるパーセンタイル"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def time_each(func, count: int) -> List[float]:
+    """count回実行して1回ごとの所要時間（秒）を返す"""
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_fetch(count: int):
+    """curlの起動ごとの取得と、接続プールによる取得の1回あたりの遅延を比較"""
+    html = generate_page(20 * 1024).encode('utf-8')
+    pages = {'/page': (html, {'Content-Type': 'text/html; charset=utf-8'})}
+    with FixtureServer(pages) as server:
+        url = server.base_url + '/page'
+
+        def curl_fetch(_):
+            subprocess.run(['curl', '-s', '-L', '--compressed', '--max-time', '30', url], capture_output=True, check=True)
+
+        pool = ConnectionPool('Bench/1.0')
+
+        def pool_fetch(_):
+            pool.fetch(url)
+
+        results = [('curl (毎回起動)', time_each(curl_fetch, count)),
+                   ('http.client プール', time_each(pool_fetch, count))]
+        try:
+            import requests
+            session = requests.Session()
+            results.append(('requests.Session', time_each(lambda _: session.get(url).content, count)))
+        except ImportError:
+            pass
+
+    print(f"{'backend':<20} {'mean':>9} {'p50':>9} {'p95':>9}")
+    for name, samples in results:
+        print(f"{name:<20} {statistics.mean(samples) * 1000:7.2f}ms "
+              f"{percentile(samples, 50) * 1000:7.2f}ms {percentile(samples, 95) * 1000:7.2f}ms")
+    print(f"プールが開いた接続数: {pool.connections_opened} / リクエスト数: {pool.requests_sent}")
+
+
+WORDS = ('browser terminal cache stream parser index search query network socket thread '
+         'process memory latency buffer python sqlite ranking snippet bookmark history '
+         'ブラウザ 検索 履歴 キャッシュ 通信 解析').split()
+
+
+def bench_search(page_count: int):
+    """閲覧済みページの全文検索インデックスへの追加と検索の所要時間を測定"""
+    # 実際の文章に近づけるため、語彙の出現頻度はZipf分布にする（WORDSは中程度の頻度）
+    rng = random.Random(0)
+    vocabulary = [f'w{i}' for i in range(50)] + WORDS + [f'w{i}' for i in range(50, 20000)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    pages = []
+    for i in range(page_count):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=480)
+        text = '\n'.join(' '.join(words[j:j + 12]) for j in range(0, len(words), 12))
+        pages.append(ParsedPage(content_digest(text), f'https://bench.example.com/{i}',
+                                text, [], {'title': f'Page {i} {rng.choice(WORDS)}'}))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = PageIndex(os.path.join(tmp_dir, 'pages.db'))
+        start = time.perf_counter()
+        for page in pages:
+            index.add(page)
+        add_time = time.perf_counter() - start
+        print(f"{page_count}ページ追加: {add_time:.2f}秒（1ページ {add_time / page_count * 1000:.2f}ms, "
+              f"トークナイザ {index.tokenizer}）")
+
+        print(f"{'query':<22} {'hits':>5} {'p50':>9} {'p95':>9}")
+        for query in ('python', 'sqlite ranking', 'ブラウザ', '検索 履歴', 'nonexistent'):
+            hits = len(index.search(query))
+            samples = time_each(lambda _: index.search(query), 50)
+            print(f"{query:<22} {hits:>5} {percentile(samples, 50) * 1000:7.2f}ms "
+                  f"{percentile(samples, 95) * 1000:7.2f}ms")
+        index.close()
+
+
+# --- ベンチマークスイート（取得・解析・表示の各経路を子プロセスごとに測定） ---
+
+SUITE_VERSION = 1
+
+
+def generate_links_page(link_count: int) -> str:
+    """リンクだけが大量に並んだページ"""
+    links = ''.join(f'<li><a href="/item/{i}?ref=list">Item {i}</a></li>\n' for i in range(link_count))
+    return f'<html><head><title>{link_count} links</title></head><body><ul>\n{links}</ul></body></html>\n'
+
+
+def generate_nested_page(depth: int) -> str:
+    """要素が depth 段に入れ子になったページ"""
+    opening = ''.join(f'<div class="d{i}"><span>level {i}</span>\n' for i in range(depth))
+    return f'<html><head><title>nested {depth}</title></head><body>{opening}{"</div>" * depth}</body></html>\n'
+
+
+def generate_japanese_page(size_bytes: int, charset: str = 'shift_jis', meta: bool = True) -> str:
+    """日本語の段落が並んだページ（Shift_JIS・EUC-JPで符号化できる文字のみ）
+
+    charset で符号化したときの大きさが size_bytes になるまで段落を並べる。
+    meta が False なら <meta charset> を書かない。
+    """
+    paragraph = ('<p>これはベンチマーク用の日本語の段落です。漢字・ひらがな・カタカナを含みます。'
+                 '<a href="/ja/{i}">関連記事{i}</a></p>\n')
+    meta_tag = f'<meta charset="{charset}">' if meta else ''
+    parts = [f'<html><head>{meta_tag}<title>日本語のページ</title></head><body>\n']
+    total = 0
+    i = 0
+    while total < size_bytes:
+        block = paragraph.format(i=i)
+        parts.append(block)
+        total += len(block.encode(charset))
+        i += 1
+    parts.append('</body></html>\n')
+    return ''.join(parts)
+
+
+def build_corpus(include_large: bool = True) -> Dict[str, Tuple[bytes, Dict[str, str]]]:
+    """ベンチマーク用のページ一式（path -> (本文, ヘッダー)）"""
+    html_type = {'Content-Type': 'text/html; charset=utf-8'}
+    corpus = {
+        '/tiny': (generate_page(1024).encode('utf-8'), html_type),
+        '/1mb': (generate_page(1024 * 1024).encode('utf-8'), html_type),
+        '/links50k': (generate_links_page(50000).encode('utf-8'), html_type),
+        '/nested': (generate_nested_page(2000).encode('utf-8'), html_type),
+        '/shift_jis': (generate_japanese_page(256 * 1024).encode('shift_jis'),
+                       {'Content-Type': 'text/html; charset=shift_jis'}),
+        '/euc_jp': (generate_japanese_page(256 * 1024, 'euc_jp', meta=False).encode('euc_jp'),
+                    {'Content-Type': 'text/html'}),
+        '/gzip': (gzip.compress(generate_page(1024 * 1024).encode('utf-8')),
+                  dict(html_type, **{'Content-Encoding': 'gzip'})),
+    }
+    if include_large:
+        corpus['/20mb'] = (generate_page(20 * 1024 * 1024).encode('utf-8'), html_type)
+    return corpus
+
+
+def decode_body(body: bytes, headers: Dict[str, str]) -> str:
+    """ブラウザと同じ判定（ヘッダー・BOM・<meta charset>）で本文を文字列にする（圧縮転送は取得時に伸長済み）"""
+    return decode_html(body, headers.get('content-type', ''))[0]
+
+
+def peak_rss_kb() -> int:
+    """このプロセスの最大常駐メモリ（KB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def sample_until(func, repeat: int, budget: float) -> List[float]:
+    """repeat回（時間が budget 秒を超えたら最低3回で打ち切り）実行して所要時間を返す"""
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < repeat and (len(samples) < 3 or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_case(group: str, backend: str, url: str):
+    """測定対象の関数を作る（準備にかかる時間は測定に含めない）"""
+    if group == 'fetch':
+        if backend == 'requests':
+            import requests
+            session = requests.Session()
+            return lambda: session.get(url).content
+        if backend == 'curl':
+            return lambda: subprocess.run(['curl', '-s', '-L', '--compressed', '--max-time', '60', url],
+                                          capture_output=True, check=True)
+        pool = ConnectionPool('Bench/1.0')
+        return lambda: pool.fetch(url)
+
+    if group == 'parse':
+        from parsers import get_backend
+        status, headers, body, _ = ConnectionPool('Bench/1.0').fetch(url)
+        html = decode_body(body, headers)
+        parse = get_backend(backend).parse
+        return lambda: parse(html, url)
+
+    # render: 取得・解析・表示までを通しで（メモリキャッシュは毎回空にする）
+    if backend == 'enhanced':
+        from enhanced_browser import EnhancedBrowser
+        browser = EnhancedBrowser()
+    else:
+        from simple_browser import SimpleBrowser
+        browser = SimpleBrowser()
+
+    def render():
+        browser.page_cache.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            browser.open_page(url)
+    return render
+
+
+def run_case(group: str, backend: str, url: str, size: int, repeat: int, budget: float) -> Dict:
+    """1つの測定を行う（ピークRSSを分けるため子プロセスで実行される）"""
+    try:
+        func = make_case(group, backend, url)
+        func()  # ウォームアップ
+        samples = sample_until(func, repeat, budget)
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}", 'peak_rss_kb': peak_rss_kb()}
+    mean = statistics.mean(samples)
+    return {
+        'count': len(samples),
+        'mean_ms': mean * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'mb_per_s': size / (1024 * 1024) / mean,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def suite_cases() -> List[Tuple[str, str]]:
+    """(group, backend) の一覧（インストールされていないものは除く）"""
+    cases = [('fetch', 'pool')]
+    if shutil.which('curl'):
+        cases.append(('fetch', 'curl'))
+    if importlib.util.find_spec('requests'):
+        cases.append(('fetch', 'requests'))
+    cases += [('parse', backend.name) for backend in available_backends()]
+    cases += [('render', 'enhanced'), ('render', 'simple')]
+    return cases
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def bench_suite(repeat: int, budget: float, include_large: bool, output: str):
+    """コーパス全体について取得・解析・表示を測定し、必要なら結果をJSONで保存"""
+    corpus = build_corpus(include_large)
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with FixtureServer(corpus) as server:
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            baseline = executor.submit(peak_rss_kb).result()
+        print(f"子プロセスの基準RSS: {baseline / 1024:.1f}MB")
+        print(f"{'group':<7} {'backend':<10} {'page':<10} {'n':>3} {'p50':>10} {'p95':>10} "
+              f"{'p99':>10} {'MB/s':>8} {'RSS':>8}")
+        for group, backend in suite_cases():
+            for path, (body, _) in corpus.items():
+                # 各測定を新しいプロセスで行い、ピークRSSが前の測定に影響されないようにする
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    result = executor.submit(run_case, group, backend, server.base_url + path,
+                                             len(body), repeat, budget).result()
+                result.update(group=group, backend=backend, page=path.lstrip('/'), bytes=len(body))
+                results.append(result)
+                label = f"{group:<7} {backend:<10} {result['page']:<10}"
+                if 'error' in result:
+                    print(f"{label} ❌ {result['error']}")
+                    continue
+                print(f"{label} {result['count']:>3} {result['p50_ms']:8.2f}ms {result['p95_ms']:8.2f}ms "
+                      f"{result['p99_ms']:8.2f}ms {result['mb_per_s']:8.1f} {result['peak_rss_kb'] / 1024:6.1f}MB")
+
+    if output:
+        report = {
+            'version': SUITE_VERSION,
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'baseline_rss_kb': baseline,
+            'results': results,
+        }
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {output}")
+
+
+def bench_compare(old_path: str, new_path: str):
+    """2つの結果ファイルの p50 とピークRSSを比較"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    old_results = {(r['group'], r['backend'], r['page']): r for r in old['results']}
+    print(f"{old.get('revision') or old_path} -> {new.get('revision') or new_path}")
+    print(f"{'group':<7} {'backend':<10} {'page':<10} {'old p50':>10} {'new p50':>10} {'ratio':>7} {'RSS':>9}")
+    for r in new['results']:
+        key = (r['group'], r['backend'], r['page'])
+        before = old_results.get(key)
+        if not before or 'error' in before or 'error' in r:
+            continue
+        ratio = r['p50_ms'] / before['p50_ms']
+        mark = ' 🔺' if ratio > 1.1 else (' 🔻' if ratio < 0.9 else '')
+        rss = (r['peak_rss_kb'] - before['peak_rss_kb']) / 1024
+        print(f"{key[0]:<7} {key[1]:<10} {key[2]:<10} {before['p50_ms']:8.2f}ms {r['p50_ms']:8.2f}ms "
+              f"{ratio:6.2f}x {rss:+7.1f}MB{mark}")
+
+
+# 起動時（モジュールの読み込み時）には読み込まれてはいけない重いモジュール
+STARTUP_DEFERRED = ('bs4', 'requests', 'lxml', 'selectolax', 'asyncio', 'ssl', 'http.client',
+                    'sqlite3', 'cProfile', 'tracemalloc', 'multiprocessing')
+
+STARTUP_BROWSERS = (('enhanced', 'enhanced_browser'), ('simple', 'simple_browser'))
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, int, str]]:
+    """python -X importtime の出力を (深さ, 自身のμs, 累積のμs, モジュール名) のリストにする"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def measure_import(module: str) -> Tuple[float, List[Tuple[int, int, int, str]], List[str]]:
+    """新しいインタプリタで module を読み込み、(累積ms, module が読み込んだモジュールの行, 読み込まれた重いモジュール) を返す
+
+    importtime は読み込みが終わった順に出力するので、module の行の直前にある深さ1以上の行が
+    module から読み込まれたモジュール（site などインタプリタの起動時の分は含まない）。
+    """
+    code = (f"import sys, {module}\n"
+            f"print(' '.join(name for name in {STARTUP_DEFERRED!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    rows = parse_importtime(result.stderr)
+    end = next(i for i, (depth, _, _, name) in enumerate(rows) if depth == 0 and name == module)
+    start = end
+    while start > 0 and rows[start - 1][0] > 0:
+        start -= 1
+    return rows[end][2] / 1000, rows[start:end], result.stdout.split()
+
+
+def measure_prompt(script: str, cache_home: str) -> float:
+    """ブラウザを起動して quit するまでの時間（ms、インタプリタの起動を含む）"""
+    env = dict(os.environ, XDG_CACHE_HOME=cache_home)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, script], input='quit\n', capture_output=True, text=True, env=env,
+                   cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_prompt_baseline() -> float:
+    """何も読み込まないインタプリタの起動時間（ms）"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_startup(repeat: int, max_ms: float) -> int:
+    """両方の版のモジュール読み込み時間と、起動してプロンプトを出すまでの時間を測定
+
+    読み込み時間の中央値が max_ms を超えるか、起動時に重いモジュールが読み込まれていれば 1 を返す。
+    """
+    failed = False
+    baseline = statistics.median(measure_prompt_baseline() for _ in range(repeat))
+    print(f"インタプリタのみの起動: {baseline:.1f}ms")
+    print(f"{'browser':<9} {'import p50':>11} {'import max':>11} {'prompt p50':>11}")
+    with tempfile.TemporaryDirectory() as cache_home:
+        for label, module in STARTUP_BROWSERS:
+            totals = []
+            slowest = None
+            for _ in range(repeat):
+                total, rows, loaded = measure_import(module)
+                totals.append(total)
+                if slowest is None or total > slowest[0]:
+                    slowest = (total, rows)
+            prompts = [measure_prompt(module + '.py', cache_home) for _ in range(repeat)]
+            median = statistics.median(totals)
+            print(f"{label:<9} {median:9.1f}ms {max(totals):9.1f}ms {statistics.median(prompts):9.1f}ms")
+            # 最も遅かった回で、直接読み込んでいるモジュールのうち時間のかかったもの
+            children = sorted((row for row in slowest[1] if row[0] == 1), key=lambda row: -row[2])[:5]
+            print("          " + ', '.join(f"{name} {cumulative / 1000:.1f}ms" for _, _, cumulative, name in children))
+            if loaded:
+                print(f"  ❌ 起動時に読み込まれています: {' '.join(loaded)}")
+                failed = True
+            if max_ms and median > max_ms:
+                print(f"  ❌ 読み込み時間 {median:.1f}ms が上限 {max_ms:.1f}ms を超えています")
+                failed = True
+    return 1 if failed else 0
+
+
+# parse_soup で SoupStrainer を使わない場合（memory での比較用）
+UNSTRAINED = 'bs4-lxml-raw'
+
+
+def reset_peak_rss():
+    """最大常駐メモリの記録を今の値に戻す（Linuxのみ、他の環境では何もしない）"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def generate_chunks(size_bytes: int) -> Iterator[bytes]:
+    """ネットワークから届くように、READ_SIZE ずつ別々のオブジェクトで本文を返す"""
+    block = generate_page(READ_SIZE).encode()
+    for _ in range(size_bytes // len(block)):
+        yield bytes(bytearray(block))
+
+
+def memory_cases() -> List[Tuple[str, str]]:
+    """(group, name) の一覧（インストールされていないものは除く）"""
+    cases = [('download', 'join'), ('download', 'buffer'), ('download', 'capped')]
+    for backend in available_backends():
+        cases += [('parse', backend.name), ('early', backend.name)]
+    if importlib.util.find_spec('bs4') and importlib.util.find_spec('lxml') and strained_soup_class():
+        cases.append(('parse', UNSTRAINED))
+    return cases
+
+
+def run_memory_case(group: str, name: str, size: int) -> Dict:
+    """1つの測定を行う（子プロセスで実行される）
+
+    入力（本文・HTML）を用意した後に最大常駐メモリの記録を戻すので、ピークは処理そのものの分。
+    """
+    from enhanced_browser import EARLY_STOP_SCREENS, SCREEN_LINES, SCREEN_LINKS
+    html = generate_page(size) if group != 'download' else ''
+    reset_peak_rss()
+    before = peak_rss_kb()
+    start = time.perf_counter()
+    if group == 'download':
+        if name == 'join':
+            output = len(b''.join(list(generate_chunks(size))))
+        else:
+            body, _ = read_body(generate_chunks(size), DEFAULT_MAX_BYTES if name == 'capped' else 0)
+            output = len(body)
+    elif group == 'early':
+        (text, _, _), _ = parse_until(get_backend(name), html, BASE_URL, SCREEN_LINES * EARLY_STOP_SCREENS,
+                                      SCREEN_LINKS * EARLY_STOP_SCREENS)
+        output = len(text)
+    elif name == UNSTRAINED:
+        output = len(parse_soup(html, BASE_URL, 'lxml', strain=False)[0])
+    else:
+        output = len(get_backend(name).parse(html, BASE_URL)[0])
+    return {'seconds': time.perf_counter() - start, 'before_kb': before, 'peak_rss_kb': peak_rss_kb(),
+            'output': output}
+
+
+def bench_memory(size_mb: float):
+    """巨大なページの取得（上限あり・なし）と解析（全体・early-stop）のピークRSSを比較
+
+    download の join は従来のチャンクを溜めて連結する読み方、buffer は read_body（BytesIO に書き足す）、
+    capped はさらに DEFAULT_MAX_BYTES で打ち切る読み方。early は parse_until（--early-stop）。
+    """
+    size = int(size_mb * 1024 * 1024)
+    context = multiprocessing.get_context('spawn')
+    print(f"ページサイズ: {size_mb:.0f}MB（本文の上限 {DEFAULT_MAX_BYTES // (1024 * 1024)}MB）")
+    print(f"{'group':<9} {'name':<13} {'time':>8} {'input':>9} {'peak':>9} {'growth':>9} {'output':>11}")
+    for group, name in memory_cases():
+        # ピークRSSが前の測定に影響されないよう、測定ごとに新しいプロセスを使う
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            try:
+                result = executor.submit(run_memory_case, group, name, size).result()
+            except Exception as e:  # メモリ不足で子プロセスが終了した場合など
+                print(f"{group:<9} {name:<13} ❌ {type(e).__name__}: {e}")
+                continue
+        growth = result['peak_rss_kb'] - result['before_kb']
+        print(f"{group:<9} {name:<13} {result['seconds']:7.2f}s {result['before_kb'] / 1024:7.1f}MB "
+              f"{result['peak_rss_kb'] / 1024:7.1f}MB {growth / 1024:7.1f}MB {result['output']:>11,}")
+
+
+# --- 壊れた文書（解析が極端に遅くなる入力、tests/test_parsers.py の PATHOLOGICAL_PAGES） ---
+
+
+def run_pathological_case(page: str, count: int, name: str) -> float:
+    """1つの文書を1つの方法で解析した時間（子プロセスで実行される）"""
+    html = PATHOLOGICAL_PAGES[page](count)
+    start = time.perf_counter()
+    if name == 'regex':
+        legacy_regex_parse(html, BASE_URL)
+    else:
+        get_backend(name).parse(html, BASE_URL)
+    return time.perf_counter() - start
+
+
+def time_in_child(context, page: str, count: int, name: str, timeout: float) -> str:
+    """子プロセスで解析した時間（timeout 秒を超えたら子プロセスを終了させる）"""
+    with context.Pool(1) as pool:
+        try:
+            return f"{pool.apply_async(run_pathological_case, (page, count, name)).get(timeout):.2f}s"
+        except multiprocessing.TimeoutError:
+            return f">{timeout:g}s"
+        except Exception as e:
+            return f"❌ {type(e).__name__}"
+
+
+def bench_pathological(count: int, timeout: float) -> int:
+    """壊れた文書を各パーサー・以前の正規表現・上限付きのワーカー（parse_worker）で解析
+
+    1パス抽出器は文書を4倍にしたときの時間の比が LINEAR_RATIO 以下であること、ワーカーは
+    上限（timeout 秒）と親プロセスの猶予を足した時間内に結果を返すことを確かめ、満たさなければ 1 を返す。
+    """
+    context = multiprocessing.get_context('spawn')
+    names = ['regex'] + [backend.name for backend in available_backends() if backend.name != 'stdlib']
+    default = get_backend().name
+    failed = False
+    print(f"繰り返し: {count}  上限: {timeout:g}秒（ワーカーは {default}）")
+    print(f"{'page':<13} {'size':>8} {'stdlib':>8} {'x4 ratio':>9} "
+          + ' '.join(f"{name:>9}" for name in names) + f" {'worker':>8}")
+    with ParsePool(default, timeout=timeout) as parse_pool:
+        for page, generate in PATHOLOGICAL_PAGES.items():
+            html = generate(count)
+            single = best_of(lambda: extract_page(html, BASE_URL), 3)
+            large_html = generate(count * 4)
+            large = best_of(lambda: extract_page(large_html, BASE_URL), 3)
+            ratio = large / max(single, 1e-6)
+            others = [time_in_child(context, page, count, name, timeout) for name in names]
+            start = time.perf_counter()
+            timed_out = parse_pool.parse(html, BASE_URL).timed_out
+            elapsed = time.perf_counter() - start
+            print(f"{page:<13} {len(html) / 1024:6.0f}KB {single:7.2f}s {ratio:8.2f}x "
+                  + ' '.join(f"{other:>9}" for other in others)
+                  + f" {elapsed:7.2f}s{' (1パス抽出器)' if timed_out else ''}")
+            if ratio > LINEAR_RATIO and large > 0.05:
+                print(f"  ❌ 1パス抽出器が線形時間ではありません（4倍の文書で {ratio:.1f}倍）")
+                failed = True
+            # 最初の1回はワーカーの起動、打ち切ったときは1パス抽出器で解析し直す時間が加わる
+            if elapsed > timeout + WALL_GRACE + single + 1.0:
+                print(f"  ❌ ワーカーが {elapsed:.1f}秒かかりました（上限 {timeout:g}秒 + 猶予 {WALL_GRACE:g}秒）")
+                failed = True
+    print(f"上限を超えて1パス抽出器で解析し直した文書: {parse_pool.timeouts}件")
+    return 1 if failed else 0
+
+
+# --- WARCアーカイブ（--record / --offline） ---
+
+ARCHIVE_FILE_BYTES = 1024 * 1024  # 何度かファイルを切り替えるように小さくする
+
+
+def linear_archive_read(directory: str, url: str) -> bytes:
+    """索引を使わず、すべてのWARCファイルを先頭から展開してURLの最後の記録を探す（比較用）"""
+    marker = f'WARC-Target-URI: {url}\r\n'.encode('utf-8')
+    found = b''
+    for _, name in archive_files(directory):
+        with gzip.open(os.path.join(directory, name), 'rb') as f:
+            data = f.read()
+        position = data.rfind(marker)
+        if position >= 0:
+            found = data[position:data.find(b'\r\n\r\nWARC/1.0', position)]
+    return found
+
+
+def bench_archive(page_count: int) -> int:
+    """ページをWARCアーカイブに記録し、索引での読み出し・先頭からの走査・再解析の速さを測定
+
+    読み出した本文が記録したもの（同じURLを記録し直したものは新しい方）と一致しなければ 1 を返す。
+    """
+    rng = random.Random(0)
+    pages = {f'https://bench.example.com/archive/{i}.html': generate_page(rng.randrange(2, 20) * 1024).encode('utf-8')
+             for i in range(page_count)}
+    headers = {'content-type': 'text/html; charset=utf-8', 'content-encoding': 'gzip'}
+    urls = list(pages)
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        writer = WarcWriter(tmp_dir, max_file_bytes=ARCHIVE_FILE_BYTES)
+        for url, body in pages.items():
+            writer.write_response(url, 200, headers, body)
+        writer.close()
+        write_time = time.perf_counter() - start
+        # 一部のページを別のセッションで記録し直す（索引は最も新しい記録を返す）
+        writer = WarcWriter(tmp_dir, max_file_bytes=ARCHIVE_FILE_BYTES)
+        for url in urls[::10]:
+            pages[url] = pages[url].replace(b'<body>', b'<body><p>updated</p>', 1)
+            writer.write_response(url, 200, headers, pages[url])
+        writer.close()
+        files = archive_files(tmp_dir)
+        total = sum(os.path.getsize(os.path.join(tmp_dir, name)) for _, name in files)
+        raw = sum(len(body) for body in pages.values())
+        print(f"{page_count}ページ記録: {write_time:.2f}秒（1ページ {write_time / page_count * 1000:.2f}ms）  "
+              f"{len(files)}ファイル {total / 1024 / 1024:.1f}MB（本文 {raw / 1024 / 1024:.1f}MB）")
+
+        reader = ArchiveReader(tmp_dir)
+        sample = rng.sample(urls, min(1000, len(urls)))
+        lookups = time_each(lambda i: reader.lookup(sample[i % len(sample)]), len(sample))
+        reads = time_each(lambda i: reader.read(sample[i % len(sample)]), len(sample))
+        print(f"{'':<16} {'p50':>9} {'p95':>9}")
+        print(f"{'索引の検索':<12} {percentile(lookups, 50) * 1000:7.3f}ms {percentile(lookups, 95) * 1000:7.3f}ms")
+        print(f"{'検索+読み出し':<11} {percentile(reads, 50) * 1000:7.3f}ms {percentile(reads, 95) * 1000:7.3f}ms")
+        scans = time_each(lambda i: linear_archive_read(tmp_dir, sample[i % len(sample)]), 3)
+        print(f"{'先頭から走査':<11} {percentile(scans, 50) * 1000:7.1f}ms（索引の "
+              f"{percentile(scans, 50) / max(percentile(reads, 50), 1e-9):.0f}倍）")
+
+        mismatched = [url for url in urls if reader.read(url).body != pages[url]]
+        if mismatched or reader.read('https://bench.example.com/missing.html') is not None:
+            print(f"  ❌ 記録と一致しない読み出し: {len(mismatched)}件 {mismatched[:3]}")
+            failed = True
+
+        start = time.perf_counter()
+        for url in urls:
+            record = reader.read(url)
+            html, _ = decode_html(record.body, record.headers.get('content-type', ''))
+            extract_page(html, url)
+        elapsed = time.perf_counter() - start
+        print(f"全ページの読み出し+解析（stdlib）: {elapsed:.2f}秒（{page_count / elapsed:.0f}ページ/秒）")
+        reader.close()
+    return 1 if failed else 0
+
+
+# --- リンクの表（重複の除去・URLの解決・links site: / links /正規表現/） ---
+
+RESOLVE_BASES = ('https://example.com/dir/page.html', 'https://example.com/dir/', 'https://example.com',
+                 'http://user@example.com:8080/a/b/c?q=1#frag', 'https://example.com/a;p?q')
+RESOLVE_HREFS = ('x.html', './x', '../x', '../../../../x', '/abs', '//other.example/p', '?q=2', '#top', '',
+                 '.', '..', './', 'a/./b/../c', '/a/b/..', 'https://other.example/', 'HTTP://Example.com/X',
+                 'mailto:a@example.com', 'javascript:void(0)', ';params', 'a?', 'a#', 'sub/dir/', '/a//b',
+                 'http:relative', 'ftp://example.com/f', ' spaced ', 'ｊａ/日本語?ｑ=1')
+
+
+def generate_duplicate_links_page(count: int) -> str:
+    """リンクが count 個あり、その多くが同じURLへのリンク（ナビゲーション・外部サイト・ページ内）のページ"""
+    parts = ['<html><head><title>Links</title></head><body>\n']
+    for i in range(count // 4):
+        k = i % 500
+        parts.append(f'<a href="/article/{k}">Article {k}</a> <a href="related/{k}?ref=nav">Related</a> '
+                     f'<a href="https://cdn{k % 7}.example.org/p/{i}">Ext {i}</a> <a href="#s{k}">Section</a>\n')
+    parts.append('</body></html>\n')
+    return ''.join(parts)
+
+
+def bench_links(count: int) -> int:
+    """URLの解決（urljoin との一致・速さ）と、リンクの表の作成・絞り込みの時間を測定
+
+    UrlResolver の結果が urllib.parse.urljoin と違えば 1 を返す。
+    """
+    failed = False
+    mismatches = [(base, href) for base in RESOLVE_BASES + ('',) for href in RESOLVE_HREFS
+                  if UrlResolver(base).resolve(href) != urllib.parse.urljoin(base, href)]
+    for base, href in mismatches:
+        print(f"  ❌ urljoin と違う結果: {base!r} + {href!r}")
+        failed = True
+    print(f"URLの解決: {len(RESOLVE_BASES) + 1}個の基準URL × {len(RESOLVE_HREFS)}個の href で urljoin と"
+          f"{'異なる結果があります' if mismatches else '一致'}")
+
+    html = generate_duplicate_links_page(count)
+    hrefs = re.findall(r'href="([^"]*)"', html)
+    join_time = best_of(lambda: [urllib.parse.urljoin(BASE_URL, href) for href in hrefs], 3)
+
+    def resolve_all():
+        resolver = UrlResolver(BASE_URL)  # 基準URLの分解と解決済みの href の記憶は1ページ分
+        return [resolver.resolve(href) for href in hrefs]
+
+    resolve_time = best_of(resolve_all, 3)
+    print(f"{len(hrefs)}個の href の解決: urljoin {join_time * 1000:.0f}ms  "
+          f"UrlResolver {resolve_time * 1000:.0f}ms（{join_time / max(resolve_time, 1e-9):.1f}倍）")
+
+    extract_time = best_of(lambda: extract_page(html, BASE_URL), 3)
+    _, links, _ = extract_page(html, BASE_URL)
+    print(f"抽出（stdlib）: {extract_time * 1000:.0f}ms  リンク {len(hrefs)}個 → 重複を除いて {len(links)}個"
+          f"（ホスト {len(links.host_names)}個）")
+
+    print(f"{'query':<28} {'hits':>6} {'table':>9} {'scan':>9}")
+    for query, scan in (
+            ('site:cdn3.example.org', lambda url, text: urllib.parse.urlsplit(url).hostname == 'cdn3.example.org'),
+            ('site:example.org/p/1', lambda url, text: (urllib.parse.urlsplit(url).hostname or '').endswith('example.org')
+             and urllib.parse.urlsplit(url).path.startswith('/p/1')),
+            ('site:bench.example.com', lambda url, text: urllib.parse.urlsplit(url).hostname == 'bench.example.com'),
+            ('/article 4\\d\\d/', lambda url, text: re.search(r'article 4\d\d', text, re.IGNORECASE)
+             or re.search(r'article 4\d\d', url, re.IGNORECASE))):
+        table = LinkTable(links)  # 索引は最初の検索で作るので、その時間も含める
+        start = time.perf_counter()
+        hits = table.query(query)
+        table_time = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = [number for number, (url, text) in enumerate(links) if scan(url, text)]
+        scan_time = time.perf_counter() - start
+        repeat_time = best_of(lambda: table.query(query), 3)
+        print(f"{query:<28} {len(hits):>6} {table_time * 1000:7.2f}ms {scan_time * 1000:7.2f}ms"
+              f"（2回目以降 {repeat_time * 1000:.2f}ms）")
+        if hits != expected:
+            print(f"  ❌ 走査した結果（{len(expected)}個）と一致しません")
+            failed = True
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Browser Benchmark")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = subparsers.add_parser('extract', help="HTML抽出のスループット比較")
+    extract_parser.add_argument('--sizes', default='1,5,20', help="ページサイズ（MB、カンマ区切り）")
+    extract_parser.add_argument('--repeat', type=int, default=3, help="繰り返し回数")
+
+    fetch_parser = subparsers.add_parser('fetch', help="取得方式ごとの1回あたりの遅延比較")
+    fetch_parser.add_argument('--count', type=int, default=50, help="取得回数")
+
+    search_parser = subparsers.add_parser('search', help="全文検索インデックスの追加・検索時間")
+    search_parser.add_argument('--pages', type=int, default=5000, help="インデックスに入れるページ数")
+
+    parsers_parser = subparsers.add_parser('parsers', help="パーサーごとのスループットと出力の一致")
+    parsers_parser.add_argument('--size', type=float, default=2, help="ページサイズ（MB）")
+    parsers_parser.add_argument('--repeat', type=int, default=3, help="繰り返し回数")
+
+    charset_parser = subparsers.add_parser('charset', help="文字コード判定とデコードの速さ・正しさ")
+    charset_parser.add_argument('--sizes', default='0.1,1,5', help="ページサイズ（MB、カンマ区切り）")
+    charset_parser.add_argument('--repeat', type=int, default=5, help="繰り返し回数")
+
+    suite_parser = subparsers.add_parser('suite', help="ローカルサーバーのコーパスで取得・解析・表示を測定")
+    suite_parser.add_argument('--repeat', type=int, default=20, help="1測定あたりの最大回数")
+    suite_parser.add_argument('--budget', type=float, default=5.0,
+                              help="1測定あたりの時間の目安（秒、超えたら最低3回で打ち切り）")
+    suite_parser.add_argument('--quick', action='store_true', help="20MBのページを除く")
+    suite_parser.add_argument('--output', default='', help="結果を保存するJSONファイル")
+
+    compare_parser = subparsers.add_parser('compare', help="2つの suite の結果を比較")
+    compare_parser.add_argument('old', help="比較元のJSON")
+    compare_parser.add_argument('new', help="比較先のJSON")
+
+    startup_parser = subparsers.add_parser('startup', help="起動時間（python -X importtime）と回帰の検出")
+    startup_parser.add_argument('--repeat', type=int, default=10, help="繰り返し回数")
+    startup_parser.add_argument('--max-ms', type=float, default=0,
+                                help="読み込み時間の中央値の上限（ms、超えたら終了コード1）")
+
+    memory_parser = subparsers.add_parser('memory', help="巨大なページの取得・解析のピークRSS")
+    memory_parser.add_argument('--size', type=float, default=100, help="ページサイズ（MB）")
+
+    pathological_parser = subparsers.add_parser('pathological', help="壊れた文書での解析時間と、上限付きのワーカー")
+    pathological_parser.add_argument('--count', type=int, default=40000, help="文書を作るときの繰り返し回数")
+    pathological_parser.add_argument('--timeout', type=float, default=3, help="1文書あたりのCPU時間の上限（秒）")
+
+    archive_parser = subparsers.add_parser('archive', help="WARCアーカイブの記録・索引での読み出し・再解析")
+    archive_parser.add_argument('--pages', type=int, default=5000, help="記録するページ数")
+
+    links_parser = subparsers.add_parser('links', help="URLの解決とリンクの表の作成・絞り込み")
+    links_parser.add_argument('--count', type=int, default=50000, help="ページのリンクの数")
+
+    args = parser.parse_args()
+    if args.command == 'extract':
+        bench_extract([float(s) for s in args.sizes.split(',')], args.repeat)
+    elif args.command == 'fetch':
+        bench_fetch(args.count)
+    elif args.command == 'search':
+        bench_search(args.pages)
+    elif args.command == 'parsers':
+        bench_parsers(args.size, args.repeat)
+    elif args.command == 'charset':
+        bench_charset([float(s) for s in args.sizes.split(',')], args.repeat)
+    elif args.command == 'suite':
+        bench_suite(args.repeat, args.budget, not args.quick, args.output)
+    elif args.command == 'compare':
+        bench_compare(args.old, args.new)
+    elif args.command == 'startup':
+        sys.exit(bench_startup(args.repeat, args.max_ms))
+    elif args.command == 'memory':
+        bench_memory(args.size)
+    elif args.command == 'pathological':
+        sys.exit(bench_pathological(args.count, args.timeout))
+    elif args.command == 'archive':
+        sys.exit(bench_archive(args.pages))
+    elif args.command == 'links':
+        sys.exit(bench_links(args.count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Charset Detection
+HTMLのバイト列から文字コードを決める（本文全体を調べずに先頭数KBだけで判定）
+
+BOM → HTTPヘッダーの charset → 先頭 SNIFF_BYTES 内の <meta charset> の順に調べ、
+どれも無ければ先頭部分が UTF-8 として正しいかを確かめ、正しくなければ
+EUC-JP・Shift_JIS（cp932）を試します。判定後は1回だけ（またはチャンクごとに逐次）デコードします。
+"""
+
+import codecs
+import re
+from typing import Optional, Tuple
+
+# <meta charset> を探す範囲
+SNIFF_BYTES = 4096
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# <meta charset="..."> と <meta http-equiv="Content-Type" content="...; charset=..."> の両方に一致
+META_CHARSET_RE = re.compile(rb'<meta[^>]*?charset\s*=\s*["\']?\s*([a-zA-Z0-9_:.\-]+)', re.IGNORECASE)
+
+# Pythonのコーデック名 -> 実際にデコードに使うコーデック
+# Shift_JIS はWebではWindowsの拡張文字（①、㈱ など）を含む cp932 として扱われる。
+# ISO-8859-1 と ASCII も同様に cp1252 として扱う（WHATWG Encoding Standard）。
+CODEC_OVERRIDES = {
+    'shift_jis': 'cp932',
+    'latin-1': 'cp1252',
+    'iso8859-1': 'cp1252',
+    'ascii': 'cp1252',
+}
+
+# codecs が知らないラベルの別名
+LABEL_ALIASES = {
+    'x-sjis': 'cp932',
+    'windows-31j': 'cp932',
+    'x-euc-jp': 'euc_jp',
+}
+
+# 宣言が無く UTF-8 でもない場合に試す文字コード（EUC-JPの本文は cp932 としても
+# 誤ってデコードできてしまうことが多いので、EUC-JP を先に試す）
+JAPANESE_FALLBACKS = ('euc_jp', 'cp932')
+
+
+def normalize_charset(label: str) -> Optional[str]:
+    """charset のラベルをデコードに使うコーデック名にする（不明なら None）"""
+    label = label.strip().strip('"\'').lower()
+    if not label:
+        return None
+    if label in LABEL_ALIASES:
+        return LABEL_ALIASES[label]
+    try:
+        name = codecs.lookup(label).name
+    except LookupError:
+        return None
+    return CODEC_OVERRIDES.get(name, name)
+
+
+def header_charset(content_type: str) -> Optional[str]:
+    """Content-Type ヘッダーの charset パラメータ"""
+    for param in (content_type or '').split(';')[1:]:
+        name, _, value = param.strip().partition('=')
+        if name.strip().lower() == 'charset':
+            return normalize_charset(value)
+    return None
+
+
+def _bom_encoding(head: bytes) -> Optional[str]:
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+
+def _valid_prefix(head: bytes, encoding: str) -> bool:
+    """末尾で文字が途切れていても、そこまでが正しく符号化されているか"""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(head, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def sniff_encoding(head: bytes, declared: Optional[str] = None) -> str:
+    """先頭のバイト列（SNIFF_BYTES 程度）とHTTPヘッダーの宣言から文字コードを決める"""
+    bom = _bom_encoding(head)
+    if bom:
+        return bom
+    if declared:
+        return declared
+    match = META_CHARSET_RE.search(head[:SNIFF_BYTES])
+    if match:
+        encoding = normalize_charset(match.group(1).decode('ascii'))
+        if encoding:
+            # ASCII互換のバイト列の中で宣言された UTF-16 は実際には UTF-8
+            return 'utf-8' if encoding.startswith('utf_16') or encoding == 'utf-16' else encoding
+    head = head[:SNIFF_BYTES]
+    if _valid_prefix(head, 'utf-8'):
+        return 'utf-8'
+    for encoding in JAPANESE_FALLBACKS:
+        if _valid_prefix(head, encoding):
+            return encoding
+    return 'utf-8'
+
+
+def decode_html(body: bytes, content_type: str = '') -> Tuple[str, str]:
+    """本文を判定した文字コードで1回だけデコードし、(文字列, 文字コード) を返す"""
+    encoding = sniff_encoding(body[:SNIFF_BYTES], header_charset(content_type))
+    return body.decode(encoding, errors='replace'), encoding
@@ -0,0 +1,160 @@
+"""
+Content Coding
+HTTPの圧縮転送（Content-Encoding）の伸長と、保存する本文の圧縮
+
+gzip・deflate は標準ライブラリの zlib で、br は brotli（または brotlicffi）、
+zstd は zstandard がインストールされている場合だけ対応します。
+Accept-Encoding には伸長できる方式だけを並べ、伸長はチャンク単位で行うので
+ストリーミング読み込みでも本文全体を待たずに抽出を始められます。
+"""
+
+import importlib.util
+import zlib
+from typing import Iterable, Iterator, List
+
+# 保存用の圧縮レベル（メモリ上は速さ優先、ディスクは書き込みが1回なので圧縮率優先）
+MEMORY_LEVEL = 1
+DISK_LEVEL = 6
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def supported_codings() -> List[str]:
+    """伸長できる Content-Encoding（優先順）"""
+    codings = []
+    if _installed('zstandard'):
+        codings.append('zstd')
+    if _installed('brotli') or _installed('brotlicffi'):
+        codings.append('br')
+    return codings + ['gzip', 'deflate']
+
+
+ACCEPT_ENCODING = ', '.join(supported_codings())
+
+
+class _ZlibDecoder:
+    """gzip・deflate の伸長（deflate は zlib 形式と生の deflate の両方を受け付ける）"""
+
+    def __init__(self, coding: str):
+        self._gzip = coding in ('gzip', 'x-gzip')
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if self._gzip else None
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._decompressor is None:
+            if not data:
+                return b''
+            # 先頭がzlibヘッダー（CMF=8）でなければ生のdeflateとみなす
+            wbits = zlib.MAX_WBITS if data[0] & 0x0f == 8 else -zlib.MAX_WBITS
+            self._decompressor = zlib.decompressobj(wbits)
+        output = self._decompressor.decompress(data)
+        # gzipは複数のメンバーが連結されていることがある
+        while self._gzip and self._decompressor.eof and self._decompressor.unused_data:
+            rest = self._decompressor.unused_data
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            output += self._decompressor.decompress(rest)
+        return output
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush() if self._decompressor else b''
+
+
+class _BrotliDecoder:
+    def __init__(self):
+        try:
+            import brotli
+        except ImportError:
+            import brotlicffi as brotli
+        self._decompressor = brotli.Decompressor()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.process(data) if data else b''
+
+    def flush(self) -> bytes:
+        return b''
+
+
+class _ZstdDecoder:
+    def __init__(self):
+        import zstandard
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data) if data else b''
+
+    def flush(self) -> bytes:
+        return b''
+
+
+class _Chain:
+    """複数の方式が重ねて適用されている場合（Content-Encoding: gzip, br など）"""
+
+    def __init__(self, decoders: List):
+        self._decoders = decoders
+
+    def decompress(self, data: bytes) -> bytes:
+        for decoder in self._decoders:
+            data = decoder.decompress(data)
+        return data
+
+    def flush(self) -> bytes:
+        data = b''
+        for decoder in self._decoders:
+            data = decoder.decompress(data) + decoder.flush()
+        return data
+
+
+class _Identity:
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b''
+
+
+def make_decoder(content_encoding: str):
+    """Content-Encoding の値から、decompress(chunk) / flush() を持つ伸長器を作る"""
+    codings = [c.strip().lower() for c in (content_encoding or '').split(',')]
+    codings = [c for c in codings if c and c != 'identity']
+    decoders = []
+    # 適用された順に並んでいるので、逆順に伸長する
+    for coding in reversed(codings):
+        if coding in ('gzip', 'x-gzip', 'deflate'):
+            decoders.append(_ZlibDecoder(coding))
+        elif coding == 'br':
+            decoders.append(_BrotliDecoder())
+        elif coding == 'zstd':
+            decoders.append(_ZstdDecoder())
+        else:
+            raise ValueError(f"未対応の Content-Encoding です: {coding}")
+    if not decoders:
+        return _Identity()
+    return decoders[0] if len(decoders) == 1 else _Chain(decoders)
+
+
+def decode_chunks(chunks: Iterable[bytes], content_encoding: str) -> Iterator[bytes]:
+    """圧縮された本文のチャンク列を、伸長したチャンク列にする"""
+    decoder = make_decoder(content_encoding)
+    for chunk in chunks:
+        data = decoder.decompress(chunk)
+        if data:
+            yield data
+    data = decoder.flush()
+    if data:
+        yield data
+
+
+def decode_body(body: bytes, content_encoding: str) -> bytes:
+    """圧縮された本文全体を伸長する"""
+    decoder = make_decoder(content_encoding)
+    return decoder.decompress(body) + decoder.flush()
+
+
+def compress_text(text: str, level: int = MEMORY_LEVEL) -> bytes:
+    """保存用にHTMLを圧縮（UTF-8にしてzlib形式で）"""
+    return zlib.compress(text.encode('utf-8', 'surrogatepass'), level)
+
+
+def decompress_text(data: bytes) -> str:
+    return zlib.decompress(data).decode('utf-8', 'surrogatepass')
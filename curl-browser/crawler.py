@@ -0,0 +1,196 @@
+"""
+Batch Crawler
+複数のURLを並行して取得・抽出し、JSON Lines で出力する非対話モード
+
+使用方法:
+python enhanced_browser.py crawl urls.txt > pages.jsonl
+cat urls.txt | python enhanced_browser.py crawl - --concurrency 16 --per-host 4
+
+取得はスレッドプール（requestsのセッションを共有）で行い、
+CPUを使う解析は常駐するワーカープロセス（parse_worker）に回します。
+1ページの解析がCPU時間の上限（--parse-timeout）を超えたら、1パス抽出器で抽出し直します。
+"""
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Callable, Dict, Mapping, Optional, TextIO
+
+import enhanced_browser
+from charset import decode_html
+from http_pool import ConnectionPool, HostLimiter
+from media_type import check_html
+from parse_worker import DEFAULT_TIMEOUT, ParsePool
+from parsers import BACKEND_NAMES, get_backend
+from spool import DEFAULT_MAX_BYTES, read_body
+from streaming import response_chunks, CHUNK_SIZE
+
+
+def make_fetcher(pool_size: int, max_bytes: int = DEFAULT_MAX_BYTES) -> Callable[[str], str]:
+    """URLを受け取ってHTMLを返す関数を作成（requestsがあれば共有セッション、無ければ接続プール）
+
+    HTML以外のレスポンスは本文を読まずに NotHtmlError を送出する（取得の失敗として扱われる）。
+    本文は max_bytes まで少しずつ読み、超えた分は読まずに先頭だけを解析する。
+    """
+    if enhanced_browser.ENHANCED_MODE:
+        session = enhanced_browser.create_session(pool_size)
+
+        def fetch(url: str) -> str:
+            with session.get(url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                check_html(url, response.status_code, response.headers)
+                body, truncated = read_body(response_chunks(response), max_bytes)
+            return decode_body(url, body, truncated, response.headers)
+        return fetch
+
+    pool = ConnectionPool(enhanced_browser.USER_AGENT)
+
+    def fetch(url: str) -> str:
+        response = pool.open(url)
+        try:
+            if response.status >= 400:
+                raise RuntimeError(f"HTTP {response.status}")
+            check_html(url, response.status, response.headers)
+            body, truncated = read_body(response.iter_chunks(CHUNK_SIZE), max_bytes)
+        finally:
+            response.close()
+        return decode_body(url, body, truncated, response.headers)
+    return fetch
+
+
+def decode_body(url: str, body: bytes, truncated: bool, headers: Mapping[str, str]) -> str:
+    """取得した本文を文字列にする（上限で打ち切ったときは標準エラーに知らせる）"""
+    if truncated:
+        print(f"本文が上限を超えたため、先頭だけを抽出しました: {url}", file=sys.stderr)
+    return decode_html(body, headers.get('content-type', ''))[0]
+
+
+def make_parse_pool(parser: Optional[str] = None, parse_workers: Optional[int] = None,
+                    parse_timeout: float = DEFAULT_TIMEOUT) -> ParsePool:
+    """解析用のワーカープロセスのプール（デフォルトはCPU数）"""
+    return ParsePool(parser, parse_workers or os.cpu_count() or 1, parse_timeout)
+
+
+def extract_record(parse_pool: ParsePool, html: str, url: str) -> Dict:
+    """ワーカープロセスで解析して出力用のレコードを作る（解析用のスレッドで実行）"""
+    (text_content, links, meta_info), _, timed_out = parse_pool.parse(html, url)
+    if timed_out:
+        print(f"解析が{parse_pool.timeout:g}秒で終わらなかったため、1パス抽出器で抽出しました: {url}",
+              file=sys.stderr)
+    return {
+        'url': url,
+        'title': meta_info.get('title', ''),
+        'description': meta_info.get('description', ''),
+        'text': text_content,
+        'links': [{'url': href, 'text': link_text} for href, link_text in links],
+    }
+
+
+def read_urls(source: TextIO) -> Iterator[str]:
+    """1行1URLのリストを読む（空行と#で始まる行は無視）"""
+    for line in source:
+        url = line.strip()
+        if not url or url.startswith('#'):
+            continue
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        yield url
+
+
+def crawl(urls: Iterable[str], out: TextIO, concurrency: int = 8, per_host: int = 2,
+          parse_workers: Optional[int] = None, fetch: Optional[Callable[[str], str]] = None,
+          parser: Optional[str] = None, parse_timeout: float = DEFAULT_TIMEOUT,
+          max_bytes: int = DEFAULT_MAX_BYTES) -> int:
+    """URLを並行して取得・解析し、JSON Lines を out に書き出す
+
+    同時に処理中のURLは concurrency の2倍までに抑えるので、
+    巨大なURLリストでもメモリ使用量は一定です。成功した件数を返します。
+    """
+    fetch = fetch or make_fetcher(concurrency, max_bytes)
+    host_limiter = HostLimiter(per_host)
+    in_flight = threading.BoundedSemaphore(concurrency * 2)
+    results = queue.Queue()
+    done = object()
+    written = 0
+
+    with make_parse_pool(parser, parse_workers, parse_timeout) as parse_pool, \
+            ThreadPoolExecutor(concurrency) as fetchers, ThreadPoolExecutor(len(parse_pool.workers)) as parsers:
+
+        def task(url: str):
+            try:
+                with host_limiter.slot(url):
+                    html = fetch(url)
+                future = parsers.submit(extract_record, parse_pool, html, url)
+                future.add_done_callback(lambda f: results.put((url, f, None)))
+            except Exception as e:
+                results.put((url, None, e))
+
+        def feeder():
+            count = 0
+            try:
+                for url in urls:
+                    in_flight.acquire()
+                    fetchers.submit(task, url)
+                    count += 1
+            finally:
+                results.put((done, count, None))
+
+        threading.Thread(target=feeder, daemon=True).start()
+
+        total = None
+        finished = 0
+        while total is None or finished < total:
+            url, future, error = results.get()
+            if url is done:
+                total = future
+                continue
+            finished += 1
+            in_flight.release()
+            if error is None:
+                try:
+                    record = future.result()
+                except Exception as e:
+                    error = e
+            if error is not None:
+                print(f"取得に失敗しました: {url}: {error}", file=sys.stderr)
+                continue
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            written += 1
+
+    return written
+
+
+def crawl_main(argv):
+    parser = argparse.ArgumentParser(prog='enhanced_browser.py crawl',
+                                     description="URLリストを並行して取得し、JSON Linesで出力")
+    parser.add_argument('file', nargs='?', default='-', help="URLリストのファイル（- で標準入力）")
+    parser.add_argument('--concurrency', type=int, default=8, help="全体の同時取得数")
+    parser.add_argument('--per-host', type=int, default=2, help="1ホストあたりの同時取得数")
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help="解析用プロセス数（デフォルト: CPU数）")
+    parser.add_argument('--parser', choices=('auto',) + BACKEND_NAMES, default='auto',
+                        help="HTML解析に使うパーサー（デフォルト: インストール済みで最速のもの）")
+    parser.add_argument('--parse-timeout', type=float, default=DEFAULT_TIMEOUT, metavar='SEC',
+                        help="1ページの解析のCPU時間の上限（超えたら1パス抽出器で抽出し直す。0で無制限）")
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="本文の大きさの上限（MB、超えた分は読まずに先頭だけを抽出。0で無制限）")
+    args = parser.parse_args(argv)
+    try:
+        get_backend(args.parser)
+    except ValueError as e:
+        parser.error(str(e))
+
+    max_bytes = int(args.max_mb * 1024 * 1024)
+    if args.file == '-':
+        count = crawl(read_urls(sys.stdin), sys.stdout, args.concurrency, args.per_host, args.parse_workers,
+                      parser=args.parser, parse_timeout=args.parse_timeout, max_bytes=max_bytes)
+    else:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            count = crawl(read_urls(f), sys.stdout, args.concurrency, args.per_host, args.parse_workers,
+                          parser=args.parser, parse_timeout=args.parse_timeout, max_bytes=max_bytes)
+    print(f"{count}件のページを出力しました。", file=sys.stderr)
@@ -0,0 +1,233 @@
+"""
+Disk Cache
+再起動後も残るディスク上のHTTPレスポンスキャッシュ
+
+レスポンス本文は内容のSHA-256をファイル名にして objects/ 以下に保存し
+（同じ内容は1つだけ保存される）、URLごとのメタ情報は index.db（SQLite）に記録します。
+本文はzlibで圧縮して保存し、読み込むときに展開します。
+索引は1件ごとに行を書き換えるだけなので、キャッシュが何万件あっても保存の時間は変わりません。
+WALモードで1件ずつコミットするので、途中で強制終了しても壊れません。
+データベースは最初にキャッシュを読み書きするときに開くので、起動時間には影響しません。
+Cache-Control の max-age が切れていなければネットワークにアクセスせず、
+切れていれば ETag / Last-Modified を使って再検証します。
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zlib
+from typing import Optional, Dict, Tuple
+
+from content_coding import DISK_LEVEL
+from page_cache import normalize_url
+
+SCHEMA_VERSION = 1
+
+# entries テーブルの列（CacheEntry の属性と同じ順）
+COLUMNS = ('digest', 'encoding', 'etag', 'last_modified', 'stored_at', 'max_age')
+
+
+def default_cache_dir() -> str:
+    """キャッシュディレクトリのデフォルト値（XDG_CACHE_HOMEを尊重）"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'terminal-browser')
+
+
+def parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    """Cache-Controlヘッダーを辞書に変換"""
+    directives = {}
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition('=')
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def parse_header_dump(text: str) -> Tuple[int, Dict[str, str]]:
+    """curl -D で保存したヘッダーから最後のレスポンスのステータスとヘッダーを取り出す"""
+    status = 0
+    headers = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('HTTP/'):
+            # リダイレクトごとに新しいブロックが始まる
+            fields = line.split()
+            status = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else 0
+            headers = {}
+        elif ':' in line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+class CacheEntry:
+    """索引（entries テーブル）の1エントリ"""
+
+    __slots__ = ('url', 'digest', 'encoding', 'etag', 'last_modified', 'stored_at', 'max_age')
+
+    def __init__(self, url: str, data: Dict):
+        self.url = url
+        self.digest = data['digest']
+        self.encoding = data.get('encoding') or 'utf-8'
+        self.etag = data.get('etag', '')
+        self.last_modified = data.get('last_modified', '')
+        self.stored_at = data.get('stored_at', 0.0)
+        self.max_age = data.get('max_age', 0)
+
+    def is_fresh(self) -> bool:
+        """max-age の期限内かどうか"""
+        return time.time() - self.stored_at < self.max_age
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """再検証用の条件付きリクエストヘッダー"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_dict(self) -> Dict:
+        return {
+            'digest': self.digest,
+            'encoding': self.encoding,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'stored_at': self.stored_at,
+            'max_age': self.max_age,
+        }
+
+
+class DiskCache:
+    """内容アドレス方式のディスクキャッシュ"""
+
+    def __init__(self, directory: str = ""):
+        self.directory = directory or os.path.join(default_cache_dir(), 'http')
+        self.objects_dir = os.path.join(self.directory, 'objects')
+        self.index_path = os.path.join(self.directory, 'index.db')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> 'sqlite3.Connection':
+        """初めて使うときに接続する（sqlite3 もそのときに読み込む）"""
+        with self._lock:
+            if self._conn is None:
+                import sqlite3
+                # ストリーミング読み込みの完了と非同期の取得のどちらのスレッドからでも使えるように
+                conn = sqlite3.connect(self.index_path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    self._create_schema(conn)
+                self._conn = conn
+            return self._conn
+
+    @staticmethod
+    def _create_schema(conn: 'sqlite3.Connection'):
+        with conn:
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    encoding TEXT NOT NULL,
+                    etag TEXT NOT NULL,
+                    last_modified TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    max_age INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_by_digest ON entries (digest);
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """URLに対応するエントリを取得（本文ファイルが無ければNone）"""
+        key = normalize_url(url)
+        row = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM entries WHERE url = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        entry = CacheEntry(key, dict(zip(COLUMNS, row)))
+        if not os.path.exists(self._object_path(entry.digest)):
+            return None
+        return entry
+
+    def read_body(self, entry: CacheEntry) -> bytes:
+        """保存された本文を読み込む"""
+        with open(self._object_path(entry.digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def read_text(self, entry: CacheEntry) -> str:
+        """保存された本文を文字列として読み込む"""
+        return self.read_body(entry).decode(entry.encoding, errors='replace')
+
+    def store(self, url: str, body: bytes, headers: Dict[str, str], encoding: str = 'utf-8'):
+        """レスポンスを保存（no-store が指定されていれば何もしない）"""
+        headers = {k.lower(): v for k, v in headers.items()}
+        directives = parse_cache_control(headers.get('cache-control', ''))
+        if 'no-store' in directives:
+            return
+
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zlib.compress(body, DISK_LEVEL))
+            os.replace(tmp_path, path)
+
+        key = normalize_url(url)
+        with self.conn:
+            old = self.conn.execute("SELECT digest FROM entries WHERE url = ?", (key,)).fetchone()
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO entries (url, {', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, digest, encoding or 'utf-8', headers.get('etag', ''), headers.get('last-modified', ''),
+                 time.time(), _max_age(directives)))
+        if old and old[0] != digest:
+            self._drop_object(old[0])
+
+    def refresh(self, url: str, headers: Dict[str, str]):
+        """304 Not Modified を受け取ったときに鮮度情報を更新"""
+        headers = {k.lower(): v for k, v in headers.items()}
+        changes = {'stored_at': time.time()}
+        if 'cache-control' in headers:
+            changes['max_age'] = _max_age(parse_cache_control(headers['cache-control']))
+        if headers.get('etag'):
+            changes['etag'] = headers['etag']
+        if headers.get('last-modified'):
+            changes['last_modified'] = headers['last-modified']
+        assignments = ', '.join(f"{name} = ?" for name in changes)
+        with self.conn:
+            self.conn.execute(f"UPDATE entries SET {assignments} WHERE url = ?",
+                              (*changes.values(), normalize_url(url)))
+
+    def _drop_object(self, digest: str):
+        """どのURLからも参照されなくなった本文を削除"""
+        if self.conn.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+            return
+        try:
+            os.remove(self._object_path(digest))
+        except OSError:
+            pass
+
+
+def _max_age(directives: Dict[str, Optional[str]]) -> int:
+    """キャッシュの有効期間（秒）。no-cache の場合は毎回再検証する"""
+    if 'no-cache' in directives:
+        return 0
+    value = directives.get('max-age') or ''
+    return int(value) if value.isdigit() else 0
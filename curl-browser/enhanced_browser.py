@@ -8,89 +8,468 @@ pip install beautifulsoup4 requests
 
 使用方法:
 python enhanced_browser.py [URL]
+python enhanced_browser.py crawl [URLリストのファイル]  # 非対話の一括抽出（JSON Lines出力）
+python enhanced_browser.py spider [開始URL]  # 同じサイト内をリンクでたどって一括抽出
+python enhanced_browser.py --offline [URL]  # --record で記録したWARCアーカイブから表示
 """
 
-import subprocess
+import argparse
+import importlib.util
+import re
 import sys
 import os
+import tempfile
+import threading
+import time
 import urllib.parse
 from typing import Optional, List, Tuple, Dict
 
-try:
-    from bs4 import BeautifulSoup
-    import requests
-    ENHANCED_MODE = True
-except ImportError:
-    ENHANCED_MODE = False
+from page_cache import PageCache, ParsedPage, content_digest, DEFAULT_CACHE_BYTES
+from charset import decode_html, header_charset
+from disk_cache import CacheEntry, DiskCache, parse_header_dump
+from history_store import HistoryStore, default_history_path
+from html_extract import extract_page
+from streaming import StreamingLoad, curl_stream, response_chunks, CHUNK_SIZE
+from http_pool import ConnectionPool
+from media_type import NotHtmlError, check_header_dump, check_html, format_size, is_html, save_chunks, suggested_filename
+from pager import MAX_LINK_MATCHES, PageView, is_pager_command, link_query, write_screen
+from prefetch import Prefetcher
+from parsers import BACKEND_NAMES, get_backend, parse_until
+from search_index import PageIndex, default_index_path
+from spool import DEFAULT_MAX_BYTES, read_body, run_capped, truncate_body
+from timing import Timings, profiled, split_curl_timing, CURL_WRITE_OUT
+
+# bs4 と requests は読み込むのに時間がかかるので、ここでは有無だけを調べ、
+# 実際に使うとき（最初の取得・解析）に読み込む
+ENHANCED_MODE = all(importlib.util.find_spec(name) is not None for name in ('bs4', 'requests'))
+# 解析用のワーカープロセス（spawn）もこのファイルを __mp_main__ として読み込むので、そこでは表示しない
+if not ENHANCED_MODE and __name__ != '__mp_main__':
     print("注意: beautifulsoup4とrequestsがインストールされていません。")
     print("基本機能のみで動作します。")
     print("pip install beautifulsoup4 requests でインストールできます。")
 
+USER_AGENT = 'Enhanced-Terminal-Browser/1.0 (curl-based)'
+
+# 1画面に表示する行数とリンク数
+SCREEN_LINES = 150
+SCREEN_LINKS = 25
+
+# --early-stop のとき、この画面数分の行とリンクが集まったら解析を打ち切る
+EARLY_STOP_SCREENS = 4
+
+# watch コマンドの確認の間隔（秒）
+DEFAULT_WATCH_INTERVAL = 60.0
+
+# 1ページの解析のCPU時間の上限（秒、parse_worker.DEFAULT_TIMEOUT と同じ。multiprocessing は解析するときに読み込む）
+DEFAULT_PARSE_TIMEOUT = 10.0
+
+def format_link(number: int, url: str, text: str) -> List[str]:
+    """リンク一覧の1項目"""
+    return [f"  {number:2d}. {text[:70]}...", f"      -> {url}"]
+
+def create_session(pool_size: int = 10) -> 'requests.Session':
+    """接続プール付きのrequestsセッションを作成"""
+    import requests
+    import requests.adapters
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def search_url(query: str) -> str:
+    return f"https://www.google.com/search?q={urllib.parse.quote(query)}"
+
 class EnhancedBrowser:
-    def __init__(self):
+    def __init__(self, cache_bytes: int = DEFAULT_CACHE_BYTES, disk_cache: Optional[DiskCache] = None,
+                 streaming: bool = False, use_curl: bool = False, prefetch: int = 0,
+                 page_index: Optional[PageIndex] = None, parser: Optional[str] = None,
+                 timings: Optional[Timings] = None, profile: bool = False,
+                 history_store: Optional[HistoryStore] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 early_stop: bool = False, parse_timeout: float = DEFAULT_PARSE_TIMEOUT,
+                 recorder: Optional['WarcWriter'] = None, archive: Optional['ArchiveReader'] = None):
         self.current_url = ""
-        self.history = []
+        self.history = []  # このセッションの戻る/進む用
         self.history_index = -1
-        self.bookmarks = []
-        self.session = requests.Session() if ENHANCED_MODE else None
+        # 再起動後も残る閲覧履歴とブックマーク（指定が無ければ保存しない）
+        self.history_store = history_store if history_store is not None else HistoryStore(':memory:')
+        self.page_cache = PageCache(cache_bytes)
+        self.disk_cache = disk_cache
+        self.page_index = page_index  # 表示したページの全文検索インデックス（find コマンド）
+        self.parser = get_backend(parser)  # HTML解析に使うバックエンド（parsers.py）
+        self.timings = timings or Timings()  # フェーズごとの所要時間（stats コマンド）
+        self.profile = profile  # すべてのコマンドをプロファイルする
+        self.streaming = streaming
+        self.max_bytes = max_bytes  # 本文の大きさの上限（超えた分は読まない）
+        self.early_stop = early_stop  # 最初の数画面分の行とリンクが集まったら解析を打ち切る
+        self.parse_timeout = parse_timeout  # 1ページの解析のCPU時間の上限（秒、0ならワーカーを使わない）
+        self.recorder = recorder  # ネットワークから取得したレスポンスを記録するWARCアーカイブ（--record）
+        self.archive = archive  # ネットワークの代わりに使うWARCアーカイブ（--offline）
+        self.loading = None  # 読み込み中の (StreamingLoad, ステータス, レスポンスヘッダー)
+        self.view = None  # 表示中のページのページャ（more / page N / links page N / 検索）
+        self.skipped = None  # 最後に表示しなかったHTML以外のリンク（save で保存）
+        self._session = None  # requestsのセッション（最初の取得で作成）
+        self._async_client = None
+        self._parse_pool = None
+        self._lazy_lock = threading.Lock()
+        # requestsが無い場合は標準ライブラリの接続プールを使う（--curl 指定時はcurl）
+        self.pool = None if ENHANCED_MODE or use_curl else ConnectionPool('Enhanced-Terminal-Browser/1.0')
+        self.use_curl = use_curl
+        # 表示したリンクの上位prefetch件をバックグラウンドで先読みする（0なら無効）
+        self.prefetcher = Prefetcher(self.open_stream, self.page_cache, max_links=prefetch) if prefetch else None
+    
+    @property
+    def session(self) -> Optional['requests.Session']:
+        """requestsのセッション（requestsが無ければ None）。最初に使うときに requests を読み込んで作成"""
+        if not ENHANCED_MODE:
+            return None
+        with self._lazy_lock:  # 先読みのスレッドからも使われる
+            if self._session is None:
+                self._session = create_session()
+            return self._session
+    
+    @property
+    def async_client(self) -> 'AsyncHttpClient':
+        """requestsが無いときに対話ループでの取得に使うクライアント（最初に使うときに作成）"""
+        with self._lazy_lock:
+            if self._async_client is None:
+                from async_fetch import AsyncHttpClient
+                self._async_client = AsyncHttpClient(USER_AGENT, max_bytes=self.max_bytes)
+            return self._async_client
+    
+    @property
+    def parse_pool(self) -> Optional['ParsePool']:
+        """解析用のワーカープロセス（最初に使うときに作成）
         
-        if self.session:
-            self.session.headers.update({
-                'User-Agent': 'Enhanced-Terminal-Browser/1.0 (curl-based)'
-            })
+        1パス抽出器（stdlib）は壊れた文書でも線形時間で終わるので、ワーカーを使わずにこのプロセスで解析する
+        （--parse-timeout 0 のときも同じ）。その場合は None。
+        """
+        if not self.parse_timeout or self.parser.parse is extract_page:
+            return None
+        with self._lazy_lock:
+            if self._parse_pool is None:
+                from parse_worker import ParsePool
+                self._parse_pool = ParsePool(self.parser.name, timeout=self.parse_timeout)
+            return self._parse_pool
     
-    def fetch_page_curl(self, url: str) -> Optional[str]:
+    def curl_command(self, url: str, entry: Optional[CacheEntry], tmp_dir: str) -> Tuple[List[str], str]:
+        """ページ取得用のcurlコマンドと、レスポンスヘッダーの書き出し先を返す"""
+        header_path = os.path.join(tmp_dir, 'headers')
+        cmd = [
+            'curl', '-s', '-L', '--compressed',
+            '-H', 'User-Agent: Enhanced-Terminal-Browser/1.0',
+            '-H', 'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            '--max-time', '30',
+            '-D', header_path,
+            '-w', CURL_WRITE_OUT,
+        ]
+        # キャッシュがあれば条件付きリクエストで再検証
+        if entry and entry.etag:
+            etag_path = os.path.join(tmp_dir, 'etag')
+            with open(etag_path, 'w') as f:
+                f.write(entry.etag + '\n')
+            cmd += ['--etag-compare', etag_path]
+        if entry and entry.last_modified:
+            cmd += ['-z', entry.last_modified]
+        cmd.append(url)
+        return cmd, header_path
+    
+    def handle_response(self, url: str, entry: Optional[CacheEntry], status: int,
+                        headers: Dict[str, str], body: bytes, backend: str,
+                        truncated: bool = False) -> Optional[str]:
+        """取得したレスポンスをディスクキャッシュに反映して本文を返す（304なら保存済みの本文）
+        
+        truncated は本文が上限を超えて先頭だけを読んだことを表す（ディスクキャッシュには保存しない）。
+        """
+        self.timings.note(url=url, backend=backend, source='network', status=status, bytes=len(body))
+        if status == 304 and entry:
+            self.disk_cache.refresh(url, headers)
+            return self.read_disk_cache(url, entry, 'revalidated')
+        if status >= 400:
+            print(f"ページの取得に失敗しました: HTTP {status}")
+            return None
+        check_html(url, status, headers)
+        
+        with self.timings.phase('decode'):
+            text, encoding = decode_html(body, headers.get('content-type', ''))
+        if truncated:
+            self.warn_truncated()
+            return text
+        if self.disk_cache:
+            self.disk_cache.store(url, body, headers, encoding)
+        self.record_response(url, status, headers, body)
+        return text
+    
+    def record_response(self, url: str, status: int, headers: Dict[str, str], body: bytes):
+        """ネットワークから取得した（打ち切っていない）レスポンスをWARCアーカイブに記録（--record）"""
+        if self.recorder is None:
+            return
+        try:
+            self.recorder.write_response(url, status, headers, body)
+        except Exception as e:
+            print(f"⚠️  アーカイブに記録できませんでした: {e}")
+    
+    def warn_truncated(self):
+        print(f"⚠️  本文が上限（{self.max_bytes / 1024 / 1024:g}MB）を超えたため、先頭だけを表示します")
+    
+    def show_not_html(self, error: NotHtmlError):
+        """HTML以外のリンクは本文を読まずに要約だけを表示"""
+        self.skipped = error
+        print(f"📦 {error.summary()}")
+        print(f"💾 save [ファイル名] で保存できます: {error.url}")
+    
+    def fetch_page_curl(self, url: str, revalidate: bool = False) -> Optional[str]:
         """curlコマンドを使ってWebページを取得（フォールバック）"""
         try:
             if not url.startswith(('http://', 'https://')):
                 url = 'https://' + url
             
-            cmd = [
-                'curl', '-s', '-L',
-                '-H', 'User-Agent: Enhanced-Terminal-Browser/1.0',
-                '-H', 'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                '--max-time', '30',
-                url
-            ]
+            entry = self.disk_cache.lookup(url) if self.disk_cache else None
+            if entry and entry.is_fresh() and not revalidate:
+                return self.read_disk_cache(url, entry, 'disk')
             
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                cmd, header_path = self.curl_command(url, entry, tmp_dir)
+                # HTML以外なら本文が届き始めた時点でcurlを終了させる
+                returncode, stdout, stderr, truncated = run_capped(
+                    cmd, self.max_bytes, on_start=lambda: check_header_dump(url, header_path))
+                
+                if returncode != 0 and not truncated:
+                    print(f"curl エラー: {stderr.decode('utf-8', errors='replace')}")
+                    return None
+                
+                with open(header_path, 'r', encoding='latin-1') as f:
+                    status, headers = parse_header_dump(f.read())
             
-            if result.returncode == 0:
-                return result.stdout
-            else:
-                print(f"curl エラー: {result.stderr}")
-                return None
+            body, phases, _ = split_curl_timing(stdout)
+            body, cut = truncate_body(body, self.max_bytes)
+            self.timings.add_phases(phases)
+            return self.handle_response(url, entry, status, headers, body, 'curl', truncated or cut)
                 
+        except NotHtmlError as e:
+            self.show_not_html(e)
+            return None
         except Exception as e:
             print(f"ページの取得に失敗しました: {e}")
             return None
     
-    def fetch_page_requests(self, url: str) -> Optional[str]:
+    def fetch_page_http(self, url: str, revalidate: bool = False) -> Optional[str]:
+        """http.clientの接続プールを使ってWebページを取得（requestsが無い場合）"""
+        try:
+            if not url.startswith(('http://', 'https://')):
+                url = 'https://' + url
+            
+            entry = self.disk_cache.lookup(url) if self.disk_cache else None
+            if entry and entry.is_fresh() and not revalidate:
+                return self.read_disk_cache(url, entry, 'disk')
+            
+            headers = entry.conditional_headers() if entry else {}
+            response = self.pool.open(url, headers)
+            start = time.perf_counter()
+            try:
+                check_html(url, response.status, response.headers)
+                body, truncated = read_body(response.iter_chunks(CHUNK_SIZE), self.max_bytes)
+            finally:
+                response.close()
+            response.timing['download'] = response.timing.get('download', 0.0) + time.perf_counter() - start
+            self.timings.add_phases(response.timing)
+            return self.handle_response(url, entry, response.status, response.headers, body, 'http.client',
+                                        truncated)
+                
+        except NotHtmlError as e:
+            self.show_not_html(e)
+            return None
+        except Exception as e:
+            print(f"ページの取得に失敗しました: {e}")
+            return None
+    
+    def fetch_page_requests(self, url: str, revalidate: bool = False) -> Optional[str]:
         """requestsを使ってWebページを取得"""
         try:
             if not url.startswith(('http://', 'https://')):
                 url = 'https://' + url
             
-            response = self.session.get(url, timeout=30)
+            entry = self.disk_cache.lookup(url) if self.disk_cache else None
+            if entry and entry.is_fresh() and not revalidate:
+                return self.read_disk_cache(url, entry, 'disk')
+            
+            headers = entry.conditional_headers() if entry else {}
+            start = time.perf_counter()
+            # 本文は上限まで少しずつ読む（response.content は上限なく全体を読み込む）
+            with self.session.get(url, timeout=30, headers=headers, stream=True) as response:
+                check_html(url, response.status_code, response.headers)
+                body, truncated = read_body(response_chunks(response), self.max_bytes)
+            # elapsed はリクエスト送信からヘッダー受信まで（接続時間を含む）
+            ttfb = response.elapsed.total_seconds()
+            self.timings.add_phases({'ttfb': ttfb, 'download': max(0.0, time.perf_counter() - start - ttfb)})
+            self.timings.note(url=url, backend='requests', source='network',
+                              status=response.status_code, bytes=len(body))
+            if response.status_code == 304 and entry:
+                self.disk_cache.refresh(url, response.headers)
+                return self.read_disk_cache(url, entry, 'revalidated')
             response.raise_for_status()
-            return response.text
+            
+            # response.text は宣言が無いと本文全体から文字コードを推測するので使わない
+            with self.timings.phase('decode'):
+                text, encoding = decode_html(body, response.headers.get('content-type', ''))
+            if truncated:
+                self.warn_truncated()
+                return text
+            if self.disk_cache:
+                self.disk_cache.store(url, body, response.headers, encoding)
+            self.record_response(url, response.status_code, response.headers, body)
+            return text
                 
+        except NotHtmlError as e:
+            self.show_not_html(e)
+            return None
         except Exception as e:
             print(f"ページの取得に失敗しました: {e}")
             return None
     
-    def fetch_page(self, url: str) -> Optional[str]:
-        """Webページを取得（requestsが利用可能ならそれを使用、そうでなければcurl）"""
-        if ENHANCED_MODE:
-            content = self.fetch_page_requests(url)
+    async def fetch_page_async(self, url: str, revalidate: bool = False) -> Optional[str]:
+        """ディスクキャッシュかネットワークからページを取得（対話ループ用）
+        
+        タスクを中断すると接続を閉じる（curlは終了させる）。requestsは別スレッドで使い、
+        requestsが無ければ async_fetch.AsyncHttpClient を使う。
+        """
+        if self.archive:
+            return self.fetch_page_archive(url)
+        try:
+            entry = self.disk_cache.lookup(url) if self.disk_cache else None
+            if entry and entry.is_fresh() and not revalidate:
+                return self.read_disk_cache(url, entry, 'disk')
+            
+            status, headers, body, truncated = await self.fetch_response_async(url, entry)
+            backend = 'curl' if self.use_curl else 'requests' if ENHANCED_MODE else 'asyncio'
+            return self.handle_response(url, entry, status, headers, body, backend, truncated)
+        
+        except NotHtmlError as e:
+            self.show_not_html(e)
+            return None
+        except Exception as e:
+            print(f"ページの取得に失敗しました: {e}")
+            return None
+    
+    async def fetch_response_async(self, url: str, entry: Optional[CacheEntry] = None
+                                   ) -> Tuple[int, Dict[str, str], bytes, bool]:
+        """entry の ETag / Last-Modified で条件付きリクエストを送り、(ステータス, ヘッダー, 本文, 打ち切ったか) を返す
+        
+        --curl 指定時はcurl、それ以外はrequests（無ければ async_fetch.AsyncHttpClient）を使う。HTML以外なら NotHtmlError。
+        --offline のときはアーカイブの記録を返す（条件付きリクエストにはならない）。
+        """
+        if self.archive:
+            record = self.read_archive(url)
+            check_html(url, record.status, record.headers)
+            return record.status, record.headers, record.body, False
+        if ENHANCED_MODE and not self.use_curl:
+            return await self.fetch_response_thread(url, entry.conditional_headers() if entry else {})
+        if not self.use_curl:
+            response = await self.async_client.fetch(url, entry.conditional_headers() if entry else {},
+                                                     html_only=True)
+            self.timings.add_phases(response.timing)
+            return response.status, response.headers, response.body, response.truncated
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cmd, header_path = self.curl_command(url, entry, tmp_dir)
+            from async_fetch import run_curl
+            returncode, stdout, stderr, truncated = await run_curl(
+                cmd, self.max_bytes, on_start=lambda: check_header_dump(url, header_path))
+            if returncode != 0 and not truncated:
+                raise RuntimeError(f"curl エラー: {stderr.decode('utf-8', errors='replace')}")
+            with open(header_path, 'r', encoding='latin-1') as f:
+                status, headers = parse_header_dump(f.read())
+        body, phases, _ = split_curl_timing(stdout)
+        body, cut = truncate_body(body, self.max_bytes)
+        self.timings.add_phases(phases)
+        return status, headers, body, truncated or cut
+    
+    async def fetch_response_thread(self, url: str, headers: Dict[str, str]
+                                    ) -> Tuple[int, Dict[str, str], bytes, bool]:
+        """requestsのセッションでの取得を別スレッドで行う（セッションのクッキー・プロキシ設定・CA証明書を使う）
+        
+        タスクを中断したらレスポンスを閉じ、スレッドでの本文の読み込みも打ち切る。
+        """
+        import asyncio
+        responses = []
+        cancelled = threading.Event()
+        
+        def fetch():
+            start = time.perf_counter()
+            response = self.session.get(url, timeout=30, headers=headers, stream=True)
+            responses.append(response)
+            with response:
+                if cancelled.is_set():
+                    raise RuntimeError("取得を中止しました")
+                check_html(url, response.status_code, response.headers)
+                body, truncated = read_body(response_chunks(response), self.max_bytes)
+            ttfb = response.elapsed.total_seconds()
+            self.timings.add_phases({'ttfb': ttfb, 'download': max(0.0, time.perf_counter() - start - ttfb)})
+            return response.status_code, response.headers, body, truncated
+        
+        try:
+            return await asyncio.to_thread(fetch)
+        except asyncio.CancelledError:
+            cancelled.set()
+            for response in responses:
+                response.close()
+            raise
+    
+    def read_archive(self, url: str) -> 'ArchivedResponse':
+        """アーカイブからURLの最も新しい記録を読む（無ければ RuntimeError）"""
+        record = self.archive.read(url)
+        if record is None:
+            raise RuntimeError(f"アーカイブにありません: {url}")
+        return record
+    
+    def fetch_page_archive(self, url: str) -> Optional[str]:
+        """ネットワークの代わりにアーカイブからページを取得（--offline）"""
+        try:
+            record = self.read_archive(url)
+            self.timings.note(url=url, source='archive', status=record.status, bytes=len(record.body))
+            check_html(url, record.status, record.headers)
+            with self.timings.phase('decode'):
+                text, _ = decode_html(record.body, record.headers.get('content-type', ''))
+            return text
+        except NotHtmlError as e:
+            self.show_not_html(e)
+            return None
+        except Exception as e:
+            print(f"📴 {e}")
+            return None
+    
+    def read_disk_cache(self, url: str, entry, source: str) -> str:
+        """ディスクキャッシュの本文を返す（source は disk か revalidated）"""
+        with self.timings.phase('decode'):
+            text = self.disk_cache.read_text(entry)
+        self.timings.note(url=url, source=source, bytes=len(text))
+        return text
+    
+    def fetch_page(self, url: str, use_cache: bool = True, add_history: bool = True) -> Optional[str]:
+        """Webページを取得（キャッシュ → requests → curl の順に試す）"""
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        
+        cached = self.page_cache.get(url) if use_cache else None
+        if cached:
+            content = cached.html
+            self.timings.note_default(url=url, source='memory', bytes=len(content))
+        elif self.archive:
+            content = self.fetch_page_archive(url)
+        elif ENHANCED_MODE:
+            content = self.fetch_page_requests(url, revalidate=not use_cache)
+        elif self.pool:
+            content = self.fetch_page_http(url, revalidate=not use_cache)
         else:
-            content = self.fetch_page_curl(url)
+            content = self.fetch_page_curl(url, revalidate=not use_cache)
         
         if content:
-            if not url.startswith(('http://', 'https://')):
-                url = 'https://' + url
+            if not cached:
+                self.page_cache.put(url, content)
             self.current_url = url
-            self.add_to_history(url)
+            if add_history:
+                self.add_to_history(url)
         
         return content
     
@@ -108,7 +487,7 @@ class EnhancedBrowser:
         if self.history_index > 0:
             self.history_index -= 1
             url = self.history[self.history_index]
-            return self.fetch_page(url)
+            return self.fetch_page(url, add_history=False)
         return None
     
     def go_forward(self) -> Optional[str]:
@@ -116,172 +495,645 @@ class EnhancedBrowser:
         if self.history_index < len(self.history) - 1:
             self.history_index += 1
             url = self.history[self.history_index]
-            return self.fetch_page(url)
+            return self.fetch_page(url, add_history=False)
         return None
-    
+
     def parse_html_enhanced(self, html: str) -> Tuple[str, List[Tuple[str, str]], Dict]:
-        """BeautifulSoupを使ってHTMLを解析"""
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # title取得
-        title = soup.title.string if soup.title else "無題"
-        
-        # script, styleタグを除去
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # テキスト内容を取得
-        text_content = soup.get_text()
-        
-        # 複数の空白や改行を整理
-        lines = (line.strip() for line in text_content.splitlines())
-        text_content = '\n'.join(line for line in lines if line)
-        
-        # リンクを抽出
-        links = []
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            link_text = link.get_text().strip()
-            
-            # 相対URLを絶対URLに変換
-            href = urllib.parse.urljoin(self.current_url, href)
-            
-            if link_text and href.startswith(('http://', 'https://')):
-                links.append((href, link_text))
-        
-        # メタ情報
-        meta_info = {
-            'title': title,
-            'description': '',
-            'keywords': ''
-        }
-        
-        # メタタグから情報を取得
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc:
-            meta_info['description'] = meta_desc.get('content', '')
-        
-        meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
-        if meta_keywords:
-            meta_info['keywords'] = meta_keywords.get('content', '')
-        
-        return text_content, links, meta_info
-    
+        """選択したパーサーでHTMLを解析（parse_page の結果を (text, links, meta) で返す）"""
+        parsed = self.parse_page(html)
+        return parsed.text, parsed.links, parsed.meta
+
     def parse_html_basic(self, html: str) -> Tuple[str, List[Tuple[str, str]], Dict]:
-        """基本的なHTMLパース（正規表現使用）"""
-        import re
-        
-        # titleを抽出
-        title_match = re.search(r'<title[^>]*>(.*?)</title>', html, re.IGNORECASE | re.DOTALL)
-        title = title_match.group(1) if title_match else "無題"
-        
-        # script, styleタグを除去
-        text = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<[^>]+>', '', text)
+        """基本的なHTMLパース（標準ライブラリだけの1パス抽出器）"""
+        return extract_page(html, self.current_url)
+
+    def extract_document(self, html: str, base_url: str, max_lines: int = 0,
+                         max_links: int = 0) -> Tuple[Tuple[str, List[Tuple[str, str]], Dict], bool]:
+        """選択したパーサーで解析して (結果, 打ち切ったか) を返す（CPU時間の上限はワーカーで守る）"""
+        pool = self.parse_pool
+        if not pool:
+            return parse_until(self.parser, html, base_url, max_lines, max_links)
+        result, stopped, timed_out = pool.parse(html, base_url, max_lines, max_links)
+        if timed_out:
+            print(f"⚠️  {self.parser.name} での解析が{self.parse_timeout:g}秒（CPU時間）で終わらなかったため、"
+                  "1パス抽出器で解析し直しました")
+        return result, stopped
+    
+    def parse_page(self, html: str) -> ParsedPage:
+        """現在のページを解析（同じ内容の解析結果があれば再利用）"""
+        cached = self.page_cache.get(self.current_url)
+        digest = cached.digest if cached and cached.html is html else content_digest(html)
+        parsed = self.page_cache.get_parsed(self.current_url, digest)
+        if parsed:
+            return parsed
         
-        # HTMLエンティティをデコード
-        text = text.replace('&lt;', '<')
-        text = text.replace('&gt;', '>')
-        text = text.replace('&amp;', '&')
-        text = text.replace('&quot;', '"')
-        text = text.replace('&#39;', "'")
-        text = text.replace('&nbsp;', ' ')
+        limits = (SCREEN_LINES * EARLY_STOP_SCREENS, SCREEN_LINKS * EARLY_STOP_SCREENS) if self.early_stop else (0, 0)
+        with self.timings.phase('parse'):
+            (text_content, links, meta_info), stopped = self.extract_document(html, self.current_url, *limits)
+        if stopped:
+            meta_info['partial'] = True
+        parsed = ParsedPage(digest, self.current_url, text_content, links, meta_info)
+        self.page_cache.set_parsed(self.current_url, parsed)
+        return parsed
+    
+    def current_page(self) -> Optional[ParsedPage]:
+        """現在のページの解析結果を取得（キャッシュから外れていれば再取得）"""
+        self.collect_loading(wait=True)
+        cached = self.page_cache.get(self.current_url)
+        html = cached.html if cached else self.fetch_page(self.current_url, add_history=False)
+        if not html:
+            return None
+        return self.parse_page(html)
+    
+    def current_links(self, needed: int = 0) -> Optional[List[Tuple[str, str]]]:
+        """現在のページのリンク一覧（読み込み中でも必要な番号まで揃っていれば待たない）"""
+        if self.loading and not self.loading[0].finished:
+            _, links, _ = self.loading[0].snapshot()
+            if 0 < needed <= len(links):
+                return links
+        page = self.current_page()
+        return page.links if page else None
+    
+    def open_stream(self, url: str):
+        """本文を少しずつ読めるレスポンスを開く（ストリーミング表示・先読みで使用）
         
-        # 複数の空白や改行を整理
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        text = re.sub(r' +', ' ', text)
+        (ステータス, レスポンスヘッダー, 本文チャンクのイテレータ, 中断用の関数, 宣言された文字コード) を返す。
+        文字コードはContent-Typeに charset が無ければ None（本文の先頭から判定する）。
+        """
+        if self.archive:
+            record = self.read_archive(url)
+            return (record.status, record.headers, iter([record.body]), lambda: None,
+                    header_charset(record.headers.get('content-type', '')))
+        if ENHANCED_MODE:
+            response = self.session.get(url, timeout=30, stream=True)
+            if response.status_code >= 400:
+                response.close()
+                response.raise_for_status()
+            return (response.status_code, response.headers, response_chunks(response), response.close,
+                    header_charset(response.headers.get('content-type', '')))
+        if self.pool:
+            response = self.pool.open(url)
+            if response.status >= 400:
+                response.close()
+                raise RuntimeError(f"HTTP {response.status}")
+            return (response.status, response.headers, response.iter_chunks(CHUNK_SIZE), response.close,
+                    header_charset(response.headers.get('content-type', '')))
+        chunks, close, status, headers = curl_stream([
+            'curl', '-s', '-L', '--compressed',
+            '-H', 'User-Agent: Enhanced-Terminal-Browser/1.0',
+            '-H', 'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            '--max-time', '30',
+            url
+        ])
+        return status, headers, chunks, close, header_charset(headers.get('content-type', ''))
+    
+    def stream_page(self, url: str) -> bool:
+        """ページをダウンロードしながら最初の画面を表示（ストリーミングモード）"""
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
         
-        # リンクを抽出
-        links = []
-        pattern = r'<a[^>]*href=["\']([^"\']+)["\'][^>]*>(.*?)</a>'
-        matches = re.findall(pattern, html, re.IGNORECASE | re.DOTALL)
+        try:
+            with self.timings.phase('ttfb'):
+                status, headers, chunks, close, encoding = self.open_stream(url)
+        except Exception as e:
+            print(f"ページの取得に失敗しました: {e}")
+            return False
+        if not is_html(headers):
+            close()
+            self.show_not_html(NotHtmlError(url, headers))
+            return False
         
-        for href, link_text in matches:
-            href = urllib.parse.urljoin(self.current_url, href)
-            link_text = re.sub(r'<[^>]+>', '', link_text).strip()
-            if link_text and href.startswith(('http://', 'https://')):
-                links.append((href, link_text))
+        limits = (SCREEN_LINES * EARLY_STOP_SCREENS, SCREEN_LINKS * EARLY_STOP_SCREENS) if self.early_stop else (0, 0)
+        load = StreamingLoad(url, chunks, encoding, close, first_screen_lines=SCREEN_LINES,
+                             max_bytes=self.max_bytes, max_lines=limits[0], max_links=limits[1],
+                             keep_body=bool(self.disk_cache or self.recorder)).start()
+        with self.timings.phase('first_screen'):
+            load.wait_first_screen()
+        self.timings.note(url=url, source='stream', bytes=load.bytes_received)
+        if load.error:
+            print(f"ページの取得に失敗しました: {load.error}")
+            return False
         
-        meta_info = {'title': title, 'description': '', 'keywords': ''}
+        self.current_url = url
+        self.add_to_history(url)
+        self.loading = (load, status, headers)
+        self.collect_loading()
+        with self.timings.phase('render'):
+            if self.loading:
+                # 残りはバックグラウンドで読み込みを続ける
+                self.render_page(load.snapshot(), loading=True)
+            else:
+                self.render_page(self.current_page())
+        return True
+    
+    def collect_loading(self, wait: bool = False):
+        """バックグラウンドの読み込みが終わっていれば結果をキャッシュに入れる"""
+        if not self.loading:
+            return
+        load, status, headers = self.loading
+        if wait and not load.finished and load.url == self.current_url:
+            print("⏳ 読み込みの完了を待っています...")
+            load.wait()
+        if not load.finished:
+            return
         
-        return text.strip(), links, meta_info
+        self.loading = None
+        if load.complete:
+            entry = self.page_cache.put(load.url, load.html)
+            text_content, links, meta_info = load.extractor.result()
+            if load.extractor.stopped:
+                meta_info['partial'] = True
+            elif load.truncated:
+                self.warn_truncated()
+            parsed = ParsedPage(entry.digest, load.url, text_content, links, meta_info)
+            self.page_cache.set_parsed(load.url, parsed)
+            self.index_page(parsed)
+            if load.url == self.current_url:
+                self.set_view(load.url, parsed)
+            # 途中で読み込みを終えた本文は、次回に全体として使われないよう保存しない
+            if not load.truncated and load.body is not None:
+                if self.disk_cache:
+                    self.disk_cache.store(load.url, load.body, headers, load.encoding)
+                self.record_response(load.url, status, headers, load.body)
+    
+    def stop_loading(self, next_url: str = ""):
+        """別のページへ移動する前にバックグラウンドの読み込み・先読みを打ち切る"""
+        self.collect_loading()
+        if self.loading:
+            self.loading[0].cancel()
+            self.loading = None
+        if self.prefetcher:
+            if next_url:
+                # 移動先を先読み中ならその完了だけは待って使う
+                self.prefetcher.claim(next_url)
+            else:
+                self.prefetcher.cancel()
+    
+    def open_page(self, url: str):
+        """ページを開いて表示（ストリーミングモードでは未取得のページを逐次表示）"""
+        self.stop_loading(next_url=url)
+        if self.streaming and url not in self.page_cache and not (self.disk_cache and self.disk_cache.lookup(url)):
+            self.stream_page(url)
+            return
+        html = self.fetch_page(url)
+        if html:
+            self.display_page(html)
     
     def display_page(self, html: str):
         """ページ内容を表示"""
-        if ENHANCED_MODE:
-            text_content, links, meta_info = self.parse_html_enhanced(html)
+        parsed = self.parse_page(html)
+        with self.timings.phase('render'):
+            self.render_page(parsed)
+        self.index_page(parsed)
+    
+    def index_page(self, parsed: ParsedPage):
+        """表示したページを全文検索インデックスに追加（内容が変わっていなければ閲覧日時のみ更新）"""
+        if self.page_index is None:
+            return
+        try:
+            self.page_index.add(parsed)
+        except Exception as e:
+            print(f"⚠️  検索インデックスを更新できませんでした: {e}")
+    
+    def make_view(self, url: str, parsed) -> PageView:
+        """解析済みのページのページャを作成"""
+        text_content, links, meta_info = parsed
+        return PageView(url, text_content, links, SCREEN_LINES, SCREEN_LINKS, format_link,
+                        title=meta_info.get('title', ''), partial=meta_info.get('partial', False))
+    
+    def set_view(self, url: str, parsed) -> PageView:
+        """表示したページのページャにして閲覧履歴に追記（同じ解析結果を表示し直したときは追記しない）"""
+        text_content, _, _ = parsed
+        view = self.view
+        if view is None or view.url != url or view.text is not text_content:
+            view = self.view = self.make_view(url, parsed)
+            try:
+                self.history_store.add_visit(url, view.title)
+            except Exception as e:
+                print(f"⚠️  閲覧履歴を保存できませんでした: {e}")
+        return view
+    
+    def page_view(self) -> Optional[PageView]:
+        """表示中のページのページャ（読み込み中なら完了を待つ。ネットワークにはアクセスしない）"""
+        self.collect_loading(wait=True)
+        if self.view and self.view.url == self.current_url:
+            return self.view
+        return None
+    
+    def render_page(self, parsed, loading: bool = False):
+        """解析済みのページ内容の最初の画面を表示（loading=True なら読み込み途中の内容）"""
+        _, _, meta_info = parsed
+        if loading:
+            view = self.make_view(self.current_url, parsed)
         else:
-            text_content, links, meta_info = self.parse_html_basic(html)
+            view = self.set_view(self.current_url, parsed)
+            view.position = 0
         
-        print("=" * 80)
-        print(f"📄 {meta_info['title']}")
-        print(f"🌐 {self.current_url}")
+        output = ["=" * 80, f"📄 {meta_info['title']}", f"🌐 {self.current_url}"]
         if meta_info['description']:
-            print(f"📝 {meta_info['description'][:100]}...")
-        print("=" * 80)
+            output.append(f"📝 {meta_info['description'][:100]}...")
+        output.append("=" * 80)
         
-        # テキスト内容を表示
-        if text_content:
-            lines = text_content.split('\n')
-            display_lines = []
-            
-            for line in lines[:150]:  # 最大150行まで表示
-                if len(line) > 120:
-                    display_lines.append(line[:120] + "...")
-                else:
-                    display_lines.append(line)
-            
-            print('\n'.join(display_lines))
-            
-            if len(lines) > 150:
-                print(f"\n... (全{len(lines)}行中{len(display_lines)}行を表示)")
+        # テキスト内容を表示（長い行は端末の幅で折り返し、最初の画面のみ）
+        if view.text:
+            output += view.text_screen(0)
+            if loading:
+                output.append("\n⏳ 残りを読み込み中です...")
+            elif view.screen_count > 1:
+                output.append(f"\n... (全{view.line_count}行、画面 1/{view.screen_count}。more で続きを表示)")
+            if view.partial:
+                output.append(f"✂️  最初の{EARLY_STOP_SCREENS}画面分で解析を打ち切りました（--early-stop）")
         
-        print("\n" + "-" * 80)
+        output.append("\n" + "-" * 80)
         
         # リンクを表示
-        if links:
-            print("🔗 リンク:")
-            for i, (url, text) in enumerate(links[:25]):  # 最大25個まで表示
-                print(f"  {i+1:2d}. {text[:70]}...")
-                print(f"      -> {url}")
-            if len(links) > 25:
-                print(f"  ... 他{len(links)-25}個のリンク")
+        if view.links:
+            output.append("🔗 リンク:")
+            output += view.link_screen(0)
+            if len(view.links) > SCREEN_LINKS and not loading:
+                output.append(f"  ... 他{len(view.links) - SCREEN_LINKS}個のリンク（links page 2 で続きを表示）")
+        
+        output.append("-" * 80)
+        write_screen(output)
+        
+        if self.prefetcher:
+            self.prefetcher.start([url for url, _ in view.links[:SCREEN_LINKS]])
+    
+    def show_screen(self, screen: int):
+        """テキストの screen 番目（0始まり）の画面を表示"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+            return
+        if not 0 <= screen < view.screen_count:
+            print(f"画面は 1〜{view.screen_count} です。")
+            return
+        view.position = screen
+        output = view.text_screen(screen)
+        output.append(f"\n📄 画面 {screen + 1}/{view.screen_count}（全{view.line_count}行）")
+        if view.partial and screen + 1 == view.screen_count:
+            output.append(f"✂️  最初の{EARLY_STOP_SCREENS}画面分で解析を打ち切りました（--early-stop）")
+        write_screen(output)
+    
+    def show_more(self):
+        """次の画面を表示"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+        elif view.position + 1 >= view.screen_count:
+            print("最後の画面です。")
+        else:
+            self.show_screen(view.position + 1)
+    
+    def show_links(self, screen: int = 0):
+        """リンク一覧の screen 番目（0始まり）の画面を表示"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+        elif not view.links:
+            print("リンクが見つかりませんでした。")
+        elif not 0 <= screen < view.link_screen_count:
+            print(f"リンクの画面は 1〜{view.link_screen_count} です。")
+        else:
+            write_screen([f"🔗 リンク（画面 {screen + 1}/{view.link_screen_count}）:"] + view.link_screen(screen))
+    
+    def show_link_matches(self, query: str):
+        """site:ホスト[/パス] か /正規表現/ に一致するリンクを番号付きで表示（番号はそのまま開ける）"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+            return
+        try:
+            numbers = view.find_links(query)
+        except ValueError as e:
+            print(e)
+            return
+        if not numbers:
+            print(f"{query} に一致するリンクはありません（全{len(view.links)}個）。")
+            return
+        output = [f"🔗 {query} に一致するリンク: {len(numbers)}個（全{len(view.links)}個）"]
+        output += view.link_rows(numbers[:MAX_LINK_MATCHES])
+        if len(numbers) > MAX_LINK_MATCHES:
+            output.append(f"  ... 他{len(numbers) - MAX_LINK_MATCHES}個")
+        write_screen(output)
+    
+    def find_in_page(self, pattern: str):
+        """ページ内を正規表現で検索し、次の一致がある画面を表示（pattern が空なら前回の続き）"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+            return
+        if pattern:
+            try:
+                count = view.search(pattern)
+            except re.error as e:
+                print(f"正規表現が正しくありません: {e}")
+                return
+            print(f"🔍 {count}件見つかりました。" if count else "見つかりませんでした。")
+        # 新しい検索は表示中の画面から、/ だけなら次の画面から探す
+        found = view.next_match(view.position if pattern else view.position + 1)
+        if found is None:
+            if not pattern:
+                print("検索する語句を /正規表現 で入力してください。")
+            return
+        number, screen = found
+        print(f"{number}件目の一致（/ で次の画面の一致へ）")
+        self.show_screen(screen)
+    
+    def link_target(self, target: str) -> Optional[str]:
+        """リンク番号なら表示中のページのリンク先、URLならそのまま返す（無効な番号は表示して None）"""
+        if target.isdigit():
+            links = self.current_links(int(target)) if self.current_url else None
+            link_num = int(target) - 1
+            if not links or not 0 <= link_num < len(links):
+                print("無効なリンク番号です。")
+                return None
+            return links[link_num][0]
+        if target.startswith(('http://', 'https://')):
+            return target
+        return None
+    
+    def save_resource(self, argument: str):
+        """リンク先（番号かURL、省略時は最後に表示しなかったHTML以外のリンク）を読みながらファイルに保存"""
+        target, _, filename = argument.partition(' ')
+        if target.isdigit():
+            url = self.link_target(target)
+            if not url:
+                return
+        elif target.startswith(('http://', 'https://')):
+            url = target
+        elif self.skipped:
+            url, filename = self.skipped.url, argument
+        else:
+            print("保存するリンクの番号かURLを指定してください（save 番号 [ファイル名]）。")
+            return
         
-        print("-" * 80)
+        try:
+            _, headers, chunks, close, _ = self.open_stream(url)
+            try:
+                path = filename.strip() or suggested_filename(url, headers)
+                print(f"💾 保存中: {url} -> {path}")
+                size = save_chunks(chunks, path)
+            finally:
+                close()
+        except Exception as e:
+            print(f"保存に失敗しました: {e}")
+            return
+        print(f"✅ 保存しました: {path}（{format_size(size)}）")
+    
+    def command_task(self, command: str):
+        """watch [番号|URL] [間隔(秒)] [回数] なら、対話ループがタスクとして実行する監視のコルーチンを返す
+        
+        引数が正しくないときは None（execute が使い方を表示する）。
+        """
+        if not command.lower().startswith('watch '):
+            return None
+        from watch import MIN_INTERVAL, PageWatch
+        args = command.split()[1:]
+        url = self.link_target(args[0]) if args[0].isdigit() else args[0]
+        if not url:
+            return None
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        try:
+            interval = max(MIN_INTERVAL, float(args[1])) if len(args) > 1 else DEFAULT_WATCH_INTERVAL
+            count = int(args[2]) if len(args) > 2 else 0
+        except ValueError:
+            return None
+        watch = PageWatch(url, self.fetch_response_async,
+                          lambda html, base_url: self.extract_document(html, base_url)[0][0])
+        print(f"👀 {url} を{interval:g}秒ごとに確認します（変わった行だけを表示。別のページを開くか Ctrl+C で終了）")
+        return watch.run(interval, count)
     
     def add_bookmark(self, url: str = "", title: str = ""):
         """ブックマークに追加"""
         url = url or self.current_url
         if url:
-            if not title and ENHANCED_MODE:
-                # ページのタイトルを取得
-                html = self.fetch_page(url)
-                if html:
-                    _, _, meta_info = self.parse_html_enhanced(html)
-                    title = meta_info['title']
+            if not title and url == self.current_url:
+                # 表示中ページのページャが持っているタイトルを使う（再取得・再解析はしない）
+                view = self.page_view()
+                if view:
+                    title = view.title
             
             title = title or url
-            self.bookmarks.append((url, title))
+            if not self.history_store.add_bookmark(url, title):
+                print(f"ブックマークを更新しました: {title}")
+                return
+            if self.page_index is not None:
+                self.page_index.set_bookmarked(url)
             print(f"ブックマークに追加しました: {title}")
     
     def show_bookmarks(self):
         """ブックマーク一覧を表示"""
-        if not self.bookmarks:
+        bookmarks = self.history_store.bookmarks()
+        if not bookmarks:
             print("ブックマークはありません。")
             return
         
-        print("📚 ブックマーク:")
-        for i, (url, title) in enumerate(self.bookmarks):
-            print(f"  {i+1:2d}. {title}")
-            print(f"      -> {url}")
+        output = ["📚 ブックマーク:"]
+        for i, bookmark in enumerate(bookmarks):
+            output.append(f"  {i+1:2d}. {bookmark.title}")
+            output.append(f"      -> {bookmark.url}")
+        write_screen(output)
+    
+    def show_saved_history(self, argument: str):
+        """保存済みの閲覧履歴を表示（all [件数] なら最近の履歴、URLならそのページの閲覧履歴）"""
+        if argument.lower().split()[0] == 'all':
+            limit = argument.split()[-1]
+            visits = self.history_store.recent(int(limit) if limit.isdigit() else 20)
+            heading = f"📚 最近の閲覧履歴（全{len(self.history_store)}件）:"
+        else:
+            visits = self.history_store.visits(argument)
+            heading = f"📚 {argument} の閲覧履歴（{self.history_store.visit_count(argument)}回）:"
+        if not visits:
+            print("閲覧履歴はありません。")
+            return
+        output = [heading]
+        for visit in visits:
+            visited = time.strftime('%Y-%m-%d %H:%M', time.localtime(visit.visited))
+            output.append(f"  {visited}  {visit.title or visit.url}")
+            output.append(f"      -> {visit.url}")
+        write_screen(output)
+    
+    def find(self, query: str, limit: int = 10):
+        """閲覧済みページを全文検索して、関連度の高い順に表示"""
+        if self.page_index is None:
+            print("検索インデックスが無効になっています。")
+            return
+        start = time.perf_counter()
+        hits = self.page_index.search(query, limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        if not hits:
+            print(f"「{query}」に一致するページはありません（{len(self.page_index)}ページ中）。")
+            return
+        print(f"🔎 {len(hits)}件（{len(self.page_index)}ページ中、{elapsed:.1f}ms）:")
+        for i, hit in enumerate(hits):
+            mark = "🔖 " if hit.bookmarked else ""
+            print(f"  {i+1:2d}. {mark}{hit.title}")
+            print(f"      {hit.snippet}")
+            print(f"      -> {hit.url}")
     
     def search(self, query: str):
         """Google検索を実行"""
-        search_url = f"https://www.google.com/search?q={urllib.parse.quote(query)}"
-        html = self.fetch_page(search_url)
-        if html:
-            self.display_page(html)
+        self.open_page(search_url(query))
+    
+    def navigation_target(self, command: str) -> Optional[Tuple[str, bool]]:
+        """ページを取得するコマンドなら (URL, 再検証するか) を返す（対話ループが先に取得しておく）"""
+        lowered = command.lower()
+        if lowered in ['quit', 'exit', 'q', 'stats', 'help', 'history', 'bookmark', 'bookmarks', 'save']:
+            return None
+        if lowered.startswith(('profile ', 'find ', 'history ', 'save ', 'watch ')) or lowered in ('links', 'watch'):
+            return None
+        if is_pager_command(lowered):
+            return None
+        if lowered == 'back':
+            return (self.history[self.history_index - 1], False) if self.history_index > 0 else None
+        if lowered == 'forward':
+            if self.history_index < len(self.history) - 1:
+                return self.history[self.history_index + 1], False
+            return None
+        if lowered == 'reload':
+            return (self.current_url, True) if self.current_url else None
+        if lowered.startswith('search '):
+            query = command[7:].strip()
+            return (search_url(query), False) if query else None
+        if command.isdigit():
+            links = self.current_links(int(command)) if self.current_url else None
+            link_num = int(command) - 1
+            return (links[link_num][0], False) if links and 0 <= link_num < len(links) else None
+        return (command if command.startswith(('http://', 'https://')) else 'https://' + command), False
+    
+    def execute(self, command: str) -> bool:
+        """コマンドを1つ実行（終了するときは False を返す）"""
+        if command.lower() in ['quit', 'exit', 'q']:
+            print("ブラウザを終了します。")
+            return False
+        
+        elif command.lower().startswith('profile '):
+            # 1つのコマンドだけをプロファイル
+            with profiled():
+                return self.execute(command[8:].strip())
+        
+        elif command.lower() == 'stats':
+            print("📊 取得・表示の計測結果:")
+            for line in self.timings.summary_lines():
+                print(line)
+            if self._parse_pool and self._parse_pool.timeouts:
+                print(f"  解析の打ち切り: {self._parse_pool.timeouts}回（1パス抽出器で解析し直した）")
+        
+        elif command.lower() == 'help':
+            print("利用可能なコマンド:")
+            print("  URL入力、back、forward、history、bookmark、bookmarks、search、find、reload、stats、quit")
+            print("  more、page N、links、links page N、/正規表現 で表示中のページを画面単位で表示・検索")
+            print("  links site:ホスト[/パス]、links /正規表現/ でリンクを絞り込む（番号はそのまま開ける）")
+            print("  history all [N]、history [URL] で保存済みの閲覧履歴を表示")
+            print("  profile [コマンド] で1つのコマンドをプロファイル")
+            print("  save [番号|URL] [ファイル名] でリンク先をファイルに保存（HTML以外のリンクは表示せずに要約のみ）")
+            print("  watch [番号|URL] [間隔] [回数] でページを定期的に確認し、変わった行だけを表示")
+        
+        elif command.lower() == 'back':
+            self.stop_loading()
+            html = self.go_back()
+            if html:
+                self.display_page(html)
+            else:
+                print("戻るページがありません。")
+        
+        elif command.lower() == 'forward':
+            self.stop_loading()
+            html = self.go_forward()
+            if html:
+                self.display_page(html)
+            else:
+                print("進むページがありません。")
+        
+        elif command.lower() == 'history':
+            print("📚 履歴:")
+            for i, url in enumerate(self.history):
+                marker = " 👉 " if i == self.history_index else "    "
+                print(f"{marker}{i+1}. {url}")
+        
+        elif command.lower().startswith('history '):
+            self.show_saved_history(command[8:].strip())
+        
+        elif command.lower() == 'reload':
+            if self.current_url:
+                self.stop_loading()
+                html = self.fetch_page(self.current_url, use_cache=False, add_history=False)
+                if html:
+                    self.display_page(html)
+            else:
+                print("まずページを開いてください。")
+        
+        elif command.lower() == 'more':
+            self.show_more()
+        
+        elif command.lower() == 'links':
+            self.show_links()
+        
+        elif command.startswith('/'):
+            self.find_in_page(command[1:])
+        
+        elif link_query(command):
+            self.show_link_matches(link_query(command))
+        
+        elif is_pager_command(command.lower()):
+            # page N / links page N
+            number = int(command.split()[-1]) - 1
+            if command.lower().startswith('links'):
+                self.show_links(number)
+            else:
+                self.show_screen(number)
+        
+        elif command.lower() == 'save' or command.lower().startswith('save '):
+            self.save_resource(command[5:].strip())
+        
+        elif command.lower() == 'watch' or command.lower().startswith('watch '):
+            # 監視そのものは command_task が返すタスクとして実行される
+            print("使い方: watch [番号|URL] [間隔(秒、デフォルト60)] [回数(省略時は中断するまで)]")
+        
+        elif command.lower() == 'bookmark':
+            self.add_bookmark()
+        
+        elif command.lower() == 'bookmarks':
+            self.show_bookmarks()
+        
+        elif command.lower().startswith('search '):
+            query = command[7:].strip()
+            if query:
+                print(f"🔍 Google検索: {query}")
+                self.search(query)
+            else:
+                print("検索クエリを入力してください。")
+        
+        elif command.lower().startswith('find '):
+            query = command[5:].strip()
+            if query:
+                self.find(query)
+            else:
+                print("検索する語句を入力してください。")
+        
+        elif command.isdigit():
+            # 数字の場合はリンク番号として処理
+            if self.current_url:
+                links = self.current_links(int(command))
+                if links is not None:
+                    link_num = int(command) - 1
+                    if 0 <= link_num < len(links):
+                        url = links[link_num][0]
+                        print(f"🔗 リンクを開いています: {url}")
+                        self.open_page(url)
+                    else:
+                        print("無効なリンク番号です。")
+            else:
+                print("まずページを開いてください。")
+        
+        else:
+            # URLとして処理
+            print(f"🌐 ページを読み込み中: {command}")
+            self.open_page(command)
+        
+        return True
     
     def run(self, initial_url: str = ""):
         """ブラウザを実行"""
@@ -289,7 +1141,13 @@ class EnhancedBrowser:
         if ENHANCED_MODE:
             print("✅ BeautifulSoup4, requests が利用可能です")
         else:
-            print("⚠️  基本機能で動作中（curlベース）")
+            backend = "http.client 接続プール" if self.pool else "curl"
+            print(f"⚠️  基本機能で動作中（{backend}ベース）")
+        print(f"📄 HTMLパーサー: {self.parser.name}（{self.parser.description}）")
+        if self.archive:
+            print(f"📴 オフライン: アーカイブ（{len(self.archive)}件）から表示します（{self.archive.directory}）")
+        if self.recorder:
+            print(f"⏺  取得したページをアーカイブに記録します（{self.recorder.directory}）")
         
         print()
         print("コマンド:")
@@ -297,110 +1155,113 @@ class EnhancedBrowser:
         print("  [数字]          - リンク番号を開く")
         print("  back            - 戻る")
         print("  forward         - 進む")
-        print("  history         - 履歴表示")
+        print("  history         - 履歴表示（このセッション）")
+        print("  history all [N] - 保存済みの最近の履歴（history [URL] でそのページの閲覧履歴）")
         print("  bookmark        - ブックマークに追加")
         print("  bookmarks       - ブックマーク一覧")
         print("  search [クエリ]  - Google検索")
+        print("  find [語句]      - 閲覧済みページを全文検索")
+        print("  more / page N   - 次の画面 / N番目の画面を表示")
+        print("  links [page N]  - リンク一覧（N番目の画面）")
+        print("  links site:ホスト | links /正規表現/ - リンクをホスト・パスか正規表現で絞り込む")
+        print("  /正規表現        - ページ内を検索（/ のみで次の一致）")
+        print("  reload          - 再読み込み（キャッシュを使わない）")
+        print("  save [番号|URL] [ファイル名] - リンク先をファイルに保存")
+        print("  watch [番号|URL] [間隔] [回数] - ページを定期的に確認し、変わった行だけを表示")
+        print("  stats           - 取得・表示にかかった時間の統計")
         print("  help            - ヘルプ表示")
         print("  quit            - 終了")
+        print("  （読み込み中も入力できます。別のページを開くか Ctrl+C で読み込みを中止）")
         print("=" * 80)
         
-        if initial_url:
-            html = self.fetch_page(initial_url)
-            if html:
-                self.display_page(html)
-        
-        while True:
-            try:
-                command = input("\n🌐 > ").strip()
-                
-                if not command:
-                    continue
-                
-                if command.lower() in ['quit', 'exit', 'q']:
-                    print("ブラウザを終了します。")
-                    break
-                
-                elif command.lower() == 'help':
-                    print("利用可能なコマンド:")
-                    print("  URL入力、back、forward、history、bookmark、bookmarks、search、quit")
-                
-                elif command.lower() == 'back':
-                    html = self.go_back()
-                    if html:
-                        self.display_page(html)
-                    else:
-                        print("戻るページがありません。")
-                
-                elif command.lower() == 'forward':
-                    html = self.go_forward()
-                    if html:
-                        self.display_page(html)
-                    else:
-                        print("進むページがありません。")
-                
-                elif command.lower() == 'history':
-                    print("📚 履歴:")
-                    for i, url in enumerate(self.history):
-                        marker = " 👉 " if i == self.history_index else "    "
-                        print(f"{marker}{i+1}. {url}")
-                
-                elif command.lower() == 'bookmark':
-                    self.add_bookmark()
-                
-                elif command.lower() == 'bookmarks':
-                    self.show_bookmarks()
-                
-                elif command.lower().startswith('search '):
-                    query = command[7:].strip()
-                    if query:
-                        print(f"🔍 Google検索: {query}")
-                        self.search(query)
-                    else:
-                        print("検索クエリを入力してください。")
-                
-                elif command.isdigit():
-                    # 数字の場合はリンク番号として処理
-                    if self.current_url:
-                        html_content = self.fetch_page(self.current_url)
-                        if html_content:
-                            if ENHANCED_MODE:
-                                _, links, _ = self.parse_html_enhanced(html_content)
-                            else:
-                                _, links, _ = self.parse_html_basic(html_content)
-                            
-                            link_num = int(command) - 1
-                            if 0 <= link_num < len(links):
-                                url = links[link_num][0]
-                                print(f"🔗 リンクを開いています: {url}")
-                                html = self.fetch_page(url)
-                                if html:
-                                    self.display_page(html)
-                            else:
-                                print("無効なリンク番号です。")
-                    else:
-                        print("まずページを開いてください。")
-                
-                else:
-                    # URLとして処理
-                    print(f"🌐 ページを読み込み中: {command}")
-                    html = self.fetch_page(command)
-                    if html:
-                        self.display_page(html)
-                
-            except KeyboardInterrupt:
-                print("\n\nブラウザを終了します。")
-                break
-            except Exception as e:
-                print(f"エラーが発生しました: {e}")
+        # 読み込みは asyncio のタスクとして実行（読み込み中も入力でき、Ctrl+Cで中止）
+        from async_repl import run_repl
+        run_repl(self, initial_url, "\n🌐 > ")
 
 def main():
-    browser = EnhancedBrowser()
+    # サブコマンド
+    if len(sys.argv) > 1 and sys.argv[1] == 'crawl':
+        from crawler import crawl_main
+        crawl_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'spider':
+        from spider import spider_main
+        spider_main(sys.argv[2:])
+        return
     
-    # コマンドライン引数でURLが指定された場合
-    initial_url = sys.argv[1] if len(sys.argv) > 1 else ""
+    parser = argparse.ArgumentParser(description="Enhanced Terminal Browser")
+    parser.add_argument('url', nargs='?', default="", help="最初に開くURL")
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="ページキャッシュの上限（MB）")
+    parser.add_argument('--cache-dir', default="", help="ディスクキャッシュの保存先")
+    parser.add_argument('--no-disk-cache', action='store_true', help="ディスクキャッシュを使わない")
+    parser.add_argument('--stream', action='store_true', help="ダウンロードしながら最初の画面を表示する")
+    parser.add_argument('--curl', action='store_true',
+                        help="requestsが無い場合に接続プールではなくcurlコマンドで取得する")
+    parser.add_argument('--prefetch', type=int, default=0, metavar='N',
+                        help="表示したリンクの上位N件をバックグラウンドで先読みする")
+    parser.add_argument('--index-db', default="", help="全文検索インデックスの保存先（find コマンド）")
+    parser.add_argument('--history-db', default="", help="閲覧履歴とブックマークの保存先")
+    parser.add_argument('--no-history', action='store_true', help="閲覧履歴とブックマークを保存しない")
+    parser.add_argument('--no-index', action='store_true', help="表示したページを検索インデックスに保存しない")
+    parser.add_argument('--parser', choices=('auto',) + BACKEND_NAMES, default='auto',
+                        help="HTML解析に使うパーサー（デフォルト: インストール済みで最速のもの）")
+    parser.add_argument('--trace', default="", metavar='FILE',
+                        help="コマンドごとの計測結果をJSON Linesで追記するファイル")
+    parser.add_argument('--profile', action='store_true',
+                        help="コマンドごとにcProfileとtracemallocの結果を表示する")
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="本文の大きさの上限（MB、超えた分は読まずに先頭だけを表示。0で無制限）")
+    parser.add_argument('--early-stop', action='store_true',
+                        help=f"最初の{EARLY_STOP_SCREENS}画面分のテキストとリンクが集まったら解析を打ち切る（巨大なページ向け）")
+    parser.add_argument('--parse-timeout', type=float, default=DEFAULT_PARSE_TIMEOUT, metavar='SEC',
+                        help="1ページの解析のCPU時間の上限（超えたら1パス抽出器で解析し直す。0で無制限）")
+    archive_mode = parser.add_mutually_exclusive_group()
+    archive_mode.add_argument('--record', action='store_true',
+                              help="ネットワークから取得したページをWARCアーカイブに記録する")
+    archive_mode.add_argument('--offline', action='store_true',
+                              help="ネットワークを使わず、記録したWARCアーカイブからページを表示する")
+    parser.add_argument('--archive-dir', default="", help="WARCアーカイブの保存先")
+    parser.add_argument('--archive-mb', type=int, default=100,
+                        help="WARCファイル1つの大きさの上限（MB、超えたら次のファイルに記録する）")
+    args = parser.parse_args()
+    try:
+        get_backend(args.parser)
+    except ValueError as e:
+        parser.error(str(e))
     
-    browser.run(initial_url)
+    recorder = archive = None
+    if args.record or args.offline:
+        from warc_archive import ArchiveReader, WarcWriter
+        try:
+            if args.record:
+                recorder = WarcWriter(args.archive_dir, max_file_bytes=args.archive_mb * 1024 * 1024)
+            else:
+                archive = ArchiveReader(args.archive_dir)
+        except OSError as e:
+            parser.error(f"アーカイブを開けません: {e}")
+    # オフラインではアーカイブだけを使う（ストリーミング表示・先読みもしない）
+    disk_cache = None if args.no_disk_cache or args.offline else DiskCache(args.cache_dir)
+    page_index = None if args.no_index else PageIndex(args.index_db or default_index_path())
+    history_store = None if args.no_history else HistoryStore(args.history_db or default_history_path())
+    browser = EnhancedBrowser(cache_bytes=args.cache_mb * 1024 * 1024, disk_cache=disk_cache,
+                              streaming=args.stream and not args.offline, use_curl=args.curl,
+                              prefetch=0 if args.offline else args.prefetch,
+                              page_index=page_index, parser=args.parser,
+                              timings=Timings(trace_path=args.trace or None), profile=args.profile,
+                              history_store=history_store, max_bytes=int(args.max_mb * 1024 * 1024),
+                              early_stop=args.early_stop, parse_timeout=args.parse_timeout,
+                              recorder=recorder, archive=archive)
+    
+    # コマンドライン引数でURLが指定された場合
+    try:
+        browser.run(args.url)
+    finally:
+        # 記録した分の索引を併合する
+        if recorder:
+            recorder.close()
+        if archive:
+            archive.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+"""
+History Store
+再起動後も残る閲覧履歴とブックマーク（SQLite）
+
+表示したページを1回ごとに visits テーブルへ追記するだけなので、履歴が何十万件あっても
+書き込みの時間は変わりません。URL と閲覧日時にはそれぞれ索引があり、
+「最近の履歴」「あるURLの閲覧回数」は索引だけで引けます。
+WALモードで1件ずつコミットするので、途中で強制終了しても壊れません。
+データベースは最初に履歴・ブックマークを読み書きするときに開くので、起動時間には影響しません。
+パスに ':memory:' を指定すると保存しません（終了すると消える）。
+"""
+
+import os
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+from disk_cache import default_cache_dir
+from page_cache import normalize_url
+
+SCHEMA_VERSION = 1
+
+
+class Visit(NamedTuple):
+    url: str
+    title: str
+    visited: float  # UNIX時刻
+
+
+class Bookmark(NamedTuple):
+    url: str
+    title: str
+    added: float
+
+
+class HistoryStore:
+    """閲覧履歴（追記のみ）とブックマーク"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> 'sqlite3.Connection':
+        """初めて使うときに接続する（sqlite3 もそのときに読み込む）"""
+        with self._lock:
+            if self._conn is None:
+                import sqlite3
+                if self.path != ':memory:':
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                # 対話ループの入力スレッドとイベントループのどちらからでも使えるように
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    self._create_schema(conn)
+                self._conn = conn
+            return self._conn
+
+    @staticmethod
+    def _create_schema(conn: 'sqlite3.Connection'):
+        with conn:
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS visits (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    visited REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS visits_by_url ON visits (url, visited);
+                CREATE INDEX IF NOT EXISTS visits_by_time ON visits (visited);
+                CREATE TABLE IF NOT EXISTS bookmarks (
+                    url TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    added REAL NOT NULL
+                );
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+
+    def add_visit(self, url: str, title: str = ""):
+        """表示したページを履歴に追記"""
+        with self.conn:
+            self.conn.execute("INSERT INTO visits (url, title, visited) VALUES (?, ?, ?)",
+                              (normalize_url(url), title, time.time()))
+
+    def recent(self, limit: int = 20, before: Optional[float] = None) -> List[Visit]:
+        """新しい順の履歴（before を指定するとその時刻より前だけ）"""
+        if before is None:
+            before = float('inf')
+        rows = self.conn.execute(
+            "SELECT url, title, visited FROM visits WHERE visited < ? ORDER BY visited DESC LIMIT ?",
+            (before, limit)).fetchall()
+        return [Visit(*row) for row in rows]
+
+    def visits(self, url: str, limit: int = 20) -> List[Visit]:
+        """あるURLの閲覧履歴（新しい順）"""
+        rows = self.conn.execute(
+            "SELECT url, title, visited FROM visits WHERE url = ? ORDER BY visited DESC LIMIT ?",
+            (normalize_url(url), limit)).fetchall()
+        return [Visit(*row) for row in rows]
+
+    def visit_count(self, url: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM visits WHERE url = ?",
+                                 (normalize_url(url),)).fetchone()[0]
+
+    def add_bookmark(self, url: str, title: str) -> bool:
+        """ブックマークに追加（既にあればタイトルだけ更新して False）"""
+        url = normalize_url(url)
+        with self.conn:
+            updated = self.conn.execute("UPDATE bookmarks SET title = ? WHERE url = ?", (title, url)).rowcount
+            if updated:
+                return False
+            self.conn.execute("INSERT INTO bookmarks (url, title, added) VALUES (?, ?, ?)",
+                              (url, title, time.time()))
+        return True
+
+    def bookmarks(self) -> List[Bookmark]:
+        """追加した順のブックマーク"""
+        rows = self.conn.execute("SELECT url, title, added FROM bookmarks ORDER BY added").fetchall()
+        return [Bookmark(*row) for row in rows]
+
+    def __len__(self) -> int:
+        """履歴の件数"""
+        return self.conn.execute("SELECT COUNT(*) FROM visits").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def default_history_path() -> str:
+    return os.path.join(default_cache_dir(), 'history.db')
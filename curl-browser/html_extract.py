@@ -0,0 +1,351 @@
+"""
+HTML Extract
+標準ライブラリだけで動く1パスのHTML抽出器
+
+テキスト・リンク・タイトル・メタ情報を文書の先頭から1回なめるだけで取り出します。
+タグの切り出しは1つのコンパイル済み正規表現で前から順に行う状態機械で、
+正規表現を何度も適用する方式と違い、途中で文書全体のコピーを作りません。
+HTMLエンティティは html.unescape ですべてデコードされます。
+リンクは重複を除いた link_table.LinkTable に集め、相対URLは基準のURLを1回だけ分解した
+UrlResolver で解決します。
+"""
+
+import html
+import re
+from typing import Optional, Tuple, Dict
+
+from link_table import LinkTable, UrlResolver
+
+# 一度に feed する文字数
+FEED_CHUNK = 64 * 1024
+
+# 途中で切れたタグ・コメントとして次の feed まで持ち越す最大の文字数
+# （これより長いものはタグとして扱わない。閉じられないタグで持ち越しが際限なく伸びるのを防ぐ）
+MAX_PENDING = 1024 * 1024
+
+# テキスト・タグ・コメント・宣言を1つずつ切り出す（属性内の引用符の中の">"も考慮）
+# group(1): テキスト, group(2): 終了タグまでまとめて読み飛ばした script/style の名前,
+# group(3): 終了タグの"/", group(4): タグ名, group(5): 属性
+# （m.lastindex はテキストなら1、読み飛ばした script/style なら2、タグなら5、コメント・宣言・"<"なら None）
+# script/style は終了タグが同じバッファにあれば1つのトークンとして読み飛ばし、
+# 無ければ開始タグとして切り出して、次の feed 以降で終了タグを探す
+ATTRS_PATTERN = r'''[^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*'''  # 属性（引用符の外の">"まで）
+TOKEN_RE = re.compile(
+    r'([^<]+)'
+    r'|<(?:((?i:script|style))(?=[\s/>])' + ATTRS_PATTERN + r'>.*?</(?i:\2)\s*>'
+    r'|(/?)([A-Za-z][^\s/>]*)(' + ATTRS_PATTERN + r')>'
+    r'|!--.*?--\s*>'
+    r'|[!?][^>]*>)'
+    r'|<',
+    re.DOTALL
+)
+TEXT, SKIPPED, TAG = 1, 2, 5
+ATTR_RE = re.compile(r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+RAW_END_RE = {
+    'script': re.compile(r'</script\s*>', re.IGNORECASE),
+    'style': re.compile(r'</style\s*>', re.IGNORECASE),
+}
+
+# 前後で改行を入れる要素
+BLOCK_TAGS = frozenset((
+    'address', 'article', 'aside', 'blockquote', 'br', 'caption', 'dd', 'div',
+    'dl', 'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2',
+    'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'td', 'th', 'title', 'tr', 'ul',
+))
+
+# 属性を読む必要がある要素
+ATTR_TAGS = frozenset(('a', 'meta', 'base'))
+
+# 行を区切る以外の処理がある要素（それ以外の要素は、ブロック要素なら行を区切るだけで、残りは何もしない）
+HANDLED_TAGS = ATTR_TAGS | {'title'} | frozenset(RAW_END_RE)
+
+# 要素ごとの処理（INLINE: 何もしない, BLOCK: 行を区切るだけ, HANDLED: handle_starttag / handle_endtag）。
+# よく現れるインライン要素も入れておき、小文字のタグ名なら .lower() せずに引けるようにする
+INLINE, BLOCK, HANDLED = 0, 1, 2
+TAG_ACTIONS = dict.fromkeys((
+    'abbr', 'b', 'button', 'cite', 'code', 'em', 'font', 'i', 'img', 'input', 'label', 'mark', 'option',
+    'path', 'picture', 'q', 's', 'select', 'small', 'source', 'span', 'strong', 'sub', 'sup', 'svg',
+    'tbody', 'thead', 'time', 'u', 'html', 'head', 'body', 'link',
+), INLINE)
+TAG_ACTIONS.update(dict.fromkeys(BLOCK_TAGS, BLOCK))
+TAG_ACTIONS.update(dict.fromkeys(HANDLED_TAGS, HANDLED))
+
+
+def unescape(text: str) -> str:
+    """html.unescape と同じ結果を返す（&amp; &lt; &gt; &quot; &#39; だけなら str.replace で置き換える）"""
+    amp = text.count('&amp;')
+    lt = text.count('&lt;')
+    gt = text.count('&gt;')
+    quot = text.count('&quot;')
+    apos = text.count('&#39;')
+    if text.count('&') != amp + lt + gt + quot + apos:
+        return html.unescape(text)
+    if lt:
+        text = text.replace('&lt;', '<')
+    if gt:
+        text = text.replace('&gt;', '>')
+    if quot:
+        text = text.replace('&quot;', '"')
+    if apos:
+        text = text.replace('&#39;', "'")
+    if amp:
+        text = text.replace('&amp;', '&')  # 他を置き換えた後に（&amp;lt; は &lt; になる）
+    return text
+
+
+def parse_attrs(attr_text: str) -> Dict[str, str]:
+    """属性文字列を辞書に変換（名前は小文字、値はエンティティをデコード）"""
+    attrs = {}
+    # 値の無い属性と空の値はどちらも ''（findall は一致しなかったグループも '' にする）
+    for name, double_quoted, single_quoted, unquoted in ATTR_RE.findall(attr_text):
+        value = double_quoted or single_quoted or unquoted
+        attrs.setdefault(name.lower(), unescape(value) if '&' in value else value)
+    return attrs
+
+
+class PageExtractor:
+    """テキスト・リンク・メタ情報を1パスで抽出するトークナイザ
+
+    feed() を何度呼んでもよいので、ダウンロード途中の文書にも使えます。
+    処理しきれなかった末尾（途中で切れたタグなど）だけを次の feed まで持ち越します。
+    handle_starttag / handle_endtag / handle_text は、他のパーサーが作った
+    木構造をたどって同じ結果を得るためにも使われます（parsers.py）。
+
+    max_lines と max_links を指定すると、行とリンクがどちらもその数だけ集まった時点で
+    抽出を打ち切り（stopped）、以降の feed は無視します。stop_offset は打ち切った位置
+    （それまでに読んだ文字数）です。
+    """
+
+    def __init__(self, base_url: str = "", max_lines: int = 0, max_links: int = 0):
+        self.base_url = base_url
+        self.max_lines = max_lines
+        self.max_links = max_links
+        self.stopped = False
+        self.stop_offset = 0
+        self.lines = []
+        self.links = LinkTable()
+        self._resolver = UrlResolver(base_url)
+        self.meta = {'title': '', 'description': '', 'keywords': ''}
+        self._buffer = ''
+        self._fed = 0  # これまでに feed された文字数
+        self._raw_tag = None
+        self._parts = []
+        self._title_parts = None
+        self._link_href = None
+        self._link_parts = []
+
+    def feed(self, data: str):
+        """文書の続きを渡す"""
+        if self.stopped:
+            return
+        self._fed += len(data)
+        self._buffer = self._buffer + data if self._buffer else data
+        self._process(final=False)
+
+    def close(self):
+        """文書の終わりを通知"""
+        if not self.stopped:
+            self._process(final=True)
+            if self._buffer and self._raw_tag is None:
+                self._handle_data(self._buffer)
+        self._buffer = ''
+        self._finish_link()
+        self._flush_line()
+        if self._title_parts is not None:
+            self.meta['title'] = ' '.join(''.join(self._title_parts).split())
+            self._title_parts = None
+
+    def result(self) -> Tuple[str, LinkTable, Dict]:
+        """(text, links, meta) を返す（links は重複を除いた LinkTable）"""
+        meta = dict(self.meta)
+        meta['title'] = meta['title'] or "無題"
+        return '\n'.join(self.lines), self.links.copy(), meta
+
+    # --- トークナイザ ---
+
+    def _process(self, final: bool):
+        buffer = self._buffer
+        pos = 0
+        if final:
+            limit = len(buffer)
+        else:
+            # 最後の"<"以降は途中で切れたタグかもしれないので次回に回す
+            pending = max(0, len(buffer) - MAX_PENDING)
+            limit = buffer.rfind('<', pending)
+            if limit < 0:
+                limit = len(buffer)
+            comment = buffer.rfind('<!--', pending, limit + 1)
+            if comment >= 0 and buffer.find('-->', comment) < 0:
+                limit = comment
+        # タグ・コメント・宣言はどれも">"で終わるので、最後の">"より後ろの"<"はタグにならない。
+        # そこは"<"ごとに正規表現を試さずにまとめてテキストにする（">"の無い"<"が続く文書で、
+        # "<"ごとに末尾まで探して文書の長さの2乗の時間がかかるのを防ぐ）
+        tag_limit = buffer.rfind('>', pos, limit) + 1
+
+        handle_data = self._handle_data
+        handle_text = self.handle_text
+        flush_line = self._flush_line
+        parts = self._parts
+        append_part = parts.append
+        limited = self.max_lines or self.max_links
+        while pos < limit:
+            if self._raw_tag is not None:
+                # script/style の中身は終了タグまで読み飛ばす
+                end = RAW_END_RE[self._raw_tag].search(buffer, pos)
+                if end is None:
+                    # 終了タグが分割されている可能性があるので末尾だけ残す
+                    pos = len(buffer) if final else max(pos, len(buffer) - 16)
+                    break
+                self._raw_tag = None
+                pos = end.end()
+                continue
+            if pos >= tag_limit:
+                handle_data(buffer[pos:limit])
+                pos = limit
+                break
+
+            # よく現れるトークン（リンク・タイトルの外のテキスト、行を区切るだけのブロック要素、
+            # 何もしないインライン要素）はメソッドを呼ばずにここで処理する
+            # （pos は抜け出すときだけ m.end() から求める）
+            for m in TOKEN_RE.finditer(buffer, pos, tag_limit):
+                kind = m.lastindex
+                if kind == TAG:
+                    tag = m[4]
+                    action = TAG_ACTIONS.get(tag)
+                    if action is None:
+                        tag = tag.lower()
+                        action = TAG_ACTIONS.get(tag, INLINE)
+                    if action == BLOCK:
+                        if parts:
+                            flush_line()
+                    elif action == HANDLED:
+                        if m[3]:
+                            self.handle_endtag(tag)
+                        elif tag in RAW_END_RE:
+                            self._raw_tag = tag
+                            break
+                        else:
+                            self.handle_starttag(tag, parse_attrs(m[5]) if tag in ATTR_TAGS else None)
+                    if limited and self._enough():
+                        break
+                elif kind == TEXT:
+                    text = m[1]
+                    if '&' in text:
+                        text = unescape(text)
+                    if self._title_parts is not None or self._link_href is not None:
+                        handle_text(text)
+                    elif '\n' not in text:
+                        append_part(text)
+                    elif text.isspace():
+                        if parts:
+                            flush_line()
+                    else:
+                        handle_text(text)
+                elif kind == SKIPPED:
+                    if limited and self._enough():
+                        break
+                elif m.end() - m.start() == 1:
+                    handle_data('<')  # タグではない"<"（それ以外はコメント・宣言）
+            else:
+                pos = tag_limit
+                continue
+            pos = m.end()
+            if limited and self._enough():
+                self.stopped = True
+                self.stop_offset = self._fed - len(buffer) + pos
+                break
+
+        self._buffer = buffer[pos:]
+
+    def _enough(self) -> bool:
+        """表示に必要な行数とリンク数が集まったか"""
+        return len(self.lines) >= self.max_lines and len(self.links) >= self.max_links
+
+    # --- 要素ごとの処理 ---
+
+    def handle_starttag(self, tag: str, attrs: Optional[Dict[str, str]]):
+        """開始タグ（tag は小文字、attrs は ATTR_TAGS の要素のときだけ必要）"""
+        if tag in BLOCK_TAGS:
+            self._flush_line()
+        if tag not in ATTR_TAGS:
+            if tag == 'title':
+                self._title_parts = []
+            return
+        if tag == 'a':
+            # 閉じられていない<a>は次の<a>で終わったものとみなす
+            self._finish_link()
+            href = attrs.get('href')
+            if href:
+                self._link_href = href
+                self._link_parts = []
+        elif tag == 'meta':
+            name = attrs.get('name', '').lower()
+            if name in ('description', 'keywords'):
+                self.meta[name] = attrs.get('content', '')
+        elif tag == 'base':
+            href = attrs.get('href')
+            if href:
+                self.base_url = self._resolver.resolve(href)
+                self._resolver = UrlResolver(self.base_url)
+
+    def handle_endtag(self, tag: str):
+        """終了タグ（tag は小文字）"""
+        if tag == 'a':
+            self._finish_link()
+        elif tag == 'title' and self._title_parts is not None:
+            self.meta['title'] = ' '.join(''.join(self._title_parts).split())
+            self._title_parts = None
+        if tag in BLOCK_TAGS:
+            self._flush_line()
+
+    def _handle_data(self, data: str):
+        if '&' in data:
+            data = unescape(data)
+        self.handle_text(data)
+
+    def handle_text(self, data: str):
+        """エンティティをデコード済みのテキスト"""
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+        if self._link_href is not None:
+            self._link_parts.append(data)
+        if '\n' not in data:
+            self._parts.append(data)
+            return
+        # 元の文書の改行はそのまま行の区切りとして扱う
+        pieces = data.split('\n')
+        self._parts.append(pieces[0])
+        for piece in pieces[1:]:
+            self._flush_line()
+            self._parts.append(piece)
+
+    def _flush_line(self):
+        parts = self._parts
+        if parts:
+            line = ' '.join(''.join(parts).split())
+            if line:
+                self.lines.append(line)
+            parts.clear()  # 同じリストを使い続ける（_process はこのリストの append を持っている）
+
+    def _finish_link(self):
+        if self._link_href is None:
+            return
+        link_text = ' '.join(''.join(self._link_parts).split())
+        href = self._resolver.resolve(self._link_href)
+        if link_text and href.startswith(('http://', 'https://')):
+            self.links.add(href, link_text)
+        self._link_href = None
+        self._link_parts = []
+
+
+def extract_page(html_text: str, base_url: str = "", max_lines: int = 0,
+                 max_links: int = 0) -> Tuple[str, LinkTable, Dict]:
+    """HTMLから (text, links, meta) を1パスで抽出（max_lines・max_links は PageExtractor と同じ）"""
+    extractor = PageExtractor(base_url, max_lines, max_links)
+    for start in range(0, len(html_text), FEED_CHUNK):
+        extractor.feed(html_text[start:start + FEED_CHUNK])
+        if extractor.stopped:
+            break
+    extractor.close()
+    return extractor.result()
@@ -0,0 +1,225 @@
+"""
+HTTP Connection Pool
+標準ライブラリ (http.client) だけで動く、接続を使い回すHTTPクライアント
+
+(scheme, host, port) ごとに keep-alive 接続を保持し、同じホストへの
+連続したページ移動で TCP/TLS のハンドシェイクを省略します。
+リダイレクトは curl -L と同じように自動で追跡します。
+"""
+
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Optional, Dict, Tuple, Iterator
+
+from content_coding import ACCEPT_ENCODING, make_decoder
+
+# 1ホストあたりに保持するアイドル接続の上限
+MAX_IDLE_PER_HOST = 4
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+def retryable_errors() -> tuple:
+    """再利用した接続が切られていたときに出る例外（新しい接続で1回だけやり直す）
+
+    http.client は ssl も一緒に読み込んで起動が遅くなるので、
+    モジュールの読み込み時ではなく最初の接続を張るときに読み込む。
+    """
+    import http.client
+    return (http.client.RemoteDisconnected, http.client.BadStatusLine,
+            ConnectionResetError, BrokenPipeError)
+
+
+class HostLimiter:
+    """ホストごとの同時接続数を制限するセマフォの集まり"""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url: str):
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+        with semaphore:
+            yield
+
+
+class PooledResponse:
+    """プールの接続から読み出すレスポンス
+
+    本文を最後まで読むか close() すると、接続はプールに戻る（または閉じられる）。
+    圧縮転送（Content-Encoding）された本文は、読みながら伸長して返す。
+    timing には新しい接続を張った時間（connect、DNS・TLSを含む）、
+    レスポンスヘッダーが届くまでの時間（ttfb）、本文の読み込み時間（download）が秒で入る。
+    """
+
+    def __init__(self, pool: 'ConnectionPool', key: Tuple[str, str, int],
+                 conn: 'http.client.HTTPConnection', response: 'http.client.HTTPResponse', url: str,
+                 timing: Dict[str, float]):
+        self.url = url
+        self.status = response.status
+        self.headers = {name.lower(): value for name, value in response.getheaders()}
+        self.timing = timing
+        self._decoder = make_decoder(self.headers.get('content-encoding', ''))
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+
+    def read(self) -> bytes:
+        """本文をすべて読んで接続を返す"""
+        start = time.perf_counter()
+        try:
+            return self._decoder.decompress(self._response.read()) + self._decoder.flush()
+        finally:
+            self.timing['download'] = self.timing.get('download', 0.0) + time.perf_counter() - start
+            self.close()
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[bytes]:
+        """届いた分だけ本文を少しずつ返す"""
+        try:
+            while True:
+                chunk = self._response.read1(chunk_size)
+                if not chunk:
+                    break
+                chunk = self._decoder.decompress(chunk)
+                if chunk:
+                    yield chunk
+            chunk = self._decoder.flush()
+            if chunk:
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        """接続をプールに戻す（本文が残っている場合は閉じる）"""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool._release(self._key, conn)
+        else:
+            conn.close()
+
+
+class ConnectionPool:
+    """(scheme, host, port) ごとに keep-alive 接続を使い回すプール"""
+
+    def __init__(self, user_agent: str, timeout: float = 30, max_redirects: int = 10):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.connections_opened = 0
+        self.requests_sent = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ssl_context = None
+
+    def _connect(self, key: Tuple[str, str, int]) -> 'http.client.HTTPConnection':
+        import http.client
+        scheme, host, port = key
+        self.connections_opened += 1
+        if scheme == 'https':
+            if self._ssl_context is None:
+                import ssl
+                self._ssl_context = ssl.create_default_context()
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _acquire(self, key: Tuple[str, str, int]) -> Tuple['http.client.HTTPConnection', bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _release(self, key: Tuple[str, str, int], conn: 'http.client.HTTPConnection'):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < MAX_IDLE_PER_HOST:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """保持している接続をすべて閉じる"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _send(self, url: str, headers: Dict[str, str], timing: Dict[str, float]) -> PooledResponse:
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise ValueError(f"未対応のスキームです: {scheme}")
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname or '', port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        request_headers = {
+            'User-Agent': self.user_agent,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Encoding': ACCEPT_ENCODING,
+        }
+        request_headers.update(headers)
+
+        conn, reused = self._acquire(key)
+        try:
+            if not reused:
+                self._open(conn, timing)
+            start = time.perf_counter()
+            conn.request('GET', path, headers=request_headers)
+            response = conn.getresponse()
+        except retryable_errors():
+            conn.close()
+            if not reused:
+                raise
+            # サーバー側で閉じられていた古い接続だったので新しい接続でやり直す
+            conn = self._connect(key)
+            self._open(conn, timing)
+            start = time.perf_counter()
+            conn.request('GET', path, headers=request_headers)
+            response = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+        timing['ttfb'] = timing.get('ttfb', 0.0) + time.perf_counter() - start
+        self.requests_sent += 1
+        return PooledResponse(self, key, conn, response, url, timing)
+
+    @staticmethod
+    def _open(conn: 'http.client.HTTPConnection', timing: Dict[str, float]):
+        """新しい接続を張り、かかった時間（DNS・TCP・TLS）を記録"""
+        start = time.perf_counter()
+        conn.connect()
+        timing['connect'] = timing.get('connect', 0.0) + time.perf_counter() - start
+
+    def open(self, url: str, headers: Optional[Dict[str, str]] = None) -> PooledResponse:
+        """リクエストを送り、リダイレクトを追跡したレスポンスを返す（本文は未読）"""
+        headers = headers or {}
+        timing = {}  # リダイレクトをまたいで合計する
+        for _ in range(self.max_redirects + 1):
+            response = self._send(url, headers, timing)
+            location = response.headers.get('location')
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response
+            response.read()  # 本文を読み捨てて接続を返す
+            url = urllib.parse.urljoin(url, location)
+        raise RuntimeError("リダイレクトが多すぎます")
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes, str]:
+        """(status, headers, body, 最終URL) を返す"""
+        response = self.open(url, headers)
+        body = response.read()
+        return response.status, response.headers, body, response.url
@@ -0,0 +1,253 @@
+"""
+Link Table
+ページのリンク一覧を、重複を除いた番号付きの表として持つ（両方の版で使用）
+
+同じURLへのリンクは最初に現れたものだけを残し、番号は文書に現れた順のまま変わりません。
+URLとリンクテキストは sys.intern した文字列の列、ホストはホスト名の一覧への番号の配列として
+列ごとに持つので、ナビゲーションのように同じリンクが何度も現れるページや、同じサイトの
+ページを何枚もキャッシュしたときでも文字列を共有します。
+
+相対URLの解決（UrlResolver）は基準のURLを1回だけ分解しておき、同じ href は1回だけ解決します。
+結果は urllib.parse.urljoin と同じです。
+
+links site:ホスト[/パス] はホストごとのパス順の索引（最初の検索で作る）を二分探索し、
+links /正規表現/ はURLとテキストを重複の無い一覧に対して照合します。
+"""
+
+import bisect
+import re
+import sys
+import urllib.parse
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 1ページで覚えておく解決済みの href の数の上限
+MAX_RESOLVED = 65536
+
+# そのまま基準のURLのホスト（"/" で始まるとき）かディレクトリにつなげればよい href
+# （スキーム・ネットロケーション・パラメータ・"." や ".." の要素・空のクエリやフラグメント・制御文字や空白が無いもの。
+#   "/." と "//" を含まないことは別に確かめる）
+SIMPLE_HREF_RE = re.compile(r'/?[^\x00-\x20/.:;?#\\][^\x00-\x20:;?#\\]*(?:\?[^\x00-\x20#]+)?(?:#[^\x00-\x20]+)?\Z')
+
+# スキーム://ネットロケーション パス（ホストとパスの索引用）
+HOST_PATH_RE = re.compile(r'[A-Za-z][A-Za-z0-9+.-]*://([^/?#]*)(.*)', re.DOTALL)
+# ユーザー情報も角括弧（IPv6アドレス）も無いネットロケーション（ホスト名だけを切り出せばよいもの）
+PLAIN_HOST_RE = re.compile(r'[A-Za-z][A-Za-z0-9+.-]*://([^/?#@:\[]*)(?::[^/?#@\[]*)?(?=[/?#]|\Z)')
+
+
+class UrlResolver:
+    """基準のURLに対して href を絶対URLにする（urllib.parse.urljoin と同じ結果）
+
+    基準のURLは作成時に1回だけ分解し、解決した href は覚えておく。
+    """
+
+    def __init__(self, base_url: str = ""):
+        self.base_url = base_url
+        self._resolved: Dict[str, str] = {}
+        scheme, netloc, path, params, query, _ = urllib.parse.urlparse(base_url)
+        self._scheme = scheme
+        self._netloc = netloc
+        self._path = path
+        self._params = params
+        self._query = query
+        directory = path.split('/')
+        if directory[-1] != '':
+            # 最後の要素はディレクトリではないので、相対パスの解決には使わない
+            del directory[-1]
+        self._directory = directory
+        # SIMPLE_HREF_RE に合う href の前につなげる部分（http(s) の基準のURLのときだけ使う）
+        self._root = self._prefix = None
+        if scheme in ('http', 'https') and netloc:
+            self._prefix = self._join('a')[:-1]
+            self._root = f'{scheme}://{netloc}'  # 設定するまでの _join は urljoin と同じ方法で解決する
+
+    def resolve(self, href: str) -> str:
+        url = self._resolved.get(href)
+        if url is None:
+            url = self._join(href)
+            if len(self._resolved) < MAX_RESOLVED:
+                self._resolved[href] = url
+        return url
+
+    def _join(self, href: str) -> str:
+        # urllib.parse.urljoin から基準のURLの分解を除いたもの
+        if not self.base_url:
+            return href
+        if not href:
+            return self.base_url
+        if self._root and SIMPLE_HREF_RE.match(href) and '/.' not in href and '//' not in href:
+            return (self._root if href[0] == '/' else self._prefix) + href
+        scheme, netloc, path, params, query, fragment = urllib.parse.urlparse(href, self._scheme)
+        if scheme != self._scheme or scheme not in urllib.parse.uses_relative:
+            return href
+        if scheme in urllib.parse.uses_netloc:
+            if netloc:
+                return urllib.parse.urlunparse((scheme, netloc, path, params, query, fragment))
+            netloc = self._netloc
+        if not path and not params:
+            return urllib.parse.urlunparse((scheme, netloc, self._path, self._params,
+                                            query or self._query, fragment))
+        if path[:1] == '/':
+            segments = path.split('/')
+        else:
+            segments = self._directory + path.split('/')
+            segments[1:-1] = filter(None, segments[1:-1])
+        resolved = []
+        for segment in segments:
+            if segment == '..':
+                if resolved:
+                    resolved.pop()
+            elif segment != '.':
+                resolved.append(segment)
+        if segments[-1] in ('.', '..'):
+            resolved.append('')
+        return urllib.parse.urlunparse((scheme, netloc, '/'.join(resolved) or '/', params, query, fragment))
+
+
+def split_host(url: str) -> Tuple[str, int]:
+    """URLの (ホスト名（小文字、ポートとユーザー情報を除く）, パスの開始位置)"""
+    match = PLAIN_HOST_RE.match(url)
+    if match:
+        return match.group(1).lower(), match.end()
+    match = HOST_PATH_RE.match(url)
+    if not match:
+        return '', len(url)
+    host = match.group(1).rpartition('@')[2]
+    if host.startswith('['):
+        host = host[:host.find(']') + 1]
+    else:
+        host = host.partition(':')[0]
+    return host.lower(), match.start(2)
+
+
+class LinkTable(Sequence):
+    """重複を除いたリンクの一覧（(URL, テキスト) の列として読める）
+
+    番号（0始まり）は最初に現れた順。同じURLのリンクが再び現れても番号もテキストも変わらない。
+    """
+
+    def __init__(self, links: Iterable[Tuple[str, str]] = ()):
+        self.urls: List[str] = []
+        self.texts: List[str] = []
+        self.host_ids = array('I')  # 各リンクのホストの host_names での番号
+        self.host_names: List[str] = []
+        self.path_starts = array('I')  # 各リンクのURLでのパスの開始位置
+        self._numbers: Dict[str, int] = {}  # URL -> 番号
+        self._host_numbers: Dict[str, int] = {}  # ホスト名 -> host_names での番号
+        self._paths: Optional[Dict[int, Tuple[List[str], List[int]]]] = None  # ホストごとのパス順の索引
+        for url, text in links:
+            self.add(url, text)
+
+    def add(self, url: str, text: str) -> bool:
+        """リンクを追加（同じURLが既にあれば何もせずに False）"""
+        if url in self._numbers:
+            return False
+        url = sys.intern(url)
+        self._numbers[url] = len(self.urls)
+        self.urls.append(url)
+        self.texts.append(sys.intern(text))
+        host, path_start = split_host(url)
+        self.path_starts.append(path_start)
+        host_id = self._host_numbers.get(host)
+        if host_id is None:
+            host_id = self._host_numbers[host] = len(self.host_names)
+            self.host_names.append(host)
+        self.host_ids.append(host_id)
+        self._paths = None
+        return True
+
+    def copy(self) -> 'LinkTable':
+        table = LinkTable()
+        table.urls = list(self.urls)
+        table.texts = list(self.texts)
+        table.host_ids = array('I', self.host_ids)
+        table.host_names = list(self.host_names)
+        table.path_starts = array('I', self.path_starts)
+        table._numbers = dict(self._numbers)
+        table._host_numbers = dict(self._host_numbers)
+        return table
+
+    # 解析用のワーカープロセスから受け取るときは列だけを送り、URL・ホストの索引は作り直す
+    def __getstate__(self):
+        return self.urls, self.texts, self.host_ids, self.host_names, self.path_starts
+
+    def __setstate__(self, state):
+        self.urls, self.texts, self.host_ids, self.host_names, self.path_starts = state
+        self._numbers = dict(zip(self.urls, range(len(self.urls))))
+        self._host_numbers = dict(zip(self.host_names, range(len(self.host_names))))
+        self._paths = None
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(zip(self.urls[index], self.texts[index]))
+        return self.urls[index], self.texts[index]
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return zip(self.urls, self.texts)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LinkTable):
+            return self.urls == other.urls and self.texts == other.texts
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"LinkTable({list(self)!r})"
+
+    def number(self, url: str) -> Optional[int]:
+        """URLの番号（0始まり、無ければ None）"""
+        return self._numbers.get(url)
+
+    def site(self, host: str, path_prefix: str = '') -> List[int]:
+        """ホスト（サブドメインを含む）と、パス（クエリを含む）の先頭が一致するリンクの番号（文書順）"""
+        host = host.lower().strip('.')
+        if self._paths is None:
+            self._paths = self._index_paths()
+        numbers = []
+        for host_id, name in enumerate(self.host_names):
+            if name != host and not name.endswith('.' + host):
+                continue
+            paths, path_numbers = self._paths[host_id]
+            start = bisect.bisect_left(paths, path_prefix)
+            end = start
+            while end < len(paths) and paths[end].startswith(path_prefix):
+                end += 1
+            numbers += path_numbers[start:end]
+        return sorted(numbers)
+
+    def _index_paths(self) -> Dict[int, Tuple[List[str], List[int]]]:
+        """ホストごとに (パス, 番号) をパス順に並べた索引"""
+        entries: List[List[Tuple[str, int]]] = [[] for _ in self.host_names]
+        for number, (url, host_id, path_start) in enumerate(zip(self.urls, self.host_ids, self.path_starts)):
+            entries[host_id].append((url[path_start:], number))
+        index = {}
+        for host_id, host_entries in enumerate(entries):
+            host_entries.sort()
+            index[host_id] = ([path for path, _ in host_entries], [number for _, number in host_entries])
+        return index
+
+    def search(self, pattern: str) -> List[int]:
+        """URLかテキストが正規表現 pattern に一致するリンクの番号（大文字小文字は区別しない）"""
+        regex = re.compile(pattern, re.IGNORECASE)
+        return [number for number, (url, text) in enumerate(zip(self.urls, self.texts))
+                if regex.search(text) or regex.search(url)]
+
+    def query(self, query: str) -> List[int]:
+        """site:ホスト[/パス] か /正規表現/ に一致するリンクの番号（条件が正しくなければ ValueError）"""
+        if query.lower().startswith('site:'):
+            host, slash, path = query[5:].partition('/')
+            if not host:
+                raise ValueError("site: の後にホスト名を指定してください")
+            return self.site(host, slash + path)
+        if query.startswith('/') and len(query) > 1:
+            pattern = query[1:-1] if query.endswith('/') and len(query) > 2 else query[1:]
+            try:
+                return self.search(pattern)
+            except re.error as e:
+                raise ValueError(f"正規表現が正しくありません: {e}") from e
+        raise ValueError("site:ホスト[/パス] か /正規表現/ を指定してください")
@@ -0,0 +1,111 @@
+"""
+Media Type
+Content-Type からレスポンスを解析にかけるかを決め、HTML以外のものは要約だけを表示する
+
+HTMLとして解析するのは text/html と XHTML だけです。それ以外（PDF・ZIP・動画など）は
+レスポンスヘッダーを受け取った時点で本文を読まずに接続を閉じ（curlは終了させ）、
+種類・大きさ・ファイル名だけを表示します。本文は save コマンドでファイルに保存できます。
+"""
+
+import os
+import re
+import urllib.parse
+from typing import Iterable, Mapping, Optional
+
+from disk_cache import parse_header_dump
+
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+
+# Content-Disposition の filename="..."（filename* の RFC 5987 形式は別に扱う）
+FILENAME_RE = re.compile(r'''filename\s*=\s*(?:"([^"]*)"|([^;\s]+))''', re.IGNORECASE)
+FILENAME_STAR_RE = re.compile(r"filename\*\s*=\s*([\w-]+)''([^;\s]+)", re.IGNORECASE)
+
+
+def media_type(content_type: str) -> str:
+    """Content-Type からパラメータ（charset など）を除いた小文字の型"""
+    return content_type.split(';', 1)[0].strip().lower()
+
+
+def is_html(headers: Mapping[str, str]) -> bool:
+    """HTMLとして解析するレスポンスか（Content-Type が無いときは HTML とみなす）"""
+    value = media_type(headers.get('content-type', ''))
+    return not value or value in HTML_TYPES
+
+
+def content_length(headers: Mapping[str, str]) -> Optional[int]:
+    """Content-Length（無いか不正な値なら None）"""
+    value = headers.get('content-length', '')
+    return int(value) if value.strip().isdigit() else None
+
+
+def format_size(size: int) -> str:
+    """バイト数を 12B・3.4KB・5.6MB の形で"""
+    if size < 1024:
+        return f"{size}B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f}KB"
+    return f"{size / 1024 / 1024:.1f}MB"
+
+
+def suggested_filename(url: str, headers: Mapping[str, str]) -> str:
+    """保存するときのファイル名（Content-Disposition、なければURLの最後の部分）"""
+    disposition = headers.get('content-disposition', '')
+    match = FILENAME_STAR_RE.search(disposition)
+    if match:
+        name = urllib.parse.unquote(match.group(2), encoding=match.group(1), errors='replace')
+    else:
+        match = FILENAME_RE.search(disposition)
+        if match:
+            name = match.group(1) or match.group(2)
+        else:
+            name = urllib.parse.unquote(urllib.parse.urlsplit(url).path.rsplit('/', 1)[-1])
+    # ディレクトリを含む名前で別の場所に書き込まないようにする
+    name = os.path.basename(name.replace('\\', '/')).strip()
+    return name if name not in ('', '.', '..') else 'download'
+
+
+class NotHtmlError(Exception):
+    """HTMLではないレスポンス（本文は読まずに閉じた）"""
+
+    def __init__(self, url: str, headers: Mapping[str, str]):
+        self.url = url
+        self.media_type = media_type(headers.get('content-type', ''))
+        self.length = content_length(headers)
+        self.filename = suggested_filename(url, headers)
+        super().__init__(self.summary())
+
+    def summary(self) -> str:
+        """種類・大きさ・ファイル名の1行の要約"""
+        size = format_size(self.length) if self.length is not None else "大きさ不明"
+        return f"HTMLではありません: {self.media_type}（{size}、{self.filename}）"
+
+
+def check_html(url: str, status: int, headers: Mapping[str, str]):
+    """正常なレスポンス（2xx）が HTML でなければ NotHtmlError を送出"""
+    if 200 <= status < 300 and not is_html(headers):
+        raise NotHtmlError(url, headers)
+
+
+def save_chunks(chunks: Iterable[bytes], path: str) -> int:
+    """本文を少しずつファイルに書き出し、書き込んだバイト数を返す
+
+    既存のファイルは上書きしない。途中で失敗したときは書きかけのファイルを消す。
+    """
+    size = 0
+    with open(path, 'xb') as f:
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            f.close()
+            os.remove(path)
+            raise
+    return size
+
+
+def check_header_dump(url: str, header_path: str):
+    """curl -D で書き出されたヘッダーを check_html で調べる（本文を読む前に呼ぶ）"""
+    with open(header_path, 'r', encoding='latin-1') as f:
+        status, headers = parse_header_dump(f.read())
+    check_html(url, status, headers)
@@ -0,0 +1,193 @@
+"""
+Page Cache
+閲覧済みページのメモリキャッシュ（LRU方式・バイト数上限付き）
+
+simple_browser.py と enhanced_browser.py の両方から使用します。
+生のHTMLと解析結果 (ParsedPage) を正規化URLをキーにして保持し、
+戻る/進む/リンク番号での移動時にネットワークアクセスを省略します。
+解析結果は内容のハッシュと結び付けて保持するため、同じ文書を
+コマンドごとに何度も解析し直すことはありません。
+HTMLはzlibで圧縮して保持し、展開済みの文字列は最後に参照した1ページ分だけ持ちます。
+"""
+
+import hashlib
+import threading
+import urllib.parse
+from collections import OrderedDict
+from typing import Optional, List, Tuple, Dict, Iterator
+
+from content_coding import compress_text, decompress_text
+
+# デフォルトのキャッシュ上限（32MB）
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+
+
+def normalize_url(url: str) -> str:
+    """キャッシュキー用にURLを正規化（スキーム補完・ホスト小文字化・フラグメント除去）"""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    parts = urllib.parse.urlsplit(url)
+    return urllib.parse.urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        parts.path or '/',
+        parts.query,
+        ''
+    ))
+
+
+def content_digest(html: str) -> str:
+    """HTML文書の内容ハッシュ（解析結果のキーに使用）"""
+    return hashlib.blake2b(html.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+class ParsedPage:
+    """1つの文書を1回だけ解析した結果
+
+    (text, links, meta) のタプルとしても展開できます。
+    """
+
+    __slots__ = ('digest', 'url', 'text', 'links', 'meta')
+
+    def __init__(self, digest: str, url: str, text: str,
+                 links: List[Tuple[str, str]], meta: Dict):
+        self.digest = digest
+        self.url = url
+        self.text = text
+        self.links = links
+        self.meta = meta
+
+    def __iter__(self) -> Iterator:
+        return iter((self.text, self.links, self.meta))
+
+    @property
+    def title(self) -> str:
+        return self.meta.get('title', '')
+
+    @property
+    def size(self) -> int:
+        """おおよそのサイズ（文字数）"""
+        size = len(self.text)
+        for href, link_text in self.links:
+            size += len(href) + len(link_text)
+        for value in self.meta.values():
+            size += len(str(value))
+        return size
+
+
+class CachedPage:
+    """キャッシュされた1ページ分のデータ（HTMLは圧縮して保持し、参照されたときに展開）"""
+
+    __slots__ = ('url', 'data', 'digest', 'parsed', 'size', '_html')
+
+    def __init__(self, url: str, html: str):
+        self.url = url
+        self.data = compress_text(html)
+        self.digest = content_digest(html)
+        self.parsed = None  # ParsedPage または None
+        self.size = len(self.data)
+        self._html = html
+
+    @property
+    def html(self) -> str:
+        html = self._html
+        if html is None:
+            html = self._html = decompress_text(self.data)
+        return html
+
+    def release(self):
+        """展開済みのHTMLを手放す（圧縮したものは残る）"""
+        self._html = None
+
+
+class PageCache:
+    """正規化URLをキーにしたLRUページキャッシュ
+
+    先読みスレッドからも書き込まれるため、操作はロックで保護しています。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._hot = None  # 展開済みのHTMLを持っているエントリ
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, url: str) -> bool:
+        return normalize_url(url) in self._entries
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """キャッシュからページを取得（見つかれば最近使用したものとして扱う）"""
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self._make_hot(entry)
+            return entry
+
+    def put(self, url: str, html: str, hot: bool = True) -> CachedPage:
+        """ページをキャッシュに追加（既存のエントリは置き換え）
+
+        hot=False（先読みなど、すぐには表示しないページ）なら展開済みのHTMLは保持しない。
+        """
+        key = normalize_url(url)
+        entry = CachedPage(key, html)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+            if hot:
+                self._make_hot(entry)
+            else:
+                entry.release()
+            self._evict()
+        return entry
+
+    def _make_hot(self, entry: CachedPage):
+        """展開済みのHTMLを持つのは最後に参照した1件だけにする"""
+        if self._hot is not None and self._hot is not entry:
+            self._hot.release()
+        self._hot = entry
+
+    def get_parsed(self, url: str, digest: str) -> Optional[ParsedPage]:
+        """URLと内容ハッシュが一致する解析結果を取得"""
+        entry = self._entries.get(normalize_url(url))
+        if entry is None or entry.digest != digest:
+            return None
+        return entry.parsed
+
+    def set_parsed(self, url: str, parsed: ParsedPage):
+        """解析結果をエントリに追加（内容ハッシュが一致する場合のみ）"""
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.parsed is not None or entry.digest != parsed.digest:
+                return
+            entry.parsed = parsed
+            added = parsed.size
+            entry.size += added
+            self.total_bytes += added
+            self._evict()
+
+    def clear(self):
+        """キャッシュを空にする"""
+        with self._lock:
+            self._entries.clear()
+            self._hot = None
+            self.total_bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def _evict(self):
+        """上限を超えた分を古い順に削除（最新の1件は残す）"""
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry.size
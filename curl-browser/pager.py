@@ -0,0 +1,199 @@
+"""
+Pager
+表示中のページのテキストとリンクを画面単位で表示するページャ（両方の版で使用）
+
+抽出済みのテキストは1つの文字列のまま持ち、各行の開始位置だけを配列に索引します。
+索引は必要な行まで少しずつ作り、折り返しは表示する画面の行に対してだけ行うので、
+大きなページでも最初の画面はすぐに表示できます。ページ内検索（/正規表現）は
+一致した位置を索引し、次の一致がある画面へ移動します。リンクの絞り込み（links site:ホスト・
+links /正規表現/）はリンクの表（link_table.LinkTable）の索引で答えます。
+ページャのコマンドはネットワークにもキャッシュにもアクセスしません。
+"""
+
+import bisect
+import re
+import shutil
+import sys
+import unicodedata
+from array import array
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from link_table import LinkTable
+
+# 検索で一致した行の先頭に付ける印
+MATCH_MARK = '» '
+
+# more / page N / links page N / /正規表現 / links site:ホスト / links /正規表現/
+PAGER_COMMAND_RE = re.compile(r'more|(?:links\s+)?page\s+\d+|/.*|links\s+(?:site:\S+|/.*)',
+                              re.IGNORECASE | re.DOTALL)
+LINK_QUERY_RE = re.compile(r'links\s+(site:\S+|/.*)', re.IGNORECASE | re.DOTALL)
+
+# links site: / links /正規表現/ で表示するリンクの数の上限
+MAX_LINK_MATCHES = 100
+
+
+def is_pager_command(command: str) -> bool:
+    """ページャのコマンドか（ページを取得しないコマンドとして扱う）"""
+    return PAGER_COMMAND_RE.fullmatch(command) is not None
+
+
+def link_query(command: str) -> Optional[str]:
+    """links site:ホスト[/パス] / links /正規表現/ なら絞り込みの条件（それ以外は None）"""
+    match = LINK_QUERY_RE.fullmatch(command)
+    return match.group(1) if match else None
+
+
+def char_width(char: str) -> int:
+    """端末上の表示幅（全角文字は2）"""
+    return 2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1
+
+
+def wrap_line(line: str, width: int) -> List[str]:
+    """表示幅 width で1行を折り返す（全角文字の幅を考慮）"""
+    if len(line) * 2 <= width or (line.isascii() and len(line) <= width):
+        return [line]
+    rows = []
+    start = 0
+    used = 0
+    for i, char in enumerate(line):
+        w = char_width(char)
+        if used + w > width:
+            rows.append(line[start:i])
+            start = i
+            used = 0
+        used += w
+    rows.append(line[start:])
+    return rows
+
+
+def write_screen(lines: List[str]):
+    """1画面分の出力をまとめて1回で書き出す"""
+    sys.stdout.write('\n'.join(lines) + '\n')
+    sys.stdout.flush()
+
+
+class PageView:
+    """1ページ分のテキストとリンクの画面単位の表示
+
+    画面は lines_per_screen 行（折り返す前の行数）・links_per_screen 個のリンクごとに区切る。
+    position は最後に表示したテキストの画面番号（0始まり）。
+    title はブックマークなどで再取得せずに使うページのタイトル。
+    partial は解析を途中で打ち切ったページ（続きの画面が無い）かどうか。
+    """
+
+    def __init__(self, url: str, text: str, links: Sequence[Tuple[str, str]],
+                 lines_per_screen: int, links_per_screen: int,
+                 format_link: Callable[[int, str, str], List[str]], width: int = 0, title: str = '',
+                 partial: bool = False):
+        self.url = url
+        self.title = title
+        self.partial = partial
+        self.text = text
+        self.links = links
+        self.lines_per_screen = lines_per_screen
+        self.links_per_screen = links_per_screen
+        self.format_link = format_link
+        self.width = width or shutil.get_terminal_size((80, 24)).columns
+        self.position = 0
+        self._offsets = array('q', [0])  # 各行の開始位置（必要な行まで作る）
+        self._indexed_to = 0  # ここまで改行を探した
+        self._line_count = None
+        self._pattern = None
+        self._matches = array('q')  # 一致の開始位置
+        self._match_lines = set()
+
+    @property
+    def line_count(self) -> int:
+        if self._line_count is None:
+            self._line_count = self.text.count('\n') + 1 if self.text else 0
+        return self._line_count
+
+    @property
+    def screen_count(self) -> int:
+        return max(1, -(-self.line_count // self.lines_per_screen))
+
+    @property
+    def link_screen_count(self) -> int:
+        return max(1, -(-len(self.links) // self.links_per_screen))
+
+    def _index_lines(self, line: int = -1, offset: int = -1):
+        """line 行目（または位置 offset を含む行）まで行の開始位置を索引"""
+        text = self.text
+        offsets = self._offsets
+        while self._indexed_to < len(text) and (len(offsets) <= line or self._indexed_to <= offset):
+            newline = text.find('\n', self._indexed_to)
+            if newline < 0:
+                self._indexed_to = len(text)
+                break
+            offsets.append(newline + 1)
+            self._indexed_to = newline + 1
+
+    def lines(self, start: int, stop: int) -> List[str]:
+        """start 行目から stop 行目の手前までの行"""
+        self._index_lines(stop)
+        offsets = self._offsets
+        result = []
+        for i in range(start, min(stop, self.line_count)):
+            end = offsets[i + 1] - 1 if i + 1 < len(offsets) else len(self.text)
+            result.append(self.text[offsets[i]:end])
+        return result
+
+    def line_of(self, offset: int) -> int:
+        """文字位置 offset を含む行の番号"""
+        self._index_lines(offset=offset)
+        return bisect.bisect_right(self._offsets, offset) - 1
+
+    def text_screen(self, screen: int) -> List[str]:
+        """screen 番目の画面のテキスト（折り返し済み）"""
+        start = screen * self.lines_per_screen
+        rows = []
+        for number, line in enumerate(self.lines(start, start + self.lines_per_screen), start):
+            if number in self._match_lines:
+                line = MATCH_MARK + line
+            rows.extend(wrap_line(line, self.width))
+        return rows
+
+    def link_screen(self, screen: int) -> List[str]:
+        """screen 番目の画面のリンク一覧（番号は全体での通し番号）"""
+        start = screen * self.links_per_screen
+        rows = []
+        for i, (url, text) in enumerate(self.links[start:start + self.links_per_screen], start + 1):
+            rows.extend(self.format_link(i, url, text))
+        return rows
+
+    def find_links(self, query: str) -> List[int]:
+        """site:ホスト[/パス] か /正規表現/ に一致するリンクの番号（0始まり、条件が正しくなければ ValueError）"""
+        if not isinstance(self.links, LinkTable):
+            self.links = LinkTable(self.links)
+        return self.links.query(query)
+
+    def link_rows(self, numbers: List[int]) -> List[str]:
+        """番号（0始まり）のリンクの一覧（番号は全体での通し番号のまま）"""
+        rows = []
+        for number in numbers:
+            url, text = self.links[number]
+            rows.extend(self.format_link(number + 1, url, text))
+        return rows
+
+    def search(self, pattern: str) -> int:
+        """正規表現 pattern に一致する位置を索引して件数を返す（大文字小文字は区別しない）"""
+        self._pattern = re.compile(pattern, re.IGNORECASE)
+        self._matches = array('q', (m.start() for m in self._pattern.finditer(self.text)))
+        self._match_lines = {self.line_of(offset) for offset in self._matches}
+        return len(self._matches)
+
+    def next_match(self, screen: int) -> Optional[Tuple[int, int]]:
+        """screen 番目以降の画面で最初の一致の (何件目か（1始まり）, 画面番号)
+
+        それより後に一致が無ければ先頭に戻る。検索していないか一致が無ければ None。
+        """
+        if not self._matches:
+            return None
+        start_line = screen * self.lines_per_screen
+        index = 0
+        if start_line < self.line_count:
+            self._index_lines(start_line)
+            index = bisect.bisect_left(self._matches, self._offsets[start_line])
+        if index >= len(self._matches):
+            index = 0
+        return index + 1, self.line_of(self._matches[index]) // self.lines_per_screen
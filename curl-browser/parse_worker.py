@@ -0,0 +1,172 @@
+"""
+Parse Workers
+HTMLの解析を常駐する別プロセスで行い、1文書あたりのCPU時間に上限を設ける
+
+lxml や BeautifulSoup は、閉じられない <a> や属性が極端に多い要素などの壊れた文書で
+数十秒以上CPUを使い続けることがあり、C拡張の中ではシグナルでも止められません。
+そこで解析はワーカープロセス（ページごとに起動せず使い回す）に送り、CPU時間が上限を
+超えたらワーカーを終了させて、線形時間の1パス抽出器（html_extract）で解析し直します。
+終了させたワーカーは次の解析のときに起動し直します。
+
+CPU時間の上限はワーカー側で RLIMIT_CPU（超えるとカーネルがプロセスを終了させる）として
+文書ごとに設定し、RLIMIT_CPU が使えない環境やCPUを使わずに止まった場合に備えて、
+親プロセスでも経過時間で打ち切ります。
+"""
+
+import math
+import multiprocessing
+import queue
+import signal
+from typing import List, NamedTuple, Optional
+
+from parsers import ParseResult, get_backend, parse_until
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 1文書あたりのCPU時間の上限（秒）
+DEFAULT_TIMEOUT = 10.0
+
+# 親プロセスで待つ時間は CPU時間の上限 + これ（RLIMIT_CPU が秒単位で効くまでの余裕）
+WALL_GRACE = 2.0
+
+
+class ParseOutcome(NamedTuple):
+    result: ParseResult
+    stopped: bool  # max_lines・max_links で解析を打ち切った
+    timed_out: bool  # 上限を超えたため1パス抽出器で解析し直した
+
+
+def limit_cpu_time(seconds: float):
+    """このプロセスのCPU時間の上限を、今までの使用量 + seconds に設定（超えるとSIGXCPUで終了する）"""
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime + seconds)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def serve(conn):
+    """ワーカープロセスの本体: (バックエンド名, HTML, URL, max_lines, max_links, CPU時間の上限) を受け取って解析する"""
+    # Ctrl+C は親プロセスが扱う（解析中のワーカーは親が終了させる）
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        *args, timeout = task
+        if timeout:
+            limit_cpu_time(timeout)
+        try:
+            backend_name, *args = args
+            reply = ('ok', parse_until(get_backend(backend_name), *args))
+        except Exception as e:
+            reply = ('error', RuntimeError(f"{type(e).__name__}: {e}"))
+        conn.send(reply)
+
+
+class ParseWorker:
+    """常駐するワーカープロセス1つ（最初の解析のときに起動する）"""
+
+    def __init__(self, context):
+        self.context = context
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        self.stop()
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=serve, args=(child_conn,), daemon=True)
+        try:
+            process.start()
+        except BaseException:
+            conn.close()
+            raise
+        finally:
+            child_conn.close()
+        self.process, self.conn = process, conn
+
+    def stop(self, wait: float = 0):
+        """ワーカーを終了させる（wait 秒までは終了の依頼だけで待つ）"""
+        if self.process is None:
+            return
+        if wait and self.process.is_alive():
+            try:
+                self.conn.send(None)
+                self.process.join(wait)
+            except (OSError, ValueError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+
+class ParsePool:
+    """上限付きで解析するワーカープロセスのプール（スレッドから同時に使える）
+
+    ワーカーの数だけ並行して解析できる。timeout=0 のときはCPU時間の上限を設けない。
+    """
+
+    def __init__(self, parser: Optional[str] = None, workers: int = 1, timeout: float = DEFAULT_TIMEOUT):
+        self.backend = get_backend(parser)
+        self.timeout = timeout
+        self.timeouts = 0  # 上限を超えて1パス抽出器で解析し直した文書の数
+        context = multiprocessing.get_context('spawn')
+        self.workers: List[ParseWorker] = [ParseWorker(context) for _ in range(max(1, workers))]
+        self._idle = queue.SimpleQueue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def parse(self, html: str, base_url: str, max_lines: int = 0, max_links: int = 0) -> ParseOutcome:
+        """HTMLを解析（上限を超えたときは1パス抽出器の結果を返す）
+
+        バックエンドが出した例外は RuntimeError として送出する。
+        """
+        reply = None
+        worker = self._idle.get()
+        try:
+            worker.start()
+            worker.conn.send((self.backend.name, html, base_url, max_lines, max_links, self.timeout))
+            if worker.conn.poll(self.timeout + WALL_GRACE if self.timeout else None):
+                reply = worker.conn.recv()
+            else:
+                worker.stop()
+        except (EOFError, OSError):
+            # RLIMIT_CPU で終了させられた（またはメモリ不足などで落ちた）
+            worker.stop()
+        except BaseException:
+            # 解析の途中で中断された（Ctrl+C）ワーカーは後から結果を返すので使い回さない
+            worker.stop()
+            raise
+        finally:
+            self._idle.put(worker)
+        if reply is not None:
+            status, value = reply
+            if status == 'error':
+                raise value
+            return ParseOutcome(*value, False)
+        self.timeouts += 1
+        return ParseOutcome(*parse_until(get_backend('stdlib'), html, base_url, max_lines, max_links), True)
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop(wait=1.0)
+
+    def __enter__(self) -> 'ParsePool':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
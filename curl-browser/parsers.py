@@ -0,0 +1,234 @@
+"""
+Parser Backends
+HTML解析の実装（バックエンド）を切り替えるための共通インターフェース
+
+どのバックエンドも (text, links, meta) を返し、結果は html_extract.PageExtractor と
+同じ規則（ブロック要素と元の改行で行を分ける、script/style を除く、http(s) のリンクのみ）で作ります。
+木構造を作るパーサーは、できた木をたどって PageExtractor のハンドラを呼び出します。
+全バックエンドの出力が一致するかは tests/test_parsers.py で確かめます。
+"""
+
+import functools
+import importlib.util
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from html_extract import PageExtractor, ATTR_TAGS, FEED_CHUNK, RAW_END_RE, extract_page
+from link_table import LinkTable
+
+ParseResult = Tuple[str, LinkTable, Dict]
+
+# 木をたどるときに中身ごと飛ばす要素（1パス抽出器が読み飛ばすものと同じ）
+SKIP_TAGS = frozenset(RAW_END_RE)
+
+# BeautifulSoup の木に入れない要素。SoupStrainer は文書の最上位の要素にしか適用されないので、
+# html・head・body の要素自体を作らずにその子要素を最上位にし、表示しない要素を木から除く
+# （html・head・body はどれも行を区切らないので、作らなくても抽出結果は変わらない）
+STRAINED_TAGS = SKIP_TAGS | {'html', 'head', 'body', 'link'}
+
+# lxml.html は </html> より後ろを捨ててしまうので、解析の前に取り除く
+# （html の終了タグは行を区切らないので、取り除いても抽出結果は変わらない）
+HTML_END_RE = re.compile(r'</html\s*>', re.IGNORECASE)
+
+
+class ParserBackend(NamedTuple):
+    name: str
+    requires: Tuple[str, ...]  # 必要なモジュール
+    parse: Callable[[str, str], ParseResult]
+    description: str
+
+    def available(self) -> bool:
+        """必要なモジュールがインストールされているか（インポートはしない）"""
+        return all(importlib.util.find_spec(module) is not None for module in self.requires)
+
+
+def _attrs_for(tag: str, attrs) -> Optional[Dict[str, str]]:
+    return dict(attrs) if tag in ATTR_TAGS else None
+
+
+def walk_soup(root, extractor: PageExtractor):
+    """BeautifulSoupの木を文書順にたどる（深い入れ子でも再帰しない）"""
+    from bs4 import NavigableString, Tag
+    stack = [(child, False) for child in reversed(root.contents)]
+    while stack:
+        node, closing = stack.pop()
+        if closing:
+            extractor.handle_endtag(node.name)
+        elif isinstance(node, Tag):
+            tag = node.name.lower()
+            if tag in SKIP_TAGS:
+                continue
+            extractor.handle_starttag(tag, _attrs_for(tag, node.attrs))
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.contents))
+        elif type(node) is NavigableString:  # コメント・宣言などのサブクラスは除く
+            extractor.handle_text(str(node))
+
+
+@functools.lru_cache(maxsize=None)
+def strained_soup_class():
+    """表示する要素だけを木に入れる BeautifulSoup のサブクラス（beautifulsoup4 4.13 より前では None）"""
+    from bs4 import BeautifulSoup, SoupStrainer
+    if not hasattr(SoupStrainer, 'allow_tag_creation'):
+        # 古い SoupStrainer は、要素を選ぶと最上位の文字列をすべて捨ててしまう
+        return None
+
+    class ContentStrainer(SoupStrainer):
+        """最上位の要素のうち STRAINED_TAGS を木に入れない（読み飛ばした script・style の中身も）"""
+
+        def __init__(self):
+            super().__init__()
+            self.in_skipped = False
+
+        def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+            if name in SKIP_TAGS:
+                self.in_skipped = True
+            return name not in STRAINED_TAGS
+
+        def allow_string_creation(self, string) -> bool:
+            return not self.in_skipped
+
+    class StrainedSoup(BeautifulSoup):
+        def __init__(self, markup: str, features: str):
+            super().__init__(markup, features, parse_only=ContentStrainer())
+
+        def handle_endtag(self, name, nsprefix=None):
+            # script・style の中身は終了タグの直前にまとめて届くので、終了タグで読み飛ばしを終える
+            super().handle_endtag(name, nsprefix)
+            self.parse_only.in_skipped = False
+
+    return StrainedSoup
+
+
+def parse_soup(html: str, base_url: str, features: str = 'html.parser', strain: bool = True) -> ParseResult:
+    """BeautifulSoup（features で木構造の作り方を指定）で解析
+
+    strain=False のときは表示しない要素も木に入れる（bench.py memory での比較用）。
+    """
+    from bs4 import BeautifulSoup
+    soup_class = (strain and strained_soup_class()) or BeautifulSoup
+    extractor = PageExtractor(base_url)
+    walk_soup(soup_class(html, features), extractor)
+    extractor.close()
+    return extractor.result()
+
+
+def walk_lxml(root, extractor: PageExtractor):
+    """lxmlの要素ツリーを文書順にたどる（要素の後ろのテキストは tail にある）"""
+    import lxml.etree
+    handle_starttag, handle_endtag, handle_text = (
+        extractor.handle_starttag, extractor.handle_endtag, extractor.handle_text)
+    walker = lxml.etree.iterwalk(root, events=('start', 'end', 'comment', 'pi'))
+    for event, element in walker:
+        if event == 'start':
+            tag = element.tag
+            if tag not in SKIP_TAGS:
+                handle_starttag(tag, _attrs_for(tag, element.attrib))
+                if element.text:
+                    handle_text(element.text)
+                continue
+            # 中身は飛ばす（end イベントは来るので、後ろのテキストはそこで扱う）
+            walker.skip_subtree()
+            continue
+        elif event == 'end':
+            handle_endtag(element.tag)
+        # 終了タグの後、およびコメントの後ろのテキスト
+        if element.tail:
+            handle_text(element.tail)
+
+
+def parse_lxml(html: str, base_url: str) -> ParseResult:
+    """lxml.html で解析"""
+    import lxml.etree
+    import lxml.html
+    extractor = PageExtractor(base_url)
+    html = HTML_END_RE.sub('', html)
+    if html.strip():
+        try:
+            root = lxml.html.document_fromstring(html)
+        except (lxml.etree.ParserError, ValueError):
+            # XML宣言付きの文字列などはバイト列として渡し直す
+            try:
+                root = lxml.html.document_fromstring(html.encode('utf-8'),
+                                                     parser=lxml.html.HTMLParser(encoding='utf-8'))
+            except lxml.etree.ParserError:
+                # コメントだけの文書など、要素が1つも無い（Document is empty）
+                root = None
+        if root is not None:
+            walk_lxml(root, extractor)
+    extractor.close()
+    return extractor.result()
+
+
+def parse_selectolax(html: str, base_url: str) -> ParseResult:
+    """selectolax (lexbor) で解析"""
+    from selectolax.lexbor import LexborHTMLParser
+    extractor = PageExtractor(base_url)
+    root = LexborHTMLParser(html).root
+    stack = [(root, False)] if root is not None else []
+    while stack:
+        node, closing = stack.pop()
+        tag = node.tag
+        if closing:
+            extractor.handle_endtag(tag)
+        elif tag == '-text':
+            extractor.handle_text(node.text(deep=False))
+        elif tag and tag[0] not in '-_!' and tag not in SKIP_TAGS:
+            extractor.handle_starttag(tag, _attrs_for(tag, {k: v or '' for k, v in node.attributes.items()}))
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(list(node.iter(include_text=True))))
+    extractor.close()
+    return extractor.result()
+
+
+# 速い順（bench.py parsers で測定した結果に基づく）
+BACKENDS = (
+    ParserBackend('selectolax', ('selectolax',), parse_selectolax, "selectolax (lexbor)"),
+    ParserBackend('lxml', ('lxml',), parse_lxml, "lxml.html"),
+    ParserBackend('stdlib', (), extract_page, "標準ライブラリのみの1パス抽出器"),
+    ParserBackend('bs4-lxml', ('bs4', 'lxml'), lambda html, url: parse_soup(html, url, 'lxml'),
+                  "BeautifulSoup + lxml"),
+    ParserBackend('bs4', ('bs4',), parse_soup, "BeautifulSoup + html.parser"),
+)
+BACKEND_NAMES = tuple(backend.name for backend in BACKENDS)
+
+
+def available_backends() -> List[ParserBackend]:
+    return [backend for backend in BACKENDS if backend.available()]
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend(name: Optional[str] = None) -> ParserBackend:
+    """指定した（省略時はインストール済みで最速の）バックエンドを返す"""
+    if not name or name == 'auto':
+        return available_backends()[0]
+    for backend in BACKENDS:
+        if backend.name == name:
+            if not backend.available():
+                raise ValueError(f"パーサー {name} に必要なモジュールがありません: {', '.join(backend.requires)}")
+            return backend
+    raise ValueError(f"不明なパーサーです: {name}（{', '.join(BACKEND_NAMES)}）")
+
+
+def parse_until(backend: ParserBackend, html: str, base_url: str, max_lines: int,
+                max_links: int) -> Tuple[ParseResult, bool]:
+    """行とリンクがそれぞれ max_lines・max_links 個集まるところまでで解析を打ち切る
+
+    1パス抽出器で必要な位置を求め、木を作るバックエンドにはそこまでの部分だけを渡すので、
+    巨大な文書でも木の大きさ（メモリ）は表示する分に比例する。戻り値は (結果, 打ち切ったか)。
+    max_lines・max_links がどちらも0なら、打ち切らずに全体を解析する。
+    """
+    if not (max_lines or max_links):
+        return backend.parse(html, base_url), False
+    extractor = PageExtractor(base_url, max_lines, max_links)
+    for start in range(0, len(html), FEED_CHUNK):
+        extractor.feed(html[start:start + FEED_CHUNK])
+        if extractor.stopped:
+            break
+    extractor.close()
+    if not extractor.stopped:
+        return backend.parse(html, base_url), False
+    if backend.parse is extract_page:
+        return extractor.result(), True
+    return backend.parse(html[:extractor.stop_offset], base_url), True
+
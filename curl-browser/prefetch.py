@@ -0,0 +1,117 @@
+"""
+Link Prefetcher
+表示中ページのリンク先をバックグラウンドで先読みしてページキャッシュに入れる
+
+表示されたリンクの上位N件を別スレッドで取得しておき、
+[番号] でリンクを開いたときにすぐ表示できるようにします。
+全体の転送量・時間には上限があり、HTML以外の Content-Type はヘッダーを見た時点で打ち切ります。
+別のページへ移動すると、そのリンク以外の先読みは中断されます。
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from charset import decode_html
+from http_pool import HostLimiter
+from media_type import is_html
+from page_cache import PageCache
+
+# open_stream(url) -> (ステータス, レスポンスヘッダー, 本文チャンクのイテレータ, 中断用の関数, 文字コード)
+OpenStream = Callable[[str], Tuple[int, Dict[str, str], Iterable[bytes], Callable[[], None], str]]
+
+
+class PrefetchTask:
+    """1つのリンクの先読み"""
+
+    __slots__ = ('url', 'cancelled', 'done')
+
+    def __init__(self, url: str):
+        self.url = url
+        self.cancelled = False
+        self.done = threading.Event()
+
+
+class Prefetcher:
+    """リンク先の先読み（転送量・時間・ホストごとの同時数に上限あり）
+
+    先読みはデーモンスレッドで行うので、ブラウザの終了を妨げません。
+    """
+
+    def __init__(self, open_stream: OpenStream, page_cache: PageCache, max_links: int = 5,
+                 max_bytes: int = 4 * 1024 * 1024, time_budget: float = 15.0, per_host: int = 2):
+        self.open_stream = open_stream
+        self.page_cache = page_cache
+        self.max_links = max_links
+        self.max_bytes = max_bytes
+        self.time_budget = time_budget
+        self.fetched = 0
+        self._host_limiter = HostLimiter(per_host)
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._bytes_used = 0
+        self._deadline = 0.0
+
+    def start(self, urls: List[str]):
+        """表示されたリンクの上位 max_links 件の先読みを始める（前回の先読みは中断）"""
+        self.cancel()
+        with self._lock:
+            self._bytes_used = 0
+            self._deadline = time.monotonic() + self.time_budget
+            for url in urls:
+                if len(self._tasks) >= self.max_links:
+                    break
+                if url in self._tasks or url in self.page_cache:
+                    continue
+                task = PrefetchTask(url)
+                self._tasks[url] = task
+                threading.Thread(target=self._run, args=(task,), daemon=True).start()
+
+    def cancel(self, keep: str = ""):
+        """先読みを中断（keep に指定したURLだけは続ける）"""
+        with self._lock:
+            for url, task in self._tasks.items():
+                if url != keep:
+                    task.cancelled = True
+            self._tasks = {keep: self._tasks[keep]} if keep in self._tasks else {}
+
+    def claim(self, url: str):
+        """これから開くURLの先読みが進行中なら、ほかを中断してその完了を待つ"""
+        with self._lock:
+            task = self._tasks.get(url)
+        self.cancel(keep=url)
+        if task:
+            task.done.wait(max(0.0, self._deadline - time.monotonic()))
+
+    def _run(self, task: PrefetchTask):
+        try:
+            with self._host_limiter.slot(task.url):
+                if not task.cancelled:
+                    self._fetch(task)
+        except Exception:
+            pass  # 先読みの失敗は無視（実際に開いたときに改めて取得する）
+        finally:
+            task.done.set()
+
+    def _fetch(self, task: PrefetchTask):
+        _, headers, chunks, close, _ = self.open_stream(task.url)
+        try:
+            if not is_html(headers):
+                return
+            parts = []
+            for chunk in chunks:
+                if task.cancelled or time.monotonic() > self._deadline:
+                    return
+                with self._lock:
+                    self._bytes_used += len(chunk)
+                    over_budget = self._bytes_used > self.max_bytes
+                if over_budget:
+                    return
+                parts.append(chunk)
+        finally:
+            close()
+        if not task.cancelled:
+            # 表示中のページの展開済みHTMLを追い出さないよう hot=False で入れる
+            html, _ = decode_html(b''.join(parts), headers.get('content-type', ''))
+            self.page_cache.put(task.url, html, hot=False)
+            self.fetched += 1
@@ -0,0 +1,183 @@
+"""
+Page Search Index
+表示したページの本文を SQLite FTS5 に保存する全文検索インデックス
+
+ページを表示するたびに抽出済みのテキストを追加・更新し、
+find コマンドで再取得やWeb検索なしに閲覧済みページを探せるようにします。
+内容のダイジェストが変わっていないページは本文を書き直しません。
+データベースは最初に追加・検索するときに開くので、起動時間には影響しません。
+"""
+
+import os
+import threading
+import time
+from typing import List, NamedTuple
+
+from disk_cache import default_cache_dir
+from page_cache import ParsedPage, normalize_url
+
+SCHEMA_VERSION = 1
+
+
+class SearchHit(NamedTuple):
+    url: str
+    title: str
+    snippet: str
+    bookmarked: bool
+
+
+def fts_tokenizer(conn: 'sqlite3.Connection') -> str:
+    """日本語のように空白で区切らない文章も検索できる trigram を優先（古いSQLiteでは unicode61）"""
+    import sqlite3
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.probe USING fts5(body, tokenize='trigram')")
+        conn.execute("DROP TABLE temp.probe")
+        return 'trigram'
+    except sqlite3.OperationalError:
+        return 'unicode61'
+
+
+class PageIndex:
+    """閲覧済みページ・ブックマークの全文検索インデックス"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> 'sqlite3.Connection':
+        """初めて使うときに接続する（sqlite3 もそのときに読み込む）"""
+        with self._lock:
+            if self._conn is None:
+                import sqlite3
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                # 対話ループの入力スレッドとイベントループのどちらからでも使えるように
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    self._create_schema(conn)
+                self._tokenizer = conn.execute(
+                    "SELECT value FROM meta WHERE key = 'tokenizer'").fetchone()[0]
+                self._conn = conn
+            return self._conn
+
+    @property
+    def tokenizer(self) -> str:
+        """FTS5 のトークナイザ（接続するときにデータベースから読み込む）"""
+        if self._tokenizer is None:
+            _ = self.conn
+        return self._tokenizer
+
+    @staticmethod
+    def _create_schema(conn: 'sqlite3.Connection'):
+        tokenizer = fts_tokenizer(conn)
+        with conn:
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS pages (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT UNIQUE NOT NULL,
+                    digest TEXT NOT NULL,
+                    visited REAL NOT NULL,
+                    bookmarked INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(title, body, tokenize='{tokenizer}');
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('tokenizer', ?)", (tokenizer,))
+
+    def add(self, page: ParsedPage):
+        """ページを追加（同じURLの内容が変わっていれば置き換え、同じなら閲覧日時だけ更新）"""
+        url = normalize_url(page.url)
+        now = time.time()
+        with self.conn:
+            row = self.conn.execute("SELECT id, digest FROM pages WHERE url = ?", (url,)).fetchone()
+            if row and row[1] == page.digest:
+                self.conn.execute("UPDATE pages SET visited = ? WHERE id = ?", (now, row[0]))
+                return
+            if row:
+                page_id = row[0]
+                self.conn.execute("UPDATE pages SET digest = ?, visited = ? WHERE id = ?",
+                                  (page.digest, now, page_id))
+                self.conn.execute("DELETE FROM pages_fts WHERE rowid = ?", (page_id,))
+            else:
+                page_id = self.conn.execute("INSERT INTO pages (url, digest, visited) VALUES (?, ?, ?)",
+                                            (url, page.digest, now)).lastrowid
+            self.conn.execute("INSERT INTO pages_fts (rowid, title, body) VALUES (?, ?, ?)",
+                              (page_id, page.title, page.text))
+
+    def set_bookmarked(self, url: str, bookmarked: bool = True):
+        with self.conn:
+            self.conn.execute("UPDATE pages SET bookmarked = ? WHERE url = ?",
+                              (int(bookmarked), normalize_url(url)))
+
+    def _match_expression(self, query: str) -> str:
+        """入力を語ごとのフレーズ検索にする（FTS5の演算子として解釈させない）"""
+        terms = query.split()
+        return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+    def search(self, query: str, limit: int = 10, bookmarks_only: bool = False) -> List[SearchHit]:
+        """関連度（bm25、タイトル一致を重視）の高い順に検索結果を返す"""
+        terms = query.split()
+        if not terms:
+            return []
+        if self.tokenizer == 'trigram' and any(len(term) < 3 for term in terms):
+            return self._search_like(terms, limit, bookmarks_only)
+        sql = """
+            SELECT p.url, f.title, snippet(pages_fts, 1, '[', ']', '…', 40), p.bookmarked
+            FROM pages_fts f JOIN pages p ON p.id = f.rowid
+            WHERE pages_fts MATCH ?
+        """
+        if bookmarks_only:
+            sql += " AND p.bookmarked = 1"
+        sql += " ORDER BY bm25(pages_fts, 5.0, 1.0) LIMIT ?"
+        rows = self.conn.execute(sql, (self._match_expression(query), limit)).fetchall()
+        return [SearchHit(url, title, ' '.join(snippet.split()), bool(bookmarked))
+                for url, title, snippet, bookmarked in rows]
+
+    def _search_like(self, terms: List[str], limit: int, bookmarks_only: bool) -> List[SearchHit]:
+        """trigram では3文字未満の語を索引で引けないため、部分一致で探す（新しく見たページ順）"""
+        conditions = ' AND '.join("(f.title LIKE ? ESCAPE '\\' OR f.body LIKE ? ESCAPE '\\')" for _ in terms)
+        params = []
+        for term in terms:
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            params += [pattern, pattern]
+        sql = f"""
+            SELECT p.url, f.title, f.body, p.bookmarked
+            FROM pages_fts f JOIN pages p ON p.id = f.rowid
+            WHERE {conditions}
+        """
+        if bookmarks_only:
+            sql += " AND p.bookmarked = 1"
+        sql += " ORDER BY p.visited DESC LIMIT ?"
+        hits = []
+        for url, title, body, bookmarked in self.conn.execute(sql, params + [limit]):
+            hits.append(SearchHit(url, title, make_snippet(body, terms[0]), bool(bookmarked)))
+        return hits
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def make_snippet(text: str, term: str, width: int = 40) -> str:
+    """term の前後 width 文字を切り出す"""
+    position = text.lower().find(term.lower())
+    if position < 0:
+        return ' '.join(text[:width * 2].split())
+    start = max(0, position - width)
+    end = position + len(term) + width
+    snippet = text[start:position] + '[' + text[position:position + len(term)] + ']' + text[position + len(term):end]
+    return ('…' if start > 0 else '') + ' '.join(snippet.split()) + ('…' if end < len(text) else '')
+
+
+def default_index_path() -> str:
+    return os.path.join(default_cache_dir(), 'pages.db')
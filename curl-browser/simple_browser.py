@@ -2,50 +2,215 @@
 """
 Terminal Simple Browser
 curlコマンドを使った簡易ブラウザ
+（標準では http.client で接続を使い回し、--curl 指定時は curl コマンドで取得）
 
 使用方法:
 python simple_browser.py [URL]
 またはスクリプト実行後にURLを入力
 """
 
-import subprocess
-import sys
+import argparse
+import os
 import re
-import urllib.parse
+import tempfile
+import time
 from typing import Optional, List, Tuple
 
+from charset import decode_html, header_charset
+from history_store import HistoryStore, default_history_path
+from page_cache import PageCache, ParsedPage, content_digest, DEFAULT_CACHE_BYTES
+from pager import MAX_LINK_MATCHES, PageView, is_pager_command, link_query, write_screen
+from html_extract import extract_page
+from streaming import StreamingLoad, curl_stream, CHUNK_SIZE
+from http_pool import ConnectionPool
+from media_type import NotHtmlError, check_header_dump, check_html, format_size, is_html, save_chunks, suggested_filename
+from prefetch import Prefetcher
+from spool import DEFAULT_MAX_BYTES, read_body, run_capped, truncate_body
+from timing import Timings, profiled, split_curl_timing, CURL_WRITE_OUT
+
+# 1画面に表示する行数とリンク数
+SCREEN_LINES = 100
+SCREEN_LINKS = 20
+
+
+def format_link(number: int, url: str, text: str) -> List[str]:
+    """リンク一覧の1項目"""
+    return [f"  {number:2d}. {text[:60]}... -> {url}"]
+
+
 class SimpleBrowser:
-    def __init__(self):
+    def __init__(self, cache_bytes: int = DEFAULT_CACHE_BYTES, streaming: bool = False, use_curl: bool = False,
+                 prefetch: int = 0, timings: Optional[Timings] = None, profile: bool = False,
+                 history_store: Optional[HistoryStore] = None, max_bytes: int = DEFAULT_MAX_BYTES):
         self.current_url = ""
-        self.history = []
+        self.history = []  # このセッションの戻る/進む用
         self.history_index = -1
+        # 再起動後も残る閲覧履歴（指定が無ければ保存しない）
+        self.history_store = history_store if history_store is not None else HistoryStore(':memory:')
+        self.page_cache = PageCache(cache_bytes)
+        self.streaming = streaming
+        self.max_bytes = max_bytes  # 本文の大きさの上限（超えた分は読まない）
+        self.loading = None  # 読み込み中の StreamingLoad
+        self.view = None  # 表示中のページのページャ（more / page N / links page N / 検索）
+        self.skipped = None  # 最後に表示しなかったHTML以外のリンク（save で保存）
+        self.use_curl = use_curl
+        self.pool = None if use_curl else ConnectionPool('Simple-Terminal-Browser/1.0')
+        self._async_client = None  # 対話ループでの取得に使用（最初に使うときに作成）
+        # 表示したリンクの上位prefetch件をバックグラウンドで先読みする（0なら無効）
+        self.prefetcher = Prefetcher(self.open_stream, self.page_cache, max_links=prefetch) if prefetch else None
+        self.timings = timings or Timings()  # フェーズごとの所要時間（stats コマンド）
+        self.profile = profile  # すべてのコマンドをプロファイルする
+        
+    @property
+    def async_client(self) -> 'AsyncHttpClient':
+        """対話ループでの取得に使うクライアント（asyncio は対話ループを始めるまで読み込まない）"""
+        if self._async_client is None:
+            from async_fetch import AsyncHttpClient
+            self._async_client = AsyncHttpClient('Simple-Terminal-Browser/1.0', max_bytes=self.max_bytes)
+        return self._async_client
+    
+    def fetch_page(self, url: str, use_cache: bool = True, add_history: bool = True) -> Optional[str]:
+        """Webページを取得（キャッシュにあればそれを使用）"""
+        # URLの正規化
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        
+        cached = self.page_cache.get(url) if use_cache else None
+        if cached:
+            content = cached.html
+            self.timings.note_default(url=url, source='memory', bytes=len(content))
+        elif self.use_curl:
+            content = self.fetch_page_curl(url)
+        else:
+            content = self.fetch_page_http(url)
+        
+        if content is not None:
+            if not cached:
+                self.page_cache.put(url, content)
+            self.current_url = url
+            if add_history:
+                self.add_to_history(url)
         
-    def fetch_page(self, url: str) -> Optional[str]:
+        return content
+    
+    def fetch_page_http(self, url: str) -> Optional[str]:
+        """http.clientの接続プールを使ってWebページを取得（keep-aliveで接続を再利用）"""
+        try:
+            response = self.pool.open(url)
+            start = time.perf_counter()
+            try:
+                check_html(url, response.status, response.headers)
+                body, truncated = read_body(response.iter_chunks(CHUNK_SIZE), self.max_bytes)
+            finally:
+                response.close()
+            response.timing['download'] = response.timing.get('download', 0.0) + time.perf_counter() - start
+            self.timings.add_phases(response.timing)
+            self.timings.note(url=url, backend='http.client', source='network',
+                              status=response.status, bytes=len(body))
+            if response.status >= 400:
+                print(f"エラー: HTTP {response.status}")
+                return None
+            if truncated:
+                self.warn_truncated()
+            with self.timings.phase('decode'):
+                return decode_html(body, response.headers.get('content-type', ''))[0]
+        
+        except NotHtmlError as e:
+            self.show_not_html(e)
+            return None
+        except Exception as e:
+            print(f"ページの取得に失敗しました: {e}")
+            return None
+    
+    def curl_command(self, url: str, header_path: str) -> List[str]:
+        """ページ取得用のcurlコマンド（レスポンスヘッダーは header_path に書き出す）"""
+        return [
+            'curl', '-s', '-L',  # -s: silent, -L: follow redirects
+            '--compressed',  # 圧縮転送（gzip・br・zstd など）を要求して伸長
+            '-H', 'User-Agent: Simple-Terminal-Browser/1.0',
+            '-H', 'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            '--max-time', '30',  # 30秒でタイムアウト
+            '-D', header_path,  # 本文より先に書き出されるので、HTML以外ならそこで打ち切る
+            '-w', CURL_WRITE_OUT,  # 各フェーズの所要時間を本文の後ろに出力
+            url
+        ]
+    
+    def warn_truncated(self):
+        print(f"注意: 本文が上限（{self.max_bytes / 1024 / 1024:g}MB）を超えたため、先頭だけを表示します")
+    
+    def show_not_html(self, error: NotHtmlError):
+        """HTML以外のリンクは本文を読まずに要約だけを表示"""
+        self.skipped = error
+        print(f"注意: {error.summary()}")
+        print(f"save [ファイル名] で保存できます: {error.url}")
+    
+    def fetch_page_curl(self, url: str) -> Optional[str]:
         """curlコマンドを使ってWebページを取得"""
         try:
-            # URLの正規化
-            if not url.startswith(('http://', 'https://')):
-                url = 'https://' + url
-            
-            # curlコマンドを実行
-            cmd = [
-                'curl', '-s', '-L',  # -s: silent, -L: follow redirects
-                '-H', 'User-Agent: Simple-Terminal-Browser/1.0',
-                '-H', 'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                '--max-time', '30',  # 30秒でタイムアウト
-                url
-            ]
+            # curlコマンドを実行（本文が上限を超えたら終了させる）
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                header_path = os.path.join(tmp_dir, 'headers')
+                returncode, stdout, stderr, truncated = run_capped(
+                    self.curl_command(url, header_path), self.max_bytes,
+                    on_start=lambda: check_header_dump(url, header_path))
             
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
-            
-            if result.returncode == 0:
-                self.current_url = url
-                self.add_to_history(url)
-                return result.stdout
+            if returncode == 0 or truncated:
+                body, phases, content_type = split_curl_timing(stdout)
+                body, cut = truncate_body(body, self.max_bytes)
+                self.timings.add_phases(phases)
+                self.timings.note(url=url, backend='curl', source='network', bytes=len(body))
+                if truncated or cut:
+                    self.warn_truncated()
+                with self.timings.phase('decode'):
+                    return decode_html(body, content_type)[0]
             else:
-                print(f"エラー: {result.stderr}")
+                print(f"エラー: {stderr.decode('utf-8', errors='replace')}")
                 return None
                 
+        except NotHtmlError as e:
+            self.show_not_html(e)
+            return None
+        except Exception as e:
+            print(f"ページの取得に失敗しました: {e}")
+            return None
+    
+    async def fetch_page_async(self, url: str, revalidate: bool = False) -> Optional[str]:
+        """ネットワークからページを取得（対話ループ用。タスクを中断すると接続を閉じる・curlを終了する）"""
+        try:
+            if self.use_curl:
+                from async_fetch import run_curl
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    header_path = os.path.join(tmp_dir, 'headers')
+                    returncode, stdout, stderr, truncated = await run_curl(
+                        self.curl_command(url, header_path), self.max_bytes,
+                        on_start=lambda: check_header_dump(url, header_path))
+                if returncode != 0 and not truncated:
+                    print(f"エラー: {stderr.decode('utf-8', errors='replace')}")
+                    return None
+                body, phases, content_type = split_curl_timing(stdout)
+                body, cut = truncate_body(body, self.max_bytes)
+                truncated = truncated or cut
+                self.timings.add_phases(phases)
+                self.timings.note(url=url, backend='curl', source='network', bytes=len(body))
+            else:
+                response = await self.async_client.fetch(url, html_only=True)
+                body = response.body
+                truncated = response.truncated
+                content_type = response.headers.get('content-type', '')
+                self.timings.add_phases(response.timing)
+                self.timings.note(url=url, backend='asyncio', source='network',
+                                  status=response.status, bytes=len(body))
+                if response.status >= 400:
+                    print(f"エラー: HTTP {response.status}")
+                    return None
+            if truncated:
+                self.warn_truncated()
+            with self.timings.phase('decode'):
+                return decode_html(body, content_type)[0]
+        
+        except NotHtmlError as e:
+            self.show_not_html(e)
+            return None
         except Exception as e:
             print(f"ページの取得に失敗しました: {e}")
             return None
@@ -64,7 +229,7 @@ class SimpleBrowser:
         if self.history_index > 0:
             self.history_index -= 1
             url = self.history[self.history_index]
-            return self.fetch_page(url)
+            return self.fetch_page(url, add_history=False)
         return None
     
     def go_forward(self) -> Optional[str]:
@@ -72,178 +237,512 @@ class SimpleBrowser:
         if self.history_index < len(self.history) - 1:
             self.history_index += 1
             url = self.history[self.history_index]
-            return self.fetch_page(url)
+            return self.fetch_page(url, add_history=False)
         return None
     
     def parse_html(self, html: str) -> str:
         """HTMLを解析して読みやすいテキストに変換"""
         if not html:
             return ""
+        text, _, _ = extract_page(html, self.current_url)
+        return text
+    
+    def extract_links(self, html: str) -> List[Tuple[str, str]]:
+        """HTMLからリンクを抽出（同じURLへのリンクは1つにまとめる）"""
+        _, links, _ = extract_page(html, self.current_url)
+        return links
+    
+    def parse_page(self, html: str) -> ParsedPage:
+        """現在のページを解析（同じ内容の解析結果があれば再利用）"""
+        cached = self.page_cache.get(self.current_url)
+        digest = cached.digest if cached and cached.html is html else content_digest(html)
+        parsed = self.page_cache.get_parsed(self.current_url, digest)
+        if parsed:
+            return parsed
         
-        # HTMLタグを除去（簡易版）
-        text = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<[^>]+>', '', text)
+        # テキストとリンクを1パスで抽出
+        with self.timings.phase('parse'):
+            text_content, links, meta_info = extract_page(html, self.current_url)
+        parsed = ParsedPage(digest, self.current_url, text_content, links, meta_info)
+        self.page_cache.set_parsed(self.current_url, parsed)
+        return parsed
+    
+    def current_page(self) -> Optional[ParsedPage]:
+        """現在のページの解析結果を取得（キャッシュから外れていれば再取得）"""
+        self.collect_loading(wait=True)
+        cached = self.page_cache.get(self.current_url)
+        html = cached.html if cached else self.fetch_page(self.current_url, add_history=False)
+        if not html:
+            return None
+        return self.parse_page(html)
+    
+    def current_links(self, needed: int = 0) -> Optional[List[Tuple[str, str]]]:
+        """現在のページのリンク一覧（読み込み中でも必要な番号まで揃っていれば待たない）"""
+        if self.loading and not self.loading.finished:
+            _, links, _ = self.loading.snapshot()
+            if 0 < needed <= len(links):
+                return links
+        page = self.current_page()
+        return page.links if page else None
+    
+    def open_stream(self, url: str):
+        """本文を少しずつ読めるレスポンスを開く（ストリーミング表示・先読みで使用）
         
-        # HTMLエンティティをデコード
-        text = text.replace('&lt;', '<')
-        text = text.replace('&gt;', '>')
-        text = text.replace('&amp;', '&')
-        text = text.replace('&quot;', '"')
-        text = text.replace('&#39;', "'")
-        text = text.replace('&nbsp;', ' ')
+        (ステータス, レスポンスヘッダー, 本文チャンクのイテレータ, 中断用の関数, 宣言された文字コード) を返す。
+        文字コードはContent-Typeに charset が無ければ None（本文の先頭から判定する）。
+        """
+        if self.use_curl:
+            chunks, close, status, headers = curl_stream([
+                'curl', '-s', '-L', '--compressed',
+                '-H', 'User-Agent: Simple-Terminal-Browser/1.0',
+                '-H', 'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                '--max-time', '30',
+                url
+            ])
+            return status, headers, chunks, close, header_charset(headers.get('content-type', ''))
+        response = self.pool.open(url)
+        if response.status >= 400:
+            response.close()
+            raise RuntimeError(f"HTTP {response.status}")
+        return (response.status, response.headers, response.iter_chunks(CHUNK_SIZE), response.close,
+                header_charset(response.headers.get('content-type', '')))
+    
+    def stream_page(self, url: str) -> bool:
+        """ページをダウンロードしながら最初の画面を表示（ストリーミングモード）"""
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
         
-        # 複数の空白や改行を整理
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        text = re.sub(r' +', ' ', text)
+        try:
+            with self.timings.phase('ttfb'):
+                _, headers, chunks, close, encoding = self.open_stream(url)
+        except Exception as e:
+            print(f"ページの取得に失敗しました: {e}")
+            return False
+        if not is_html(headers):
+            close()
+            self.show_not_html(NotHtmlError(url, headers))
+            return False
+        load = StreamingLoad(url, chunks, encoding, close, first_screen_lines=100, max_bytes=self.max_bytes).start()
+        with self.timings.phase('first_screen'):
+            load.wait_first_screen()
+        self.timings.note(url=url, source='stream', bytes=load.bytes_received)
+        if load.error:
+            print(f"エラー: {load.error}")
+            return False
         
-        return text.strip()
+        self.current_url = url
+        self.add_to_history(url)
+        self.loading = load
+        self.collect_loading()
+        with self.timings.phase('render'):
+            if self.loading:
+                # 残りはバックグラウンドで読み込みを続ける
+                self.render_page(load.snapshot(), loading=True)
+            else:
+                self.render_page(self.current_page())
+        return True
     
-    def extract_links(self, html: str) -> List[Tuple[str, str]]:
-        """HTMLからリンクを抽出"""
-        links = []
-        # aタグのhref属性を抽出
-        pattern = r'<a[^>]*href=["\']([^"\']+)["\'][^>]*>(.*?)</a>'
-        matches = re.findall(pattern, html, re.IGNORECASE | re.DOTALL)
-        
-        for href, text in matches:
-            # 相対URLを絶対URLに変換
-            if href.startswith('/'):
-                base_url = urllib.parse.urlparse(self.current_url)
-                href = f"{base_url.scheme}://{base_url.netloc}{href}"
-            elif not href.startswith(('http://', 'https://')):
-                href = urllib.parse.urljoin(self.current_url, href)
-            
-            # リンクテキストからHTMLタグを除去
-            link_text = re.sub(r'<[^>]+>', '', text).strip()
-            if link_text:
-                links.append((href, link_text))
+    def collect_loading(self, wait: bool = False):
+        """バックグラウンドの読み込みが終わっていれば結果をキャッシュに入れる"""
+        load = self.loading
+        if not load:
+            return
+        if wait and not load.finished and load.url == self.current_url:
+            print("読み込みの完了を待っています...")
+            load.wait()
+        if not load.finished:
+            return
         
-        return links
+        self.loading = None
+        if load.complete:
+            if load.truncated:
+                self.warn_truncated()
+            entry = self.page_cache.put(load.url, load.html)
+            text_content, links, meta_info = load.extractor.result()
+            parsed = ParsedPage(entry.digest, load.url, text_content, links, meta_info)
+            self.page_cache.set_parsed(load.url, parsed)
+            if load.url == self.current_url:
+                self.set_view(load.url, parsed)
+    
+    def stop_loading(self, next_url: str = ""):
+        """別のページへ移動する前にバックグラウンドの読み込み・先読みを打ち切る"""
+        self.collect_loading()
+        if self.loading:
+            self.loading.cancel()
+            self.loading = None
+        if self.prefetcher:
+            if next_url:
+                # 移動先を先読み中ならその完了だけは待って使う
+                self.prefetcher.claim(next_url)
+            else:
+                self.prefetcher.cancel()
+    
+    def open_page(self, url: str):
+        """ページを開いて表示（ストリーミングモードでは未取得のページを逐次表示）"""
+        self.stop_loading(next_url=url)
+        if self.streaming and url not in self.page_cache:
+            self.stream_page(url)
+            return
+        html = self.fetch_page(url)
+        if html:
+            self.display_page(html)
     
     def display_page(self, html: str):
         """ページ内容を表示"""
-        print("=" * 80)
-        print(f"URL: {self.current_url}")
-        print("=" * 80)
+        parsed = self.parse_page(html)
+        with self.timings.phase('render'):
+            self.render_page(parsed)
+    
+    def make_view(self, url: str, parsed) -> PageView:
+        """解析済みのページのページャを作成"""
+        text_content, links, meta_info = parsed
+        return PageView(url, text_content, links, SCREEN_LINES, SCREEN_LINKS, format_link,
+                        title=meta_info.get('title', ''))
+    
+    def set_view(self, url: str, parsed) -> PageView:
+        """表示したページのページャにして閲覧履歴に追記（同じ解析結果を表示し直したときは追記しない）"""
+        text_content, _, _ = parsed
+        view = self.view
+        if view is None or view.url != url or view.text is not text_content:
+            view = self.view = self.make_view(url, parsed)
+            try:
+                self.history_store.add_visit(url, view.title)
+            except Exception as e:
+                print(f"閲覧履歴を保存できませんでした: {e}")
+        return view
+    
+    def page_view(self) -> Optional[PageView]:
+        """表示中のページのページャ（読み込み中なら完了を待つ。ネットワークにはアクセスしない）"""
+        self.collect_loading(wait=True)
+        if self.view and self.view.url == self.current_url:
+            return self.view
+        return None
+    
+    def render_page(self, parsed, loading: bool = False):
+        """解析済みのページ内容の最初の画面を表示（loading=True なら読み込み途中の内容）"""
+        if loading:
+            view = self.make_view(self.current_url, parsed)
+        else:
+            view = self.set_view(self.current_url, parsed)
+            view.position = 0
+        output = ["=" * 80, f"URL: {self.current_url}", "=" * 80]
         
-        # テキスト内容を表示
-        text_content = self.parse_html(html)
-        if text_content:
-            # 長すぎる場合は先頭部分のみ表示
-            lines = text_content.split('\n')
-            if len(lines) > 100:
-                lines = lines[:100]
-                print('\n'.join(lines))
-                print(f"\n... ({len(text_content.split())} 行の内容があります)")
-            else:
-                print(text_content)
+        # テキスト内容を表示（長すぎる場合は最初の画面のみ）
+        if view.text:
+            output += view.text_screen(0)
+            if loading:
+                output.append("\n残りを読み込み中です...")
+            elif view.screen_count > 1:
+                output.append(f"\n... (全{view.line_count}行、画面 1/{view.screen_count}。more で続きを表示)")
         
-        print("\n" + "-" * 80)
+        output.append("\n" + "-" * 80)
         
         # リンクを表示
-        links = self.extract_links(html)
-        if links:
-            print("リンク:")
-            for i, (url, text) in enumerate(links[:20]):  # 最大20個まで表示
-                print(f"  {i+1:2d}. {text[:60]}... -> {url}")
-            if len(links) > 20:
-                print(f"  ... 他{len(links)-20}個のリンク")
+        if view.links:
+            output.append("リンク:")
+            output += view.link_screen(0)
+            if len(view.links) > SCREEN_LINKS and not loading:
+                output.append(f"  ... 他{len(view.links) - SCREEN_LINKS}個のリンク（links page 2 で続きを表示）")
+        
+        output.append("-" * 80)
+        write_screen(output)
         
-        print("-" * 80)
+        if self.prefetcher:
+            self.prefetcher.start([url for url, _ in view.links[:SCREEN_LINKS]])
     
-    def run(self, initial_url: str = ""):
-        """ブラウザを実行"""
-        print("🌐 Simple Terminal Browser")
-        print("コマンド: [URL], back, forward, links, history, quit")
-        print("=" * 80)
+    def show_screen(self, screen: int):
+        """テキストの screen 番目（0始まり）の画面を表示"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+            return
+        if not 0 <= screen < view.screen_count:
+            print(f"画面は 1〜{view.screen_count} です。")
+            return
+        view.position = screen
+        output = view.text_screen(screen)
+        output.append(f"\n--- 画面 {screen + 1}/{view.screen_count}（全{view.line_count}行） ---")
+        write_screen(output)
+    
+    def show_more(self):
+        """次の画面を表示"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+        elif view.position + 1 >= view.screen_count:
+            print("最後の画面です。")
+        else:
+            self.show_screen(view.position + 1)
+    
+    def show_links(self, screen: Optional[int] = None):
+        """リンク一覧を表示（screen を指定するとその画面のリンクだけ）"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+            return
+        if not view.links:
+            print("リンクが見つかりませんでした。")
+            return
+        if screen is None:
+            output = ["利用可能なリンク:"]
+            output += [f"  {i:2d}. {text} -> {url}" for i, (url, text) in enumerate(view.links, 1)]
+        elif not 0 <= screen < view.link_screen_count:
+            print(f"リンクの画面は 1〜{view.link_screen_count} です。")
+            return
+        else:
+            output = [f"リンク（画面 {screen + 1}/{view.link_screen_count}）:"] + view.link_screen(screen)
+        write_screen(output)
+    
+    def show_saved_history(self, argument: str):
+        """保存済みの閲覧履歴を表示（all [件数] なら最近の履歴、URLならそのページの閲覧履歴）"""
+        if argument.lower().split()[0] == 'all':
+            limit = argument.split()[-1]
+            visits = self.history_store.recent(int(limit) if limit.isdigit() else 20)
+            heading = f"最近の閲覧履歴（全{len(self.history_store)}件）:"
+        else:
+            visits = self.history_store.visits(argument)
+            heading = f"{argument} の閲覧履歴（{self.history_store.visit_count(argument)}回）:"
+        if not visits:
+            print("閲覧履歴はありません。")
+            return
+        output = [heading]
+        for visit in visits:
+            visited = time.strftime('%Y-%m-%d %H:%M', time.localtime(visit.visited))
+            output.append(f"  {visited}  {visit.title or visit.url} -> {visit.url}")
+        write_screen(output)
+    
+    def show_link_matches(self, query: str):
+        """site:ホスト[/パス] か /正規表現/ に一致するリンクを番号付きで表示（番号はそのまま開ける）"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+            return
+        try:
+            numbers = view.find_links(query)
+        except ValueError as e:
+            print(e)
+            return
+        if not numbers:
+            print(f"{query} に一致するリンクはありません（全{len(view.links)}個）。")
+            return
+        output = [f"{query} に一致するリンク: {len(numbers)}個（全{len(view.links)}個）"]
+        output += view.link_rows(numbers[:MAX_LINK_MATCHES])
+        if len(numbers) > MAX_LINK_MATCHES:
+            output.append(f"  ... 他{len(numbers) - MAX_LINK_MATCHES}個")
+        write_screen(output)
+    
+    def find_in_page(self, pattern: str):
+        """ページ内を正規表現で検索し、次の一致がある画面を表示（pattern が空なら前回の続き）"""
+        view = self.page_view()
+        if view is None:
+            print("まずページを開いてください。")
+            return
+        if pattern:
+            try:
+                count = view.search(pattern)
+            except re.error as e:
+                print(f"正規表現が正しくありません: {e}")
+                return
+            print(f"{count}件見つかりました。" if count else "見つかりませんでした。")
+        # 新しい検索は表示中の画面から、/ だけなら次の画面から探す
+        found = view.next_match(view.position if pattern else view.position + 1)
+        if found is None:
+            if not pattern:
+                print("検索する語句を /正規表現 で入力してください。")
+            return
+        number, screen = found
+        print(f"{number}件目の一致（/ で次の画面の一致へ）")
+        self.show_screen(screen)
+    
+    def save_resource(self, argument: str):
+        """リンク先（番号かURL、省略時は最後に表示しなかったHTML以外のリンク）を読みながらファイルに保存"""
+        target, _, filename = argument.partition(' ')
+        if target.isdigit():
+            links = self.current_links(int(target)) if self.current_url else None
+            link_num = int(target) - 1
+            if not links or not 0 <= link_num < len(links):
+                print("無効なリンク番号です。")
+                return
+            url = links[link_num][0]
+        elif target.startswith(('http://', 'https://')):
+            url = target
+        elif self.skipped:
+            url, filename = self.skipped.url, argument
+        else:
+            print("保存するリンクの番号かURLを指定してください（save 番号 [ファイル名]）。")
+            return
+        
+        try:
+            _, headers, chunks, close, _ = self.open_stream(url)
+            try:
+                path = filename.strip() or suggested_filename(url, headers)
+                print(f"保存中: {url} -> {path}")
+                size = save_chunks(chunks, path)
+            finally:
+                close()
+        except Exception as e:
+            print(f"保存に失敗しました: {e}")
+            return
+        print(f"保存しました: {path}（{format_size(size)}）")
+    
+    def navigation_target(self, command: str) -> Optional[Tuple[str, bool]]:
+        """ページを取得するコマンドなら (URL, 再検証するか) を返す（対話ループが先に取得しておく）"""
+        lowered = command.lower()
+        if lowered in ['quit', 'exit', 'q', 'stats', 'history', 'links', 'save']:
+            return None
+        if lowered.startswith(('profile ', 'history ', 'save ')):
+            return None
+        if is_pager_command(lowered):
+            return None
+        if lowered == 'back':
+            return (self.history[self.history_index - 1], False) if self.history_index > 0 else None
+        if lowered == 'forward':
+            if self.history_index < len(self.history) - 1:
+                return self.history[self.history_index + 1], False
+            return None
+        if lowered == 'reload':
+            return (self.current_url, True) if self.current_url else None
+        if command.isdigit():
+            links = self.current_links(int(command)) if self.current_url else None
+            link_num = int(command) - 1
+            return (links[link_num][0], False) if links and 0 <= link_num < len(links) else None
+        return (command if command.startswith(('http://', 'https://')) else 'https://' + command), False
+    
+    def execute(self, command: str) -> bool:
+        """コマンドを1つ実行（終了するときは False を返す）"""
+        if command.lower() in ['quit', 'exit', 'q']:
+            print("ブラウザを終了します。")
+            return False
+        
+        elif command.lower().startswith('profile '):
+            # 1つのコマンドだけをプロファイル
+            with profiled():
+                return self.execute(command[8:].strip())
         
-        if initial_url:
-            html = self.fetch_page(initial_url)
+        elif command.lower() == 'stats':
+            print("取得・表示の計測結果:")
+            for line in self.timings.summary_lines():
+                print(line)
+        
+        elif command.lower() == 'back':
+            self.stop_loading()
+            html = self.go_back()
             if html:
                 self.display_page(html)
+            else:
+                print("戻るページがありません。")
         
-        while True:
-            try:
-                command = input("\n> ").strip()
-                
-                if not command:
-                    continue
-                
-                if command.lower() in ['quit', 'exit', 'q']:
-                    print("ブラウザを終了します。")
-                    break
-                
-                elif command.lower() == 'back':
-                    html = self.go_back()
-                    if html:
-                        self.display_page(html)
-                    else:
-                        print("戻るページがありません。")
-                
-                elif command.lower() == 'forward':
-                    html = self.go_forward()
-                    if html:
-                        self.display_page(html)
-                    else:
-                        print("進むページがありません。")
-                
-                elif command.lower() == 'history':
-                    print("履歴:")
-                    for i, url in enumerate(self.history):
-                        marker = " -> " if i == self.history_index else "    "
-                        print(f"{marker}{i+1}. {url}")
-                
-                elif command.lower() == 'links':
-                    if self.current_url:
-                        html = self.fetch_page(self.current_url)
-                        if html:
-                            links = self.extract_links(html)
-                            if links:
-                                print("利用可能なリンク:")
-                                for i, (url, text) in enumerate(links):
-                                    print(f"  {i+1:2d}. {text} -> {url}")
-                            else:
-                                print("リンクが見つかりませんでした。")
-                    else:
-                        print("まずページを開いてください。")
-                
-                elif command.isdigit():
-                    # 数字の場合はリンク番号として処理
-                    if self.current_url:
-                        html_content = self.fetch_page(self.current_url)
-                        if html_content:
-                            links = self.extract_links(html_content)
-                            link_num = int(command) - 1
-                            if 0 <= link_num < len(links):
-                                url = links[link_num][0]
-                                html = self.fetch_page(url)
-                                if html:
-                                    self.display_page(html)
-                            else:
-                                print("無効なリンク番号です。")
+        elif command.lower() == 'forward':
+            self.stop_loading()
+            html = self.go_forward()
+            if html:
+                self.display_page(html)
+            else:
+                print("進むページがありません。")
+        
+        elif command.lower() == 'history':
+            print("履歴:")
+            for i, url in enumerate(self.history):
+                marker = " -> " if i == self.history_index else "    "
+                print(f"{marker}{i+1}. {url}")
+        
+        elif command.lower().startswith('history '):
+            self.show_saved_history(command[8:].strip())
+        
+        elif command.lower() == 'reload':
+            if self.current_url:
+                self.stop_loading()
+                html = self.fetch_page(self.current_url, use_cache=False, add_history=False)
+                if html:
+                    self.display_page(html)
+            else:
+                print("まずページを開いてください。")
+        
+        elif command.lower() == 'links':
+            self.show_links()
+        
+        elif command.lower() == 'more':
+            self.show_more()
+        
+        elif command.startswith('/'):
+            self.find_in_page(command[1:])
+        
+        elif link_query(command):
+            self.show_link_matches(link_query(command))
+        
+        elif is_pager_command(command.lower()):
+            # page N / links page N
+            number = int(command.split()[-1]) - 1
+            if command.lower().startswith('links'):
+                self.show_links(number)
+            else:
+                self.show_screen(number)
+        
+        elif command.lower() == 'save' or command.lower().startswith('save '):
+            self.save_resource(command[5:].strip())
+        
+        elif command.isdigit():
+            # 数字の場合はリンク番号として処理
+            if self.current_url:
+                links = self.current_links(int(command))
+                if links is not None:
+                    link_num = int(command) - 1
+                    if 0 <= link_num < len(links):
+                        url = links[link_num][0]
+                        self.open_page(url)
                     else:
-                        print("まずページを開いてください。")
-                
-                else:
-                    # URLとして処理
-                    html = self.fetch_page(command)
-                    if html:
-                        self.display_page(html)
-                
-            except KeyboardInterrupt:
-                print("\n\nブラウザを終了します。")
-                break
-            except Exception as e:
-                print(f"エラーが発生しました: {e}")
+                        print("無効なリンク番号です。")
+            else:
+                print("まずページを開いてください。")
+        
+        else:
+            # URLとして処理
+            self.open_page(command)
+        
+        return True
+    
+    def run(self, initial_url: str = ""):
+        """ブラウザを実行"""
+        print("🌐 Simple Terminal Browser")
+        print("コマンド: [URL], back, forward, links, history, reload, stats, profile [コマンド], quit")
+        print("ページャ: more, page N, links page N, /正規表現（/ のみで次の一致）")
+        print("リンクの絞り込み: links site:ホスト[/パス], links /正規表現/")
+        print("保存済みの履歴: history all [N], history [URL]")
+        print("ファイルに保存: save [番号|URL] [ファイル名]（HTML以外のリンクは表示せずに要約のみ）")
+        print("=" * 80)
+        
+        # 読み込みは asyncio のタスクとして実行（読み込み中も入力でき、Ctrl+Cで中止）
+        from async_repl import run_repl
+        run_repl(self, initial_url, "\n> ")
 
 def main():
-    browser = SimpleBrowser()
+    parser = argparse.ArgumentParser(description="Simple Terminal Browser")
+    parser.add_argument('url', nargs='?', default="", help="最初に開くURL")
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="ページキャッシュの上限（MB）")
+    parser.add_argument('--stream', action='store_true', help="ダウンロードしながら最初の画面を表示する")
+    parser.add_argument('--curl', action='store_true', help="接続プールを使わずcurlコマンドで取得する")
+    parser.add_argument('--prefetch', type=int, default=0, metavar='N',
+                        help="表示したリンクの上位N件をバックグラウンドで先読みする")
+    parser.add_argument('--history-db', default="", help="閲覧履歴の保存先")
+    parser.add_argument('--no-history', action='store_true', help="閲覧履歴を保存しない")
+    parser.add_argument('--trace', default="", metavar='FILE',
+                        help="コマンドごとの計測結果をJSON Linesで追記するファイル")
+    parser.add_argument('--profile', action='store_true',
+                        help="コマンドごとにcProfileとtracemallocの結果を表示する")
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="本文の大きさの上限（MB、超えた分は読まずに先頭だけを表示。0で無制限）")
+    args = parser.parse_args()
     
-    # コマンドライン引数でURLが指定された場合
-    initial_url = sys.argv[1] if len(sys.argv) > 1 else ""
+    browser = SimpleBrowser(cache_bytes=args.cache_mb * 1024 * 1024, streaming=args.stream,
+                            use_curl=args.curl, prefetch=args.prefetch,
+                            timings=Timings(trace_path=args.trace or None), profile=args.profile,
+                            history_store=None if args.no_history else
+                            HistoryStore(args.history_db or default_history_path()),
+                            max_bytes=int(args.max_mb * 1024 * 1024))
     
-    browser.run(initial_url)
+    # コマンドライン引数でURLが指定された場合
+    browser.run(args.url)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,287 @@
+"""
+Site Spider
+開始URLからリンクをたどって同じサイト内を幅優先で取得し、JSON Lines で出力する
+
+使用方法:
+python enhanced_browser.py spider https://example.com/ --max-depth 3 --max-pages 500 > site.jsonl
+python enhanced_browser.py spider https://example.com/ --checkpoint crawl.json  # 中断しても再実行で再開
+
+取得・解析の並列化は crawl サブコマンド（crawler.py）と同じ仕組みを使います。
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, List, Optional, TextIO, Tuple
+
+from crawler import make_fetcher, make_parse_pool, extract_record
+from http_pool import HostLimiter
+from page_cache import normalize_url
+from parse_worker import DEFAULT_TIMEOUT
+from parsers import BACKEND_NAMES, get_backend
+from spool import DEFAULT_MAX_BYTES
+
+CHECKPOINT_VERSION = 1
+
+# この件数のページを書き出すごとにチェックポイントを保存する
+CHECKPOINT_EVERY = 50
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """重複判定用にURLを正規化（フラグメント除去・クエリの並べ替え・ホストの小文字化・既定ポートの省略）"""
+    parts = urllib.parse.urlsplit(normalize_url(url))
+    netloc = parts.netloc
+    if parts.port and parts.port == DEFAULT_PORTS.get(parts.scheme):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((parts.scheme, netloc, parts.path, query, ''))
+
+
+def site_of(url: str) -> str:
+    """同一サイト判定に使うホスト名（先頭の www. は無視）"""
+    host = (urllib.parse.urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class SeenSet:
+    """取得済み・取得予定のURLの集合（正確だがURL数に比例してメモリを使う）"""
+
+    kind = 'set'
+
+    def __init__(self, urls: Iterable[str] = ()):
+        self._urls = set(urls)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._urls
+
+    def add(self, url: str):
+        self._urls.add(url)
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def to_json(self) -> dict:
+        return {'type': self.kind, 'urls': sorted(self._urls)}
+
+
+class BloomFilter:
+    """数百万URL向けの省メモリな集合（誤って「既出」と判定する確率 error_rate あり）
+
+    誤判定したURLは取得されないだけで、同じURLを二重に取得することはありません。
+    """
+
+    kind = 'bloom'
+
+    def __init__(self, capacity: int, error_rate: float = 0.001, bits: Optional[bytes] = None, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray(bits) if bits is not None else bytearray((self.size + 7) // 8)
+        self._count = count
+
+    def _positions(self, url: str) -> List[int]:
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, url: str) -> bool:
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(url))
+
+    def add(self, url: str):
+        for p in self._positions(url):
+            self._bits[p >> 3] |= 1 << (p & 7)
+        self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def to_json(self) -> dict:
+        return {'type': self.kind, 'capacity': self.capacity, 'error_rate': self.error_rate,
+                'count': self._count, 'bits': base64.b64encode(bytes(self._bits)).decode('ascii')}
+
+
+def seen_from_json(data: dict):
+    if data['type'] == BloomFilter.kind:
+        return BloomFilter(data['capacity'], data['error_rate'], base64.b64decode(data['bits']), data['count'])
+    return SeenSet(data['urls'])
+
+
+class SpiderState:
+    """再開に必要なクロールの状態（フロンティア・既出URL・対象サイト・出力済み件数）"""
+
+    def __init__(self, seen, sites: Iterable[str], frontier: Iterable[Tuple[str, int]] = (), pages: int = 0):
+        self.seen = seen
+        self.sites = set(sites)
+        self.frontier = deque(frontier)
+        self.pages = pages
+
+    @classmethod
+    def start(cls, seeds: List[str], bloom_capacity: int = 0) -> 'SpiderState':
+        seen = BloomFilter(bloom_capacity) if bloom_capacity else SeenSet()
+        state = cls(seen, ())
+        for url in seeds:
+            url = canonicalize_url(url)
+            state.sites.add(site_of(url))
+            state.enqueue(url, 0)
+        return state
+
+    def enqueue(self, url: str, depth: int) -> bool:
+        """未出のURLならフロンティアの末尾に追加する"""
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self.frontier.append((url, depth))
+        return True
+
+    def save(self, path: str, in_flight: Iterable[Tuple[str, int]] = ()):
+        """一時ファイルに書いてから置き換える（処理中のURLはフロンティアの先頭に戻して保存）"""
+        data = {
+            'version': CHECKPOINT_VERSION,
+            'pages': self.pages,
+            'sites': sorted(self.sites),
+            'frontier': list(in_flight) + list(self.frontier),
+            'seen': self.seen.to_json(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SpiderState':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"対応していないチェックポイントです: {path}")
+        return cls(seen_from_json(data['seen']), data['sites'],
+                   [(url, depth) for url, depth in data['frontier']], data['pages'])
+
+
+def spider(state: SpiderState, out: TextIO, max_depth: int = 2, max_pages: int = 100,
+           same_site: bool = True, concurrency: int = 8, per_host: int = 2,
+           parse_workers: Optional[int] = None, checkpoint: Optional[str] = None,
+           fetch: Optional[Callable[[str], str]] = None, parser: Optional[str] = None,
+           parse_timeout: float = DEFAULT_TIMEOUT, max_bytes: int = DEFAULT_MAX_BYTES) -> int:
+    """フロンティアから幅優先でページを取得・解析し、JSON Lines を out に書き出す
+
+    取得はスレッドプール、解析は常駐するワーカープロセス（parse_worker）で行い、見つかったリンクを
+    フロンティアに追加していきます。今回書き出した件数を返します。
+    """
+    fetch = fetch or make_fetcher(concurrency, max_bytes)
+    host_limiter = HostLimiter(per_host)
+    pending = {}  # future -> (段階, url, depth)
+    written = 0
+    last_saved = state.pages
+
+    def fetch_one(url: str) -> str:
+        with host_limiter.slot(url):
+            return fetch(url)
+
+    with make_parse_pool(parser, parse_workers, parse_timeout) as parse_pool, \
+            ThreadPoolExecutor(concurrency) as fetchers, ThreadPoolExecutor(len(parse_pool.workers)) as parsers:
+        try:
+            while True:
+                while (state.frontier and len(pending) < concurrency * 2
+                       and state.pages + len(pending) < max_pages):
+                    url, depth = state.frontier.popleft()
+                    pending[fetchers.submit(fetch_one, url)] = ('fetch', url, depth)
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, url, depth = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"取得に失敗しました: {url}: {e}", file=sys.stderr)
+                        continue
+                    if stage == 'fetch':
+                        pending[parsers.submit(extract_record, parse_pool, result, url)] = ('parse', url, depth)
+                        continue
+
+                    result['depth'] = depth
+                    out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    out.flush()
+                    state.pages += 1
+                    written += 1
+                    if depth < max_depth:
+                        for link in result['links']:
+                            link_url = canonicalize_url(link['url'])
+                            if not same_site or site_of(link_url) in state.sites:
+                                state.enqueue(link_url, depth + 1)
+
+                if checkpoint and state.pages - last_saved >= CHECKPOINT_EVERY:
+                    state.save(checkpoint, [(url, depth) for _, url, depth in pending.values()])
+                    last_saved = state.pages
+        except KeyboardInterrupt:
+            if checkpoint:
+                state.save(checkpoint, [(url, depth) for _, url, depth in pending.values()])
+                print(f"\n中断しました。同じ --checkpoint を指定すると再開できます: {checkpoint}", file=sys.stderr)
+            for future in pending:
+                future.cancel()
+            fetchers.shutdown(wait=False, cancel_futures=True)
+            parsers.shutdown(wait=False, cancel_futures=True)
+            return written
+
+    if checkpoint:
+        state.save(checkpoint)
+    return written
+
+
+def spider_main(argv):
+    parser = argparse.ArgumentParser(prog='enhanced_browser.py spider',
+                                     description="開始URLから同じサイト内のリンクを幅優先でたどり、JSON Linesで出力")
+    parser.add_argument('urls', nargs='*', help="開始URL（チェックポイントから再開する場合は省略可）")
+    parser.add_argument('--max-depth', type=int, default=2, help="開始URLからたどるリンクの深さ")
+    parser.add_argument('--max-pages', type=int, default=100, help="出力するページ数の上限（再開前の分を含む）")
+    parser.add_argument('--all-sites', action='store_true', help="開始URLと別のサイトへのリンクもたどる")
+    parser.add_argument('--concurrency', type=int, default=8, help="全体の同時取得数")
+    parser.add_argument('--per-host', type=int, default=2, help="1ホストあたりの同時取得数")
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help="解析用プロセス数（デフォルト: CPU数）")
+    parser.add_argument('--bloom', type=int, default=0, metavar='N',
+                        help="既出URLの判定にN件想定のBloomフィルタを使う（大規模サイト向け）")
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help="フロンティアを保存するファイル（存在すればそこから再開）")
+    parser.add_argument('--parser', choices=('auto',) + BACKEND_NAMES, default='auto',
+                        help="HTML解析に使うパーサー（デフォルト: インストール済みで最速のもの）")
+    parser.add_argument('--parse-timeout', type=float, default=DEFAULT_TIMEOUT, metavar='SEC',
+                        help="1ページの解析のCPU時間の上限（超えたら1パス抽出器で抽出し直す。0で無制限）")
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="本文の大きさの上限（MB、超えた分は読まずに先頭だけを抽出。0で無制限）")
+    args = parser.parse_args(argv)
+    try:
+        get_backend(args.parser)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        state = SpiderState.load(args.checkpoint)
+        print(f"チェックポイントから再開します（出力済み {state.pages}件、"
+              f"残り {len(state.frontier)}件）", file=sys.stderr)
+    elif args.urls:
+        seeds = [url if url.startswith(('http://', 'https://')) else 'https://' + url for url in args.urls]
+        state = SpiderState.start(seeds, args.bloom)
+    else:
+        parser.error("開始URLを指定してください")
+
+    start = time.perf_counter()
+    count = spider(state, sys.stdout, args.max_depth, args.max_pages, not args.all_sites,
+                   args.concurrency, args.per_host, args.parse_workers, args.checkpoint, parser=args.parser,
+                   parse_timeout=args.parse_timeout, max_bytes=int(args.max_mb * 1024 * 1024))
+    print(f"{count}件のページを出力しました（{time.perf_counter() - start:.1f}秒、"
+          f"既出URL {len(state.seen)}件、未取得 {len(state.frontier)}件）", file=sys.stderr)
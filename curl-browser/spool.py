@@ -0,0 +1,85 @@
+"""
+Body Spool
+レスポンス本文の大きさの上限
+
+本文は上限（max_bytes）まで読んだところで接続を閉じ（curlは終了させ）、先頭だけを返します。
+本文は呼び出し側がメモリ上の bytes として使うので、読み込み中のメモリは上限で抑えます。
+チャンクは届いた順に BytesIO に書き足し、最後は getvalue() でコピーせずに取り出すので、
+チャンクのリストと連結した本文の両方を持つことはなく、ピークは本文1つ分
+（最大 max_bytes）とチャンク1つ分で済みます。
+"""
+
+import io
+import subprocess
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# 本文の大きさの上限（0なら無制限）
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 1回に読み込むバイト数
+READ_SIZE = 64 * 1024
+
+# curl -w で本文の後ろに出力させる計測値の分（上限の判定では本文に数えない）
+CURL_TRAILER_BYTES = 1024
+
+
+def read_body(chunks: Iterable[bytes], max_bytes: int = DEFAULT_MAX_BYTES) -> Tuple[bytes, bool]:
+    """チャンク列を max_bytes まで読み、(本文, 上限で打ち切ったか) を返す
+
+    打ち切ったときは残りを読まないので、接続は呼び出し側で閉じる。
+    """
+    size = 0
+    truncated = False
+    buffer = io.BytesIO()
+    for chunk in chunks:
+        if max_bytes and size + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - size]
+            truncated = True
+        buffer.write(chunk)
+        size += len(chunk)
+        if truncated:
+            break
+    # 他から参照されていない BytesIO の getvalue() は内部のバッファを縮めて返す（コピーしない）
+    return buffer.getvalue(), truncated
+
+
+def truncate_body(body: bytes, max_bytes: int = DEFAULT_MAX_BYTES) -> Tuple[bytes, bool]:
+    """読み込み済みの本文を max_bytes に切り詰める（curl -w の計測値を取り除いた後に使う）"""
+    if max_bytes and len(body) > max_bytes:
+        return body[:max_bytes], True
+    return body, False
+
+
+def notify_first(chunks: Iterable[bytes], on_start: Optional[Callable[[], None]]) -> Iterator[bytes]:
+    """最初のチャンクを返す前に on_start を呼ぶ（curl -D のヘッダーは本文より先に書き出される）"""
+    for chunk in chunks:
+        if on_start:
+            on_start()
+            on_start = None
+        yield chunk
+
+
+def run_capped(cmd: List[str], max_bytes: int = DEFAULT_MAX_BYTES,
+               on_start: Optional[Callable[[], None]] = None) -> Tuple[int, bytes, bytes, bool]:
+    """コマンド（curl）を実行し、標準出力が上限を超えたら終了させる
+
+    (終了コード, 標準出力, 標準エラー出力, 打ち切ったか) を返す。打ち切ったときの終了コードは
+    意味を持たない。標準出力の末尾に付く curl -w の計測値の分は上限に余裕を持たせてある。
+    on_start は最初の出力が届いたときに呼ばれ、例外を出すとコマンドを終了させてその例外を送出する。
+    """
+    limit = max_bytes + CURL_TRAILER_BYTES if max_bytes else 0
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, truncated = read_body(notify_first(iter(lambda: proc.stdout.read1(READ_SIZE), b''), on_start),
+                                      limit)
+        if truncated:
+            proc.kill()
+        stderr = proc.stderr.read()
+        return proc.wait(), stdout, stderr, truncated
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
@@ -0,0 +1,218 @@
+"""
+Streaming Load
+ダウンロードしながらHTMLを抽出するストリーミング読み込み
+
+本文をチャンク単位で受け取り、html_extract.PageExtractor に順次渡します。
+文字コードはHTTPヘッダーの宣言が無ければ先頭の数KB（BOM・<meta charset>）から判定し、
+以降はチャンクごとに逐次デコードします。
+最初の1画面分の行が集まった時点で呼び出し側に知らせるので、
+ダウンロードが終わる前に表示を始められます。残りはバックグラウンドで読み続け、
+別のページへ移動したときは cancel() で打ち切ります。
+本文が max_bytes を超えたとき、および max_lines・max_links を指定して表示に必要な
+行とリンクが揃ったときは、そこで読み込みを終えます（truncated）。
+keep_body を指定すると、ディスクキャッシュやアーカイブに保存できるよう受信したバイト列もそのまま残します。
+"""
+
+import codecs
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Optional, Iterable, Callable, List, Tuple, Dict
+
+from charset import SNIFF_BYTES, sniff_encoding
+from disk_cache import parse_header_dump
+from html_extract import PageExtractor
+from spool import DEFAULT_MAX_BYTES
+
+# 1回に読み込むバイト数
+CHUNK_SIZE = 16 * 1024
+
+
+class StreamingLoad:
+    """1ページ分のストリーミング読み込み"""
+
+    def __init__(self, url: str, chunks: Iterable[bytes], encoding: Optional[str] = None,
+                 close: Optional[Callable[[], None]] = None, first_screen_lines: int = 150,
+                 max_bytes: int = DEFAULT_MAX_BYTES, max_lines: int = 0, max_links: int = 0,
+                 keep_body: bool = False):
+        self.url = url
+        self.first_screen_lines = first_screen_lines
+        self.max_bytes = max_bytes
+        self.extractor = PageExtractor(url, max_lines, max_links)
+        self.html = None  # 読み込み完了後に本文全体（打ち切った場合はそこまで）が入る
+        self.body = None  # keep_body なら、読み込み完了後に受信したバイト列が入る
+        self.error = None
+        self.truncated = False  # 本文の途中で読み込みを終えた
+        self.bytes_received = 0
+        self._chunks = chunks
+        self._close = close
+        self.encoding = encoding  # None なら本文の先頭から判定する
+        self._declared = encoding
+        self._head = b''  # 文字コードを判定するまで溜めておく先頭部分
+        self._decoder = None
+        self._html_parts = []
+        self._body_parts = [] if keep_body else None
+        self._lock = threading.Lock()
+        self._first_screen = threading.Event()
+        self._done = threading.Event()
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> 'StreamingLoad':
+        self._thread.start()
+        return self
+
+    @property
+    def complete(self) -> bool:
+        """最後まで読み込めたかどうか"""
+        return self.html is not None
+
+    @property
+    def finished(self) -> bool:
+        """読み込みが終わった（完了・失敗・中断のいずれか）かどうか"""
+        return self._done.is_set()
+
+    def _run(self):
+        try:
+            for chunk in self._chunks:
+                if self._cancelled:
+                    return
+                if self.max_bytes and self.bytes_received + len(chunk) > self.max_bytes:
+                    chunk = chunk[:self.max_bytes - self.bytes_received]
+                    self.truncated = True
+                self.bytes_received += len(chunk)
+                if self._body_parts is not None:
+                    self._body_parts.append(chunk)
+                text = self._decode(chunk)
+                if text:
+                    self._feed(text)
+                if self.extractor.stopped:
+                    self.truncated = True
+                if self.truncated:
+                    break
+            with self._lock:
+                text = self._decode(b'', final=True)
+                self._html_parts.append(text)
+                self.extractor.feed(text)
+                self.extractor.close()
+                self.html = ''.join(self._html_parts)
+                self._html_parts = []
+                if self._body_parts is not None:
+                    self.body = b''.join(self._body_parts)
+                    self._body_parts = None
+        except Exception as e:
+            self.error = e
+        finally:
+            if self._close:
+                self._close()
+            self._first_screen.set()
+            self._done.set()
+
+    def _decode(self, data: bytes, final: bool = False) -> str:
+        """文字コードが決まるまでは先頭部分を溜め、決まったら逐次デコード"""
+        if self._decoder is None:
+            self._head += data
+            # BOMを確かめるため、宣言があっても先頭の数バイトは待つ
+            needed = 4 if self._declared else SNIFF_BYTES
+            if len(self._head) < needed and not final:
+                return ''
+            self.encoding = sniff_encoding(self._head, self._declared)
+            self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+            data, self._head = self._head, b''
+        return self._decoder.decode(data, final)
+
+    def _feed(self, text: str):
+        with self._lock:
+            self._html_parts.append(text)
+            self.extractor.feed(text)
+            if len(self.extractor.lines) >= self.first_screen_lines:
+                self._first_screen.set()
+
+    def wait_first_screen(self, timeout: Optional[float] = None) -> bool:
+        """最初の1画面分が揃う（または読み込みが終わる）まで待つ"""
+        return self._first_screen.wait(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """読み込みが終わるまで待つ"""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """残りのダウンロードを打ち切る"""
+        self._cancelled = True
+        if self._close and not self._done.is_set():
+            self._close()
+
+    def snapshot(self) -> Tuple[str, List[Tuple[str, str]], Dict]:
+        """現時点までに抽出できた (text, links, meta)"""
+        with self._lock:
+            return self.extractor.result()
+
+
+def response_chunks(response) -> Iterable[bytes]:
+    """requestsのレスポンス本文を、届いた分だけ少しずつ返す
+
+    iter_content() は指定サイズが溜まるまで待つので、urllib3 2.x の read1() があればそちらを使う。
+    """
+    raw = response.raw
+    if not hasattr(raw, 'read1'):
+        yield from response.iter_content(CHUNK_SIZE)
+        return
+    while True:
+        chunk = raw.read1(CHUNK_SIZE, decode_content=True)
+        if not chunk:
+            break
+        yield chunk
+
+
+def curl_stream(cmd: List[str]) -> Tuple[Iterable[bytes], Callable[[], None], int, Dict[str, str]]:
+    """curlを起動し、標準出力をチャンク単位で読むイテレータを返す
+
+    戻り値は (チャンクのイテレータ, 中断用の関数, ステータス, レスポンスヘッダー)。
+    リダイレクトをたどった場合、ステータスとヘッダーは最後のレスポンスのものです。
+    cmd の最後の要素はURLとし、-D オプションはこの関数で追加します。
+    curlはヘッダーを本文より先に書き出すので、最初のチャンクが届くまで待ってから
+    レスポンスヘッダーを読んで返します（本文が空なら読み込みの終了まで待ちます）。
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='browser-stream-')
+    header_path = os.path.join(tmp_dir, 'headers')
+    proc = subprocess.Popen(cmd[:-1] + ['-D', header_path, cmd[-1]],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def close():
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def read_headers() -> Tuple[int, Dict[str, str]]:
+        with open(header_path, 'r', encoding='latin-1') as f:
+            status, headers = parse_header_dump(f.read())
+        if status >= 400:
+            raise RuntimeError(f"HTTP {status}")
+        return status, headers
+
+    try:
+        first = proc.stdout.read1(CHUNK_SIZE)
+        if not first and proc.wait() != 0:
+            raise RuntimeError(f"curl エラー: {proc.stderr.read().decode('utf-8', errors='replace')}")
+        status, headers = read_headers()
+    except BaseException:
+        close()
+        raise
+
+    def chunks():
+        if first:
+            yield first
+        while True:
+            chunk = proc.stdout.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        if proc.wait() != 0:
+            raise RuntimeError(f"curl エラー: {proc.stderr.read().decode('utf-8', errors='replace')}")
+
+    return chunks(), close, status, headers
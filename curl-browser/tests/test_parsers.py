@@ -0,0 +1,138 @@
+"""
+Parser Conformance Tests
+インストール済みの全バックエンドの出力が標準ライブラリの1パス抽出器と一致するかのテスト
+
+どのバックエンドも同じ (text, links, meta) を返すこと（適合性）と、壊れた文書
+（解析が極端に遅くなる入力）でも1パス抽出器が線形時間で終わり、各バックエンドが
+例外を出さずに結果を返すことを確かめます。
+
+使用方法（curl-browser ディレクトリで）:
+python -m pytest tests
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_extract import extract_page
+from parsers import available_backends
+
+CONFORMANCE_BASE_URL = 'https://example.com/dir/page.html'
+
+CONFORMANCE_CASES = {
+    'basic': '<html><head><title>Home &amp; Page</title>'
+             '<meta name="description" content="desc &quot;here&quot;"><meta name="keywords" content="a, b">'
+             '</head><body><h1>Hello</h1><p>Some &lt;text&gt; here &copy; 2024</p></body></html>',
+    'links': '<body><a href="/a.html">Page A</a> <a href="b.html#frag">Page <b>B</b></a>\n'
+             '<a href="https://other.example/">Ext</a> <a href="mailto:x@example.com">Mail</a>'
+             '<a href="javascript:void(0)">JS</a><a href="/empty"></a><a name="anchor">No href</a></body>',
+    'script_style': '<head><style>p { color: red }</style></head><body><p>before</p>'
+                    '<script>var s = "<a href=\'/x\'>no</a>";</script><p>after</p></body>',
+    'top_level_script': '<html><head><script src="a.js"></script><link rel="stylesheet" href="s.css">'
+                        '<title>T</title></head><body><script src="b.js"></script>bare text'
+                        '<style>p {}</style><p>para</p><script>var a = 1;</script>tail</body></html>',
+    'blocks': '<div>one<div>two</div>three</div><ul><li>x</li><li>y</li></ul>'
+              '<table><tr><td>c1</td><td>c2</td></tr></table>line<br>break',
+    'whitespace': '<p>  lots   of\tspace  </p>\n\n<p>multi\nline\ntext</p>',
+    'base': '<head><base href="https://cdn.example.org/root/"></head><body><a href="x.html">X</a></body>',
+    'comments': '<!DOCTYPE html><!-- comment <a href="/c">C</a> --><p>visible<!-- hidden --> text</p>',
+    'japanese': '<title>日本語のページ</title><p>こんにちは、世界。</p><a href="/ja">リンク</a>',
+    'unclosed_p': '<body><p>first<p>second<p>third</body>',
+    'duplicate_links': '<nav><a href="/">Home</a> <a href="/docs/">Docs</a></nav><p><a href="../">Top</a>'
+                       ' <a href="/docs/#intro">Intro</a> <a href="../docs/">Docs again</a></p>',
+    'attr_entities': '<a href="/q?a=1&amp;b=2" title="x > y">Query &amp; more</a>',
+    'xml_declaration': '<?xml version="1.0" encoding="utf-8"?><html><title>XHTML</title><p>body</p></html>',
+    'after_html_end': '<html><head><title>T</title></head><body><p>old line</p></body></html>\n'
+                      '<p>new line added</p>tail <a href="/late">late</a><!-- c --><div>more</div>',
+    'no_title': '<p>untitled</p>',
+    'comment_only': '<!-- nothing but a comment -->',
+    'empty': '',
+}
+
+# --- 壊れた文書（解析が極端に遅くなる入力、bench.py pathological でも使用） ---
+
+# name -> count 個の繰り返しで文書を作る関数
+PATHOLOGICAL_PAGES = {
+    # 閉じられない <a>（以前の正規表現 <a[^>]*href=...>(.*?)</a> が文書の末尾まで探し直す）
+    'unclosed_a': lambda count: '<body>' + '<a href="/x">text ' * count,
+    # 属性が極端に多い要素（lxml は属性数に対して2乗以上の時間がかかる）
+    'many_attrs': lambda count: '<a ' + ' '.join(f'a{i}="{i}"' for i in range(count)) + ' href="/y">y</a>',
+    # 閉じられない < や <!（タグの終わりを探し直す抽出器は2乗の時間がかかる）
+    'lt_flood': lambda count: '<p>' + 'x < y ' * count,
+    'bang_flood': lambda count: '<!' * count,
+    # 深い入れ子・閉じられない表と書式タグ（木を作るパーサーの定数が大きい）
+    'deep_div': lambda count: '<div>' * count + 'bottom',
+    'nested_table': lambda count: '<table><tr><td>' * count + 'cell',
+    'formatting': lambda count: '<b><i><u>x' * count + '</b>',
+}
+
+# 線形時間とみなす、文書を4倍にしたときの時間の比の上限（2乗なら16倍になる）
+LINEAR_RATIO = 8.0
+
+# これより短い時間は誤差が大きいので、時間の比を確かめない
+MIN_MEASURED_SECONDS = 0.05
+
+
+def best_of(func, repeat: int = 3) -> float:
+    """repeat 回実行した中で最も短い時間（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class ConformanceTest(unittest.TestCase):
+    """全バックエンドの出力が stdlib（1パス抽出器）と一致するか"""
+
+    def test_backends_match_stdlib(self):
+        for case, html in CONFORMANCE_CASES.items():
+            expected = extract_page(html, CONFORMANCE_BASE_URL)
+            for backend in available_backends():
+                with self.subTest(backend=backend.name, case=case):
+                    actual = backend.parse(html, CONFORMANCE_BASE_URL)
+                    for label, want, got in zip(('text', 'links', 'meta'), expected, actual):
+                        self.assertEqual(want, got, label)
+
+    def test_content_after_html_end_is_kept(self):
+        """</html> の後ろに書き足された内容も、どのバックエンドでも捨てない"""
+        html = CONFORMANCE_CASES['after_html_end']
+        for backend in available_backends():
+            with self.subTest(backend=backend.name):
+                text, links, _ = backend.parse(html, CONFORMANCE_BASE_URL)
+                self.assertIn('new line added', text)
+                self.assertIn('more', text.splitlines())
+                self.assertIn(('https://example.com/late', 'late'), list(links))
+
+
+class PathologicalPageTest(unittest.TestCase):
+    """壊れた文書でも解析が終わるか"""
+
+    def test_extractor_is_linear(self):
+        count = 10000
+        for page, generate in PATHOLOGICAL_PAGES.items():
+            with self.subTest(page=page):
+                html, large_html = generate(count), generate(count * 4)
+                single = best_of(lambda: extract_page(html, CONFORMANCE_BASE_URL))
+                large = best_of(lambda: extract_page(large_html, CONFORMANCE_BASE_URL))
+                if large < MIN_MEASURED_SECONDS:
+                    continue
+                self.assertLessEqual(large / max(single, 1e-6), LINEAR_RATIO)
+
+    def test_backends_return_results(self):
+        count = 1000
+        for page, generate in PATHOLOGICAL_PAGES.items():
+            html = generate(count)
+            for backend in available_backends():
+                with self.subTest(page=page, backend=backend.name):
+                    text, links, meta = backend.parse(html, CONFORMANCE_BASE_URL)
+                    self.assertIsInstance(text, str)
+                    self.assertIsInstance(meta, dict)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+"""
+Request Timing
+取得・解析・表示にかかった時間をフェーズごとに記録する計測ツール
+
+ブラウザのコマンド1回分を1件の記録とし、DNS・接続・TLS・最初の1バイトまで（TTFB）・
+ダウンロード・デコード・解析・表示の各フェーズの時間を直近の一定件数だけ保持します。
+stats コマンドでフェーズごとのパーセンタイルとキャッシュヒット率を表示し、
+--trace を指定すると1件ごとにJSON Linesで書き出します。
+"""
+
+import contextvars
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'download', 'first_screen', 'decode', 'parse', 'render')
+
+# キャッシュ（--offline ではアーカイブ）から返せた取得の種類（ヒット率の計算に使う）
+CACHE_SOURCES = ('memory', 'disk', 'revalidated', 'archive')
+
+# curl -w で本文の後ろに計測値を出させるときの区切り
+CURL_TIMING_MARKER = b'\n@@curl-timing@@ '
+CURL_WRITE_OUT = (CURL_TIMING_MARKER.decode('ascii') +
+                  '%{time_namelookup} %{time_connect} %{time_appconnect} %{time_pretransfer} '
+                  '%{time_starttransfer} %{time_total} %{size_download} %{content_type}')
+
+
+def split_curl_timing(stdout: bytes) -> Tuple[bytes, Dict[str, float], str]:
+    """curl -w CURL_WRITE_OUT の出力を (本文, フェーズごとの秒数, Content-Type) に分ける
+
+    curl の値は開始からの累積時間なので、各フェーズの差分に直す。
+    """
+    body, marker, tail = stdout.rpartition(CURL_TIMING_MARKER)
+    if not marker:
+        return stdout, {}, ''
+    fields = tail.decode('latin-1').split(None, 7)
+    content_type = fields[7].strip() if len(fields) > 7 else ''
+    try:
+        namelookup, connect, appconnect, pretransfer, starttransfer, total, _ = map(float, fields[:7])
+    except ValueError:
+        return body, {}, content_type
+    phases = {'dns': namelookup, 'connect': max(0.0, connect - namelookup)}
+    if appconnect > 0:
+        phases['tls'] = max(0.0, appconnect - connect)
+    phases['ttfb'] = max(0.0, starttransfer - pretransfer)
+    phases['download'] = max(0.0, total - starttransfer)
+    return body, phases, content_type
+
+
+class RequestTiming:
+    """1コマンド分の計測結果"""
+
+    __slots__ = ('command', 'url', 'backend', 'source', 'status', 'bytes', 'phases', 'started', 'total')
+
+    def __init__(self, command: str):
+        self.command = command
+        self.url = ''
+        self.backend = ''
+        self.source = ''  # network / memory / disk / revalidated / stream / archive
+        self.status = 0
+        self.bytes = 0
+        self.phases = {}
+        self.started = time.time()
+        self.total = 0.0
+
+    def to_json(self) -> Dict:
+        return {
+            'time': self.started,
+            'command': self.command,
+            'url': self.url,
+            'backend': self.backend,
+            'source': self.source,
+            'status': self.status,
+            'bytes': self.bytes,
+            'total_ms': round(self.total * 1000, 3),
+            'phases_ms': {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+        }
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """最近傍法によるパーセンタイル"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Timings:
+    """直近 capacity 件の計測結果を保持するリングバッファ"""
+
+    def __init__(self, capacity: int = 200, trace_path: Optional[str] = None):
+        self.records = deque(maxlen=capacity)
+        # asyncio のタスクごとに別の記録になるよう ContextVar で持つ
+        self._current = contextvars.ContextVar('timing_record', default=None)
+        self._trace = open(trace_path, 'a', encoding='utf-8') if trace_path else None
+
+    @contextmanager
+    def command(self, command: str):
+        """コマンド1回分の計測（ページを取得・表示しなかったコマンドは記録しない）"""
+        record = RequestTiming(command)
+        token = self._current.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.total = time.perf_counter() - start
+            self._current.reset(token)
+            if record.url:
+                self.records.append(record)
+                if self._trace:
+                    self._trace.write(json.dumps(record.to_json(), ensure_ascii=False) + '\n')
+                    self._trace.flush()
+
+    @property
+    def current(self) -> Optional[RequestTiming]:
+        """計測中の記録（with command(...) の外では None）"""
+        return self._current.get()
+
+    @contextmanager
+    def phase(self, name: str):
+        """with ブロックの所要時間をフェーズ name に加算"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        current = self.current
+        if current is not None:
+            current.phases[name] = current.phases.get(name, 0.0) + seconds
+
+    def add_phases(self, phases: Dict[str, float]):
+        for name, seconds in phases.items():
+            self.add(name, seconds)
+
+    def note(self, **fields):
+        """url / backend / source / status / bytes を記録"""
+        current = self.current
+        if current is not None:
+            for name, value in fields.items():
+                setattr(current, name, value)
+
+    def note_default(self, **fields):
+        """まだ記録していない項目だけ記録（対話ループが先に取得したページをキャッシュから表示するとき）"""
+        current = self.current
+        if current is not None:
+            for name, value in fields.items():
+                if not getattr(current, name):
+                    setattr(current, name, value)
+
+    def summary_lines(self) -> List[str]:
+        """stats コマンドで表示する行"""
+        records = list(self.records)
+        if not records:
+            return ["まだ計測結果がありません。"]
+        hits = sum(1 for r in records if r.source in CACHE_SOURCES)
+        received = sum(r.bytes for r in records if r.source in ('network', 'stream'))
+        lines = [f"直近{len(records)}件  キャッシュヒット率 {hits / len(records) * 100:.0f}%  "
+                 f"受信 {received / 1024:.1f}KB",
+                 f"  {'phase':<13}{'count':>6}{'p50':>10}{'p95':>10}{'max':>10}"]
+        for name in PHASES + ('total',):
+            samples = [r.total if name == 'total' else r.phases[name]
+                       for r in records if name == 'total' or name in r.phases]
+            if samples:
+                lines.append(f"  {name:<13}{len(samples):>6}{percentile(samples, 50) * 1000:8.1f}ms"
+                             f"{percentile(samples, 95) * 1000:8.1f}ms{max(samples) * 1000:8.1f}ms")
+        lines.append("  最近の取得:")
+        for r in records[-5:]:
+            phases = ' '.join(f"{name}={r.phases[name] * 1000:.1f}" for name in PHASES if name in r.phases)
+            lines.append(f"    {r.total * 1000:7.1f}ms {r.source or '-':<11} {r.url}")
+            if phases:
+                lines.append(f"             {phases}")
+        return lines
+
+    def close(self):
+        if self._trace:
+            self._trace.close()
+            self._trace = None
+
+
+@contextmanager
+def profiled(top: int = 15):
+    """with ブロックを cProfile と tracemalloc で計測し、上位の関数と確保メモリを表示"""
+    # --profile を指定したときだけ使うので、起動時には読み込まない
+    import cProfile
+    import io
+    import pstats
+    import tracemalloc
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(top)
+        print("\n🔬 プロファイル（累積時間の上位）:")
+        print(output.getvalue().strip())
+        print(f"\n🔬 メモリ確保の上位（ピーク {peak / 1024 / 1024:.1f}MB）:")
+        for stat in snapshot.statistics('lineno')[:10]:
+            print(f"  {stat.size / 1024:9.1f}KB {stat.count:7d}回  {stat.traceback[0]}")
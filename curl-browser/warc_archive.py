@@ -0,0 +1,280 @@
+"""
+WARC Archive
+取得したレスポンスを WARC 形式（gzip圧縮）で記録し、ネットワークを使わずに再生する
+
+記録（--record）では、ネットワークから取得したレスポンスをヘッダーと本文ごとに1レコードずつ
+archive-NNNNN.warc.gz に追記します。レコードごとに独立した gzip メンバーにするので、
+ファイル内の位置と長さが分かれば、そのレコードだけを読み出して展開できます。
+ファイルが上限（max_file_bytes）を超えたら次の番号のファイルに切り替えます。
+
+索引（index.cdx）は「正規化したURL 日時 ファイル名 位置 長さ」の行をURL順に並べたテキストで、
+再生（--offline）では索引全体を読み込まずに mmap 上の二分探索で引きます。記録中に追加した分は
+index.cdx.new に追記しておき、記録の終了時（または次に開いたとき）に並べ替えて index.cdx に併合します。
+
+本文は伸長済みのもの（Content-Encoding を外したもの）を記録し、Content-Length は本文に合わせて書き直します。
+"""
+
+import gzip
+import heapq
+import http
+import mmap
+import os
+import re
+import threading
+import time
+import uuid
+from typing import BinaryIO, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from disk_cache import default_cache_dir
+from page_cache import normalize_url
+
+# 1つの WARC ファイルの大きさの上限
+DEFAULT_FILE_BYTES = 100 * 1024 * 1024
+
+INDEX_NAME = 'index.cdx'
+JOURNAL_NAME = 'index.cdx.new'
+ARCHIVE_RE = re.compile(r'archive-(\d+)\.warc\.gz$')
+
+# 記録しないレスポンスヘッダー（本文は伸長済みで、長さは書き直す）
+DROPPED_HEADERS = frozenset(('content-encoding', 'transfer-encoding', 'content-length'))
+
+SOFTWARE = 'Enhanced-Terminal-Browser/1.0'
+
+
+def default_archive_dir() -> str:
+    return os.path.join(default_cache_dir(), 'archive')
+
+
+def url_key(url: str) -> str:
+    """索引のキー（正規化したURL。空白は索引の区切りなのでエスケープする）"""
+    return normalize_url(url).replace(' ', '%20')
+
+
+class ArchivedResponse(NamedTuple):
+    url: str
+    date: str  # 記録した日時（WARC-Date）
+    status: int
+    headers: Dict[str, str]  # 名前は小文字
+    body: bytes
+
+
+def warc_record(warc_type: str, url: str, content_type: str, block: bytes) -> bytes:
+    """WARC/1.0 のレコード1つ（ヘッダー + ブロック + 区切りの空行2つ）"""
+    headers = [
+        'WARC/1.0',
+        f'WARC-Type: {warc_type}',
+        f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>',
+        f"WARC-Date: {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}",
+    ]
+    if url:
+        headers.append(f'WARC-Target-URI: {url}')
+    headers += [f'Content-Type: {content_type}', f'Content-Length: {len(block)}']
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode('utf-8') + block + b'\r\n\r\n'
+
+
+def http_block(status: int, headers: Mapping[str, str], body: bytes) -> bytes:
+    """response レコードのブロック（HTTPのステータス行・ヘッダー・本文）"""
+    try:
+        reason = http.HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    lines = [f'HTTP/1.1 {status} {reason}'.rstrip()]
+    lines += [f'{name}: {value}' for name, value in headers.items() if name.lower() not in DROPPED_HEADERS]
+    lines.append(f'Content-Length: {len(body)}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', errors='replace') + body
+
+
+def parse_headers(text: str) -> Dict[str, str]:
+    headers = {}
+    for line in text.split('\r\n'):
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def parse_response_record(data: bytes) -> ArchivedResponse:
+    """展開した response レコードを読む"""
+    warc_end = data.index(b'\r\n\r\n')
+    warc_headers = parse_headers(data[:warc_end].decode('utf-8', errors='replace'))
+    block = data[warc_end + 4:warc_end + 4 + int(warc_headers['content-length'])]
+    http_end = block.index(b'\r\n\r\n')
+    status_line, _, header_text = block[:http_end].decode('latin-1').partition('\r\n')
+    fields = status_line.split()
+    status = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else 0
+    return ArchivedResponse(warc_headers.get('warc-target-uri', ''), warc_headers.get('warc-date', ''),
+                            status, parse_headers(header_text), block[http_end + 4:])
+
+
+def archive_files(directory: str) -> List[Tuple[int, str]]:
+    """(番号, ファイル名) を番号順に"""
+    files = []
+    for name in os.listdir(directory):
+        match = ARCHIVE_RE.match(name)
+        if match:
+            files.append((int(match.group(1)), name))
+    return sorted(files)
+
+
+def line_key(line: str) -> str:
+    return line.split(' ', 1)[0]
+
+
+def merge_index(directory: str):
+    """記録中に追記した index.cdx.new を並べ替え、index.cdx に併合する
+
+    並べ替えはキーだけで行い（安定ソート）、同じURLの行は記録した順に並べる（最後の行が最も新しい）。
+    """
+    journal_path = os.path.join(directory, JOURNAL_NAME)
+    if not os.path.exists(journal_path):
+        return
+    index_path = os.path.join(directory, INDEX_NAME)
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        added = sorted((line for line in f if line.endswith('\n')), key=line_key)
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                out.writelines(heapq.merge(f, added, key=line_key))
+        else:
+            out.writelines(added)
+    os.replace(tmp_path, index_path)
+    os.remove(journal_path)
+
+
+class WarcWriter:
+    """レスポンスを WARC ファイルに追記する（スレッドから同時に使える）"""
+
+    def __init__(self, directory: str = "", max_file_bytes: int = DEFAULT_FILE_BYTES):
+        self.directory = directory or default_archive_dir()
+        self.max_file_bytes = max_file_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        merge_index(self.directory)
+        files = archive_files(self.directory)
+        self.number = files[-1][0] if files else 1
+        self.file: Optional[BinaryIO] = None
+        self.journal = open(os.path.join(self.directory, JOURNAL_NAME), 'a', encoding='utf-8')
+        self.records = 0
+        self._lock = threading.Lock()
+
+    @property
+    def filename(self) -> str:
+        return f'archive-{self.number:05d}.warc.gz'
+
+    def _open_file(self):
+        """書き込み先のファイルを開く（上限を超えていれば次の番号に切り替え、先頭に warcinfo を書く）"""
+        if self.file is not None and self.file.tell() < self.max_file_bytes:
+            return
+        if self.file is not None:
+            self.file.close()
+            self.number += 1
+        while True:
+            self.file = open(os.path.join(self.directory, self.filename), 'ab')
+            if self.file.tell() < self.max_file_bytes:
+                break
+            self.file.close()
+            self.number += 1
+        if self.file.tell() == 0:
+            info = f'software: {SOFTWARE}\r\nformat: WARC File Format 1.0\r\n'.encode('utf-8')
+            self.file.write(gzip.compress(warc_record('warcinfo', '', 'application/warc-fields', info)))
+
+    def write_response(self, url: str, status: int, headers: Mapping[str, str], body: bytes):
+        """1つのレスポンスをレコードとして追記し、索引の追記分に1行加える"""
+        record = gzip.compress(warc_record('response', url, 'application/http; msgtype=response',
+                                           http_block(status, headers, body)))
+        with self._lock:
+            self._open_file()
+            offset = self.file.tell()
+            self.file.write(record)
+            self.file.flush()
+            timestamp = time.strftime('%Y%m%d%H%M%S', time.gmtime())
+            self.journal.write(f'{url_key(url)} {timestamp} {self.filename} {offset} {len(record)}\n')
+            self.journal.flush()
+            self.records += 1
+
+    def close(self):
+        """ファイルを閉じて索引を併合する"""
+        with self._lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.journal.close()
+            merge_index(self.directory)
+
+
+class ArchiveReader:
+    """記録したアーカイブからURLのレスポンスを読む（索引は mmap 上で二分探索）"""
+
+    def __init__(self, directory: str = ""):
+        self.directory = directory or default_archive_dir()
+        merge_index(self.directory)
+        self._index = None
+        path = os.path.join(self.directory, INDEX_NAME)
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as f:
+                self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._files: Dict[str, BinaryIO] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """索引の行数（記録したレコードの数。索引をコピーせず mmap 上で改行を数える）"""
+        index = self._index
+        if index is None:
+            return 0
+        count = 0
+        position = index.find(b'\n')
+        while position >= 0:
+            count += 1
+            position = index.find(b'\n', position + 1)
+        return count
+
+    def lookup(self, url: str) -> Optional[Tuple[str, int, int]]:
+        """URLの最も新しい記録の (ファイル名, 位置, 長さ)（無ければ None）"""
+        index = self._index
+        if index is None:
+            return None
+        key = url_key(url).encode('utf-8')
+        # 索引の行は「キー 空白 ...」で、空白はURLのどの文字よりも小さいので、
+        # key + '!' 以上の最初の行の直前が、そのキーの最も新しい行になる
+        bound = key + b'!'
+        lo, hi = 0, len(index)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = index.rfind(b'\n', 0, mid) + 1
+            end = index.find(b'\n', start)
+            if end < 0:
+                end = len(index)
+            if index[start:end] < bound:
+                lo = end + 1
+            else:
+                hi = start
+        if lo == 0:
+            return None
+        start = index.rfind(b'\n', 0, lo - 1) + 1
+        fields = index[start:lo - 1].split()
+        if len(fields) != 5 or fields[0] != key:
+            return None
+        return fields[2].decode('utf-8'), int(fields[3]), int(fields[4])
+
+    def read(self, url: str) -> Optional[ArchivedResponse]:
+        """URLの最も新しい記録を読む（そのレコードだけを読み出して展開する）"""
+        location = self.lookup(url)
+        if location is None:
+            return None
+        filename, offset, length = location
+        with self._lock:
+            f = self._files.get(filename)
+            if f is None:
+                f = self._files[filename] = open(os.path.join(self.directory, filename), 'rb')
+            f.seek(offset)
+            data = f.read(length)
+        return parse_response_record(gzip.decompress(data))
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+            if self._index is not None:
+                self._index.close()
+                self._index = None
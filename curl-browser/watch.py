@@ -0,0 +1,147 @@
+"""
+Page Watch
+ページを一定間隔で再取得し、前回から追加・削除された行だけを表示する（enhanced版の watch コマンド）
+
+再取得は前回のレスポンスの ETag / Last-Modified を使った条件付きリクエストで行い、
+304 なら本文を受け取らずに次の確認まで待ちます。200 でも本文が前回と同じ（SHA-256が一致）なら
+解析しません。本文が変わったときだけ解析し、抽出したテキストの行ごとのハッシュを前回と比べて
+追加・削除された行を表示します。変化が無い間は、間隔ごとの小さなリクエストしか使いません。
+"""
+
+import asyncio
+import difflib
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from charset import decode_html
+from disk_cache import CacheEntry
+from media_type import NotHtmlError, format_size
+
+# fetch(url, 前回のレスポンスの検証子) -> (ステータス, ヘッダー, 本文, 打ち切ったか)
+Fetch = Callable[[str, Optional[CacheEntry]], Awaitable[Tuple[int, Dict[str, str], bytes, bool]]]
+# extract(html, url) -> 抽出したテキスト
+Extract = Callable[[str, str], str]
+
+# 1回の変更で表示する行数の上限（超えた分は件数だけを表示）
+MAX_DIFF_LINES = 40
+
+# 確認の間隔の下限（秒）
+MIN_INTERVAL = 1.0
+
+
+def text_lines(text: str) -> List[str]:
+    """比較する行（空行は段落の区切りなので除く）"""
+    return [line for line in text.split('\n') if line.strip()]
+
+
+def diff_lines(old: List[str], new: List[str]) -> List[Tuple[str, str]]:
+    """追加・削除された行を文書順に (記号, 行) で返す（記号は '+' か '-'）
+
+    各行をハッシュ値に置き換えて比べ、先頭と末尾の一致する部分は差分の計算から外す。
+    """
+    old_hashes = [hash(line) for line in old]
+    new_hashes = [hash(line) for line in new]
+    start = 0
+    while start < min(len(old), len(new)) and old_hashes[start] == new_hashes[start] and old[start] == new[start]:
+        start += 1
+    end = 0
+    while (end < min(len(old), len(new)) - start and old_hashes[-1 - end] == new_hashes[-1 - end]
+           and old[-1 - end] == new[-1 - end]):
+        end += 1
+    old_middle = old_hashes[start:len(old) - end]
+    new_middle = new_hashes[start:len(new) - end]
+    changes = []
+    matcher = difflib.SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ('delete', 'replace'):
+            changes += [('-', line) for line in old[start + i1:start + i2]]
+        if tag in ('insert', 'replace'):
+            changes += [('+', line) for line in new[start + j1:start + j2]]
+    return changes
+
+
+class PageWatch:
+    """1つのページの監視（前回の検証子・本文のダイジェスト・抽出したテキストの行を保持する）"""
+
+    def __init__(self, url: str, fetch: Fetch, extract: Extract):
+        self.url = url
+        self.fetch = fetch
+        self.extract = extract
+        self.validators: Optional[CacheEntry] = None
+        self.digest = ''
+        self.lines: Optional[List[str]] = None
+        self.status = 0
+        self.error = ''  # 最後に表示した取得のエラー
+        self.checks = 0
+        self.not_modified = 0  # 304 で本文を受け取らなかった回数
+        self.same_body = 0  # 本文か抽出したテキストが前回と同じだった回数
+        self.changes = 0
+        self.received = 0
+
+    def check_response(self, status: int, headers: Dict[str, str], body: bytes) -> List[str]:
+        """1回分のレスポンスを前回と比べ、表示する行を返す（変化が無ければ空）"""
+        self.received += len(body)
+        output = []
+        if status >= 400:
+            if status != self.status:
+                output.append(f"⚠️  HTTP {status}")
+            self.status = status
+            return output
+        if self.status >= 400:
+            output.append(f"✅ HTTP {status}（HTTP {self.status} から回復しました）")
+        self.status = status
+        if status == 304 and self.lines is not None:
+            self.not_modified += 1
+            return output
+        self.validators = CacheEntry(self.url, {'digest': hashlib.sha256(body).hexdigest(), 'etag': headers.get('etag', ''),
+                                                'last_modified': headers.get('last-modified', '')})
+        if self.validators.digest == self.digest:
+            self.same_body += 1
+            return output
+        self.digest = self.validators.digest
+        html, _ = decode_html(body, headers.get('content-type', ''))
+        lines = text_lines(self.extract(html, self.url))
+        if self.lines is None:
+            self.lines = lines
+            return output + [f"👀 監視を開始しました: {self.url}（{len(lines)}行）"]
+        changes = diff_lines(self.lines, lines)
+        self.lines = lines
+        if not changes:
+            self.same_body += 1
+            return output
+        self.changes += 1
+        added = sum(1 for sign, _ in changes if sign == '+')
+        output.append(f"🔄 {time.strftime('%H:%M:%S')} 変更あり: +{added} -{len(changes) - added}")
+        output += [f"{sign} {line}" for sign, line in changes[:MAX_DIFF_LINES]]
+        if len(changes) > MAX_DIFF_LINES:
+            output.append(f"  …ほか{len(changes) - MAX_DIFF_LINES}行")
+        return output
+
+    def summary(self) -> str:
+        return (f"⏹  監視を終了しました: {self.checks}回確認（未変更 304: {self.not_modified}回、"
+                f"本文・テキストが同じ: {self.same_body}回、変更: {self.changes}回、受信 {format_size(self.received)}）")
+
+    async def run(self, interval: float, count: int = 0):
+        """interval 秒ごとに確認する（count 回で終了、0なら中断されるまで）"""
+        try:
+            while True:
+                self.checks += 1
+                try:
+                    status, headers, body, _ = await self.fetch(self.url, self.validators)
+                    output = self.check_response(status, headers, body)
+                    self.error = ''
+                except NotHtmlError as e:
+                    print(f"📦 {e.summary()}")
+                    break
+                except Exception as e:
+                    # 同じエラーが続く間は最初の1回だけ表示する
+                    output = [f"⚠️  取得に失敗しました: {e}"] if str(e) != self.error else []
+                    self.error = str(e)
+                for line in output:
+                    print(line)
+                if count and self.checks >= count:
+                    break
+                await asyncio.sleep(interval)
+        finally:
+            print(self.summary())